@@ -7,11 +7,17 @@ from treebeard.forms import movenodeform_factory
 
 from backend.catalog.models import (
     Category,
+    CategoryPropertyMapping,
+    ParseRun,
     Product,
     ProductCategories,
+    ProductPriceHistory,
     ProductProperty,
     ProductPropertyValue,
 )
+from backend.catalog.services.categories import propagate_category_properties
+from backend.catalog.services.prices import recalculate_prices
+from backend.catalog.services.property_mappings import get_category_properties
 
 
 class PropertyInline(admin.TabularInline):
@@ -21,6 +27,12 @@ class PropertyInline(admin.TabularInline):
     verbose_name_plural = "Свойства продуктов"
 
 
+class CategoryPropertyMappingInline(admin.TabularInline):
+    model = CategoryPropertyMapping
+    extra = 0
+    raw_id_fields = ["property"]
+
+
 @admin.register(Category)
 class CategoryAdmin(TreeAdmin):
     prepopulated_fields = {"slug": ("name",)}
@@ -31,11 +43,23 @@ class CategoryAdmin(TreeAdmin):
         "is_parsing_successful",
         "id",
     )
+    actions = ["recalculate_prices_action"]
     list_editable = ("is_published",)
     list_filter = ["is_published"]
-    inlines = [PropertyInline]
+    inlines = [PropertyInline, CategoryPropertyMappingInline]
     search_fields = ["parsed_name", "name"]
-    readonly_fields = ["updated_date", "created_date", "parse_url"]
+    readonly_fields = [
+        "updated_date",
+        "created_date",
+        "parse_url",
+        "parse_etag",
+        "parse_last_modified",
+        "parse_content_hash",
+        "parse_checkpoint_hash",
+        "parse_checkpoint_index",
+        "parse_properties",
+        "change_rate",
+    ]
     form = movenodeform_factory(Category)
     fieldsets = [
         (
@@ -63,6 +87,15 @@ class CategoryAdmin(TreeAdmin):
                     "parse_url",
                     "last_parsed_at",
                     "is_parsing_successful",
+                    "parse_etag",
+                    "parse_last_modified",
+                    "parse_content_hash",
+                    "parse_checkpoint_hash",
+                    "parse_checkpoint_index",
+                    "parse_properties",
+                    "parse_interval",
+                    "next_parse_at",
+                    "change_rate",
                 ],
             },
         ),
@@ -83,10 +116,36 @@ class CategoryAdmin(TreeAdmin):
         ),
     ]
 
+    @admin.display(description="Свойства колонок парсинга")
+    def parse_properties(self, obj):
+        if obj.pk is None:
+            return "-"
+        properties = get_category_properties(obj)
+        return ", ".join(
+            f"{column.label}: {properties[column].code if column in properties else '-'}"
+            for column in CategoryPropertyMapping.Column
+        )
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Свойства меняются в инлайне уже после сохранения категории
+        if any(
+            formset.model is PropertyInline.model and formset.has_changed()
+            for formset in formsets
+        ):
+            propagate_category_properties(form.instance)
+
     @admin.display(description="Название категории")
     def cat_name(self, obj):
         return obj.name if obj.name else obj.parsed_name
 
+    @admin.action(description="Пересчитать цены метра и штуки")
+    def recalculate_prices_action(self, request, queryset):
+        updated_count = sum(
+            len(recalculate_prices(category=category)) for category in queryset
+        )
+        self.message_user(request, f"Пересчитаны цены {updated_count} продуктов")
+
 
 class ProductPropertyInline(admin.TabularInline):
     model = ProductPropertyValue
@@ -102,6 +161,17 @@ class ProductCategoriesInline(admin.TabularInline):
     raw_id_fields = ("category",)
 
 
+class ProductPriceHistoryInline(admin.TabularInline):
+    model = ProductPriceHistory
+    extra = 0
+    fk_name = "product"
+    readonly_fields = ("date", "ton_price", "in_stock")
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 class LeafPublishedCategories(admin.SimpleListFilter):
     """Фильтр для сортировки по главной категории, только если она является
     листом и опубликована"""
@@ -151,7 +221,11 @@ class ProductAdmin(admin.ModelAdmin):
     )
     list_filter = [LeafPublishedCategories, "in_stock", "always_in_stock"]
     search_fields = ["name", "id"]
-    inlines = [ProductPropertyInline, ProductCategoriesInline]
+    inlines = [
+        ProductPropertyInline,
+        ProductCategoriesInline,
+        ProductPriceHistoryInline,
+    ]
     readonly_fields = [
         "updated_date",
         "created_date",
@@ -159,8 +233,21 @@ class ProductAdmin(admin.ModelAdmin):
         "ton_price",
         "unit_price",
         "meter_price",
+        "display_ton_price",
+        "display_meter_price",
+        "display_unit_price",
+        "idt",
+        "idf",
+        "idb",
+        "parse_fingerprint",
     ]
     # inlines = [ProductCategoriesInline, PropertyValueInline]
+    actions = ["recalculate_prices_action"]
+
+    @admin.action(description="Пересчитать цены метра и штуки")
+    def recalculate_prices_action(self, request, queryset):
+        prices = recalculate_prices(queryset.values_list("id", flat=True))
+        self.message_user(request, f"Пересчитаны цены {len(prices)} продуктов")
 
     @admin.display(description="Коэфициент")
     def cat_price_coefficient(self, obj):
@@ -235,3 +322,32 @@ class ProductPropertyAdmin(admin.ModelAdmin):
         "is_sortable",
     )
     list_filter = ["categories"]
+
+
+@admin.register(ParseRun)
+class ParseRunAdmin(admin.ModelAdmin):
+    list_display = (
+        "category",
+        "started_at",
+        "status",
+        "fetch_time",
+        "parse_time",
+        "persist_time",
+        "total_time",
+        "page_bytes",
+        "products_count",
+        "created_count",
+        "updated_count",
+        "queries_count",
+    )
+    list_filter = ["status", "started_at"]
+    list_select_related = ["category"]
+    search_fields = ["category__name", "category__parsed_name"]
+    date_hierarchy = "started_at"
+    raw_id_fields = ["category"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -1,17 +1,13 @@
-from django.db.models import (
-    CharField,
-    F,
-    FloatField,
-    Func,
-    OuterRef,
-    Subquery,
-    Value,
-)
-from django.db.models.functions import Cast
+from django.db.models import F, FilteredRelation, Q
 from django_filters import rest_framework as filters
 from loguru import logger as log
 
-from backend.catalog.models import Category, Product, ProductPropertyValue
+from backend.catalog.models import (
+    Category,
+    Product,
+    ProductProperty,
+    ProductPropertyValue,
+)
 from backend.catalog.services.categories import get_category_subtree_ids_list
 from backend.utils.custom import get_object_or_None
 
@@ -62,38 +58,40 @@ class PropertiesOrderingFilter(filters.OrderingFilter):
             ]
             for v in value
         ):
-            qs = qs.annotate(
-                prop=Cast(
-                    Subquery(
-                        ProductPropertyValue.objects.filter(
-                            property__code=value[0].replace("-", ""),
-                            product_id=OuterRef("pk"),
-                        ).values(
-                            property_value=Func(
-                                F("value"),
-                                Value(","),
-                                Value("."),
-                                function="REPLACE",
-                                output_field=CharField(),
-                            )
-                        )[
-                            :1
-                        ]
-                    ),
-                    output_field=FloatField(),
-                ),
+            code = value[0].lstrip("-")
+            # Одно соединение по (product, property) и сортировка по числовому
+            # значению: индекс вместо приведения строк каждой строки
+            property_id = (
+                ProductProperty.objects.filter(code=code)
+                .values_list("id", flat=True)
+                .first()
             )
+            qs = qs.alias(
+                prop=FilteredRelation(
+                    "properties_through",
+                    condition=Q(properties_through__property_id=property_id),
+                )
+            )
+            if value[0].startswith("-"):
+                ordering = (
+                    F("prop__value_numeric").desc(nulls_last=True),
+                    F("prop__value_key").desc(),
+                )
+            else:
+                ordering = (
+                    F("prop__value_numeric").asc(nulls_last=True),
+                    F("prop__value_key").asc(),
+                )
             log.debug("qs: {}", qs)
-            return qs.order_by(
-                "-prop" if value[0].startswith("-") else "prop"
-            )  # ("-in_stock", value[0])
+            return qs.order_by(*ordering)
 
         return super().filter(qs, value)
 
 
 class ProductFilter(filters.FilterSet):
-    # min_price = filters.NumberFilter(field_name="price", lookup_expr="gte")
-    # max_price = filters.NumberFilter(field_name="price", lookup_expr="lte")
+    # Цена тонны на сайте, с коэффициентом категории
+    min_price = filters.NumberFilter(field_name="display_ton_price", lookup_expr="gte")
+    max_price = filters.NumberFilter(field_name="display_ton_price", lookup_expr="lte")
     gost = filters.CharFilter(method="params_filter")
     diametr = filters.CharFilter(method="params_filter")
     tolshina_stenki = filters.CharFilter(method="params_filter")
@@ -102,8 +100,18 @@ class ProductFilter(filters.FilterSet):
     category = filters.CharFilter(method="category_filter")
     vysota_h = filters.CharFilter(method="params_filter")
     shirina_b = filters.CharFilter(method="params_filter")
+    diametr_min = filters.NumberFilter(method="params_range_filter")
+    diametr_max = filters.NumberFilter(method="params_range_filter")
+    tolshina_stenki_min = filters.NumberFilter(method="params_range_filter")
+    tolshina_stenki_max = filters.NumberFilter(method="params_range_filter")
+    dlina_min = filters.NumberFilter(method="params_range_filter")
+    dlina_max = filters.NumberFilter(method="params_range_filter")
+    vysota_h_min = filters.NumberFilter(method="params_range_filter")
+    vysota_h_max = filters.NumberFilter(method="params_range_filter")
+    shirina_b_min = filters.NumberFilter(method="params_range_filter")
+    shirina_b_max = filters.NumberFilter(method="params_range_filter")
 
-    sort = PropertiesOrderingFilter()
+    sort = PropertiesOrderingFilter(fields=(("display_ton_price", "price"),))
 
     class Meta:
         model = Product
@@ -121,7 +129,16 @@ class ProductFilter(filters.FilterSet):
 
     def params_filter(self, queryset, name, value):
         property_values = ProductPropertyValue.objects.filter(
-            property__code=name, value=value
+            property__code=name, value_key=ProductPropertyValue.get_value_key(value)
+        )
+        return queryset.filter(properties_through__in=property_values)
+
+    def params_range_filter(self, queryset, name, value):
+        # diametr_min -> value_numeric >= value у свойства diametr
+        code, bound = name.rsplit("_", 1)
+        lookup = "gte" if bound == "min" else "lte"
+        property_values = ProductPropertyValue.objects.filter(
+            property__code=code, **{f"value_numeric__{lookup}": value}
         )
         return queryset.filter(properties_through__in=property_values)
 
@@ -0,0 +1,106 @@
+import json
+import platform
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from backend.catalog.services.benchmark import (
+    PAGE_SIZES,
+    benchmark_page,
+    get_snapshot_pages,
+    get_synthetic_pages,
+)
+from backend.catalog.services.page_parser import HTML_BACKENDS
+
+
+def _get_commit() -> str:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return result.stdout.strip()
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет скорость разбора и сохранения страниц категорий: продуктов в "
+        "секунду, пиковую память и запросов к БД на продукт. Запускать на "
+        "локальной базе: сохранение идет в откатываемой транзакции"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            choices=list(PAGE_SIZES),
+            default=list(PAGE_SIZES),
+            help="Синтетические страницы: "
+            + ", ".join(f"{name} - {rows} строк" for name, rows in PAGE_SIZES.items()),
+        )
+        parser.add_argument(
+            "--snapshots",
+            type=int,
+            default=0,
+            metavar="N",
+            help="Вместо синтетических страниц взять N сохраненных снимков категорий",
+        )
+        parser.add_argument(
+            "--backend",
+            choices=list(HTML_BACKENDS),
+            default=settings.PARSER_HTML_BACKEND,
+            help="Бэкенд потокового разбора HTML",
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="Повторов замера")
+        parser.add_argument(
+            "--no-persist",
+            action="store_true",
+            help="Не замерять сохранение в БД",
+        )
+        parser.add_argument(
+            "--output",
+            help="Файл для результатов в JSON, чтобы сравнивать коммиты",
+        )
+
+    def handle(
+        self, *args, sizes, snapshots, backend, repeat, no_persist, output, **options
+    ):
+        pages = (
+            get_snapshot_pages(snapshots) if snapshots else get_synthetic_pages(sizes)
+        )
+        results = []
+        for page in pages:
+            result = benchmark_page(
+                page, backend, repeat=repeat, persist=not no_persist
+            )
+            results.append(result)
+            self.stdout.write(f"{result['page']}: {result['products']} продуктов")
+            for stage, stage_result in result["stages"].items():
+                self.stdout.write(
+                    f"  {stage}: {stage_result['products_per_second']} прод/с, "
+                    f"{stage_result['peak_memory_kb']} КБ, "
+                    f"{stage_result['queries_per_product']} запр/прод"
+                )
+
+        if not results:
+            self.stdout.write(self.style.WARNING("Нет страниц для замера"))
+            return
+
+        if output:
+            report = {
+                "commit": _get_commit(),
+                "created_at": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "backend": backend,
+                "repeat": repeat,
+                "results": results,
+            }
+            with open(output, "w") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результаты записаны в {output}"))
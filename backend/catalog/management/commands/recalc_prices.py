@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from backend.catalog.services.prices import recalculate_all_prices
+from backend.catalog.tasks import recalculate_prices_task
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает цены метра и штуки всего каталога по цене тонны, весу метра "
+        "и длине: по диапазонам id, одним UPDATE на диапазон"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            help="Продуктов в одном UPDATE, по умолчанию PRICES_RECALCULATE_CHUNK_SIZE",
+        )
+        parser.add_argument(
+            "--async",
+            action="store_true",
+            dest="run_async",
+            help="Поставить пересчет в очередь Celery вместо выполнения здесь",
+        )
+
+    def handle(self, *args, chunk_size, run_async, **options):
+        if run_async:
+            task = recalculate_prices_task.delay()
+            self.stdout.write(f"Пересчет поставлен в очередь: {task.id}")
+            return
+
+        result = recalculate_all_prices(chunk_size)
+        speed = result.updated_count / result.seconds if result.seconds else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Пересчитаны цены {result.updated_count} продуктов за "
+                f"{result.seconds:.2f} сек ({result.chunks_count} частей, "
+                f"{speed:.0f} прод/с)"
+            )
+        )
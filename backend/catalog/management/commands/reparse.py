@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand
+from requests.exceptions import HTTPError
+
+from backend.catalog.models import Category
+from backend.catalog.services.fetch import PageFetchResult
+from backend.catalog.services.page_parser import parse_category_page
+from backend.catalog.services.snapshots import load_snapshot
+from backend.catalog.tasks import get_category_page_url, process_category_page
+
+
+class Command(BaseCommand):
+    help = (
+        "Повторно разбирает сохраненные снимки страниц категорий "
+        "(PARSER_SNAPSHOTS_ENABLED) без обращения к mc.ru"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "categories",
+            nargs="*",
+            type=int,
+            help="id категорий, по умолчанию все листовые категории",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только разобрать страницы, ничего не сохраняя в БД",
+        )
+
+    def handle(self, *args, categories, dry_run, **options):
+        queryset = Category.objects.filter(numchild=0).exclude(parse_url="")
+        if categories:
+            queryset = queryset.filter(id__in=categories)
+
+        pages_count = pages_size = 0
+        total_time = 0.0
+        for category in queryset.order_by("path"):
+            text = load_snapshot(get_category_page_url(category))
+            if text is None:
+                continue
+
+            started_at = time.perf_counter()
+            parsed = parse_category_page([text])
+            if dry_run:
+                result = f"Спаршено {len(parsed.products)} продуктов."
+            else:
+                page = PageFetchResult(
+                    text=text,
+                    etag=category.parse_etag,
+                    last_modified=category.parse_last_modified,
+                    content_hash=parsed.content_hash,
+                    page_bytes=len(text.encode()),
+                    parsed=parsed,
+                )
+                try:
+                    result = process_category_page(
+                        category, page, force=True, offline=True
+                    )
+                except HTTPError as e:
+                    result = str(e)
+            elapsed = time.perf_counter() - started_at
+
+            pages_count += 1
+            pages_size += len(text)
+            total_time += elapsed
+            self.stdout.write(f"{category}: {result} ({elapsed:.2f} с)")
+
+        if not pages_count:
+            self.stdout.write(self.style.WARNING("Снимков страниц не найдено"))
+            return
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Разобрано {pages_count} страниц ({pages_size / 1024 / 1024:.1f} МБ) "
+                f"за {total_time:.1f} с, {pages_count / total_time:.1f} стр/с"
+            )
+        )
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0005_productproperty_is_sortable"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="parse_content_hash",
+            field=models.CharField(
+                blank=True, max_length=64, verbose_name="Хэш страницы парсинга"
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="parse_etag",
+            field=models.CharField(
+                blank=True, max_length=250, verbose_name="ETag страницы парсинга"
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="parse_last_modified",
+            field=models.CharField(
+                blank=True,
+                max_length=100,
+                verbose_name="Last-Modified страницы парсинга",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0006_category_parse_cache"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="idb",
+            field=models.CharField(blank=True, max_length=50, verbose_name="idb"),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="idf",
+            field=models.CharField(blank=True, max_length=50, verbose_name="idf"),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="idt",
+            field=models.CharField(blank=True, max_length=50, verbose_name="idt"),
+        ),
+    ]
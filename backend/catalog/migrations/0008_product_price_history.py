@@ -0,0 +1,58 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0007_product_mc_ids"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="parse_fingerprint",
+            field=models.CharField(
+                blank=True, max_length=40, verbose_name="Отпечаток парсинга"
+            ),
+        ),
+        migrations.CreateModel(
+            name="ProductPriceHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Дата")),
+                (
+                    "ton_price",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=20, verbose_name="Цена за тонну"
+                    ),
+                ),
+                ("in_stock", models.BooleanField(verbose_name="В наличии")),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="price_history",
+                        to="catalog.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "История цены продукта",
+                "verbose_name_plural": "История цен продуктов",
+                "db_table": "catalog_product_price_history",
+                "ordering": ("date",),
+                "unique_together": {("product", "date")},
+            },
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0008_product_price_history"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ParseRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "started_at",
+                    models.DateTimeField(db_index=True, verbose_name="Начало"),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("success", "Успешно"),
+                            ("unchanged", "Страница не изменилась"),
+                            ("empty", "Категория пуста"),
+                            ("blocked", "Блокировка парсинга"),
+                            ("failed", "Ошибка"),
+                        ],
+                        max_length=20,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "fetch_time",
+                    models.FloatField(default=0, verbose_name="Загрузка, сек"),
+                ),
+                (
+                    "parse_time",
+                    models.FloatField(default=0, verbose_name="Разбор, сек"),
+                ),
+                (
+                    "persist_time",
+                    models.FloatField(default=0, verbose_name="Сохранение, сек"),
+                ),
+                ("total_time", models.FloatField(default=0, verbose_name="Всего, сек")),
+                (
+                    "page_bytes",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Размер страницы"
+                    ),
+                ),
+                (
+                    "products_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Спаршено"),
+                ),
+                (
+                    "created_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Добавлено"),
+                ),
+                (
+                    "updated_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Обновлено"),
+                ),
+                (
+                    "queries_count",
+                    models.PositiveIntegerField(default=0, verbose_name="SQL-запросов"),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="Ошибка")),
+                (
+                    "category",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="parse_runs",
+                        to="catalog.category",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Запуск парсинга",
+                "verbose_name_plural": "Запуски парсинга",
+                "db_table": "catalog_parse_run",
+                "ordering": ("-started_at",),
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0009_parse_run"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryPropertyMapping",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "column",
+                    models.CharField(
+                        choices=[
+                            ("size", "Размер"),
+                            ("mark", "Марка"),
+                            ("length", "Длина"),
+                        ],
+                        max_length=20,
+                        verbose_name="Колонка таблицы",
+                    ),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="property_mappings",
+                        to="catalog.category",
+                    ),
+                ),
+                (
+                    "property",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Если не указано, колонка не сохраняется",
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="category_mappings",
+                        to="catalog.productproperty",
+                        verbose_name="Свойство",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Свойство колонки парсинга",
+                "verbose_name_plural": "Свойства колонок парсинга",
+                "db_table": "catalog_category_property_mapping",
+                "unique_together": {("category", "column")},
+            },
+        ),
+    ]
@@ -0,0 +1,135 @@
+from django.db import migrations
+
+# Списки категорий, которые раньше были зашиты в парсер
+SIZE_IS_H = [
+    "Балки (Двутавр)",
+    "Балки (Двутавр) низколегированные",
+    "Швеллер",
+    "Швеллер гнутый",
+    "Швеллер низколегированный",
+    "Уголок неравнополочный",
+    "Уголок нержавеющий никельсодержащий",
+    "Уголок равнополочный",
+    "Уголок равнополочный низколегированный",
+    "Уголок равнополочный судостроительный",
+    "Лист г/к",
+    "Лист г/к конструкционный",
+    "Лист г/к мостостроительный",
+    "Лист г/к низколегированный",
+    "Лист г/к Ст3",
+    "Лист г/к судостроительный",
+    "Лист нержавеющий без никеля",
+    "Лист нержавеющий никельсодержащий",
+    "Лист нержавеющий ПВЛ",
+    "Лист оцинкованный",
+    "Лист рифленый",
+    "Лист холоднокатанный х/к",
+    "Лист холоднокатанный х/к Ст",
+    "Лист просечно-вытяжной (ПВЛ)",
+]
+SIZE_IS_B = [
+    "Полоса оцинкованная",
+    "Квадрат  горячекатаный",
+    "Полоса г/к",
+    "Полоса г/к оцинкованная",
+    "Полоса нержавеющая никельсодержащая",
+]
+LENGTH_IS_POVERKHNOST = [
+    "Лист г/к",
+    "Лист г/к конструкционный",
+    "Лист г/к мостостроительный",
+    "Лист г/к низколегированный",
+    "Лист г/к Ст3",
+    "Лист г/к судостроительный",
+    "Лист нержавеющий без никеля",
+    "Лист нержавеющий никельсодержащий",
+    "Лист нержавеющий ПВЛ",
+    "Лист оцинкованный",
+    "Лист рифленый",
+    "Лист холоднокатанный х/к",
+    "Лист холоднокатанный х/к Ст",
+    "Лист просечно-вытяжной (ПВЛ)",
+]
+MARK_IS_DLINA = [
+    "Лист рифленый",
+]
+MARK_IS_SHIRINA = [
+    "Рулоны г/к",
+    "Рулоны нержавеющие",
+    "Рулоны оцинкованные",
+    "Рулоны оцинкованные с полимерным покрытием",
+    "Рулоны х/к",
+]
+MARK_IS_STENKA = [
+    "Трубы стальные горячедеформированные",
+    "Трубы стальные холоднодеформированные",
+]
+MARK_IS_NONE = [
+    "Трубы оцинкованные квадратные",
+    "Трубы оцинкованные круглые",
+    "Трубы оцинкованные прямоугольные",
+    "Доборные элементы",
+    "Саморезы кровельные",
+]
+MARK_IS_PROFIL = [
+    "Профнастил Н114",
+    "Профнастил Н57",
+    "Профнастил Н60",
+    "Профнастил Н75",
+    "Профнастил НС35",
+    "Профнастил НС44",
+    "Профнастил окрашенный",
+    "Профнастил оцинкованный",
+    "Профнастил С10",
+    "Профнастил С20",
+    "Профнастил С21",
+    "Профнастил С44",
+    "Профнастил С8",
+]
+
+SIZE_CODES = [(SIZE_IS_H, "vysota-h"), (SIZE_IS_B, "shirina-b")]
+MARK_CODES = [
+    (MARK_IS_DLINA, "dlina"),
+    (MARK_IS_SHIRINA, "shirina-b"),
+    (MARK_IS_STENKA, "stenka"),
+    (MARK_IS_PROFIL, "profil"),
+    (MARK_IS_NONE, ""),
+]
+LENGTH_CODES = [(LENGTH_IS_POVERKHNOST, "poverkhnost")]
+
+
+def fill_mappings(apps, schema_editor):
+    Category = apps.get_model("catalog", "Category")
+    CategoryPropertyMapping = apps.get_model("catalog", "CategoryPropertyMapping")
+    ProductProperty = apps.get_model("catalog", "ProductProperty")
+
+    properties = dict(ProductProperty.objects.values_list("code", "id"))
+    mappings = []
+    for column, codes in (
+        ("size", SIZE_CODES),
+        ("mark", MARK_CODES),
+        ("length", LENGTH_CODES),
+    ):
+        for names, code in codes:
+            # Если свойства нет, колонка не сохранялась и раньше
+            for category_id in Category.objects.filter(
+                parsed_name__in=names
+            ).values_list("id", flat=True):
+                mappings.append(
+                    CategoryPropertyMapping(
+                        category_id=category_id,
+                        column=column,
+                        property_id=properties.get(code),
+                    )
+                )
+    CategoryPropertyMapping.objects.bulk_create(mappings, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0010_category_property_mapping"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_mappings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:54
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0011_fill_category_property_mappings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="change_rate",
+            field=models.FloatField(
+                default=0,
+                help_text="Доля последних парсингов, в которых менялись продукты",
+                verbose_name="Частота изменений",
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="next_parse_at",
+            field=models.DateTimeField(
+                blank=True, db_index=True, null=True, verbose_name="Следующий парсинг"
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="parse_interval",
+            field=models.DurationField(
+                default=datetime.timedelta(days=1), verbose_name="Интервал парсинга"
+            ),
+        ),
+    ]
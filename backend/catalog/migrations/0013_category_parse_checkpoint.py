@@ -0,0 +1,31 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0012_category_parse_schedule"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="parse_checkpoint_hash",
+            field=models.CharField(
+                blank=True,
+                max_length=64,
+                verbose_name="Хэш страницы прерванного сохранения",
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="parse_checkpoint_index",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="С какого продукта страницы продолжить сохранение",
+                verbose_name="Сохранено продуктов до прерывания",
+            ),
+        ),
+    ]
@@ -0,0 +1,155 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Поля, которые заполняют вручную: у оставшегося продукта пустое значение
+# заменяется значением дубля, разные непустые значения - конфликт
+MANUAL_FIELDS = [
+    "description",
+    "image",
+    "custom_ton_price",
+    "custom_unit_price",
+    "custom_meter_price",
+    "seo_title",
+    "seo_description",
+    "h1",
+]
+
+
+def merge_fields(kept, duplicates):
+    """
+    Переносит на оставшийся продукт заполненные у дублей поля. Возвращает
+    названия полей с разными непустыми значениями
+    """
+    conflicts = []
+    for name in MANUAL_FIELDS:
+        values = {getattr(product, name) for product in [kept, *duplicates]}
+        values = {value for value in values if value}
+        if len(values) > 1:
+            conflicts.append(name)
+        elif values:
+            setattr(kept, name, values.pop())
+    # Флаги, отличные от значения по умолчанию, выставлены вручную
+    kept.always_in_stock = any(p.always_in_stock for p in [kept, *duplicates])
+    kept.is_index = all(p.is_index for p in [kept, *duplicates])
+    kept.is_follow = all(p.is_follow for p in [kept, *duplicates])
+    return conflicts
+
+
+def merge_property_values(ProductPropertyValue, kept, duplicates):
+    """
+    Переносит значения свойств дублей, которых нет у оставшегося продукта.
+    Возвращает id свойств с разными непустыми значениями
+    """
+    values = {
+        value.property_id: value
+        for value in ProductPropertyValue.objects.filter(product=kept)
+    }
+    conflicts = []
+    for value in ProductPropertyValue.objects.filter(product__in=duplicates):
+        kept_value = values.get(value.property_id)
+        if kept_value is None:
+            value.product = kept
+            value.save()
+            values[value.property_id] = value
+        elif not kept_value.value:
+            kept_value.value = value.value
+            kept_value.save()
+        elif value.value and value.value != kept_value.value:
+            conflicts.append(value.property_id)
+    return conflicts
+
+
+def merge_links(ProductCategories, kept, duplicates):
+    kept_links = ProductCategories.objects.filter(product=kept)
+    categories = set(kept_links.values_list("category_id", flat=True))
+    has_primary = kept_links.filter(is_primary=True).exists()
+    # Привязки дублей к категориям переносим на оставшийся продукт
+    links = []
+    for link in ProductCategories.objects.filter(product__in=duplicates):
+        if link.category_id in categories:
+            continue
+        categories.add(link.category_id)
+        links.append(
+            ProductCategories(
+                product=kept,
+                category_id=link.category_id,
+                is_display=link.is_display,
+                is_primary=link.is_primary and not has_primary,
+            )
+        )
+        has_primary = has_primary or link.is_primary
+    ProductCategories.objects.bulk_create(links)
+
+
+def merge_price_history(ProductPriceHistory, kept, duplicates):
+    # За день, который уже есть у оставшегося продукта, его запись и остается
+    dates = set(
+        ProductPriceHistory.objects.filter(product=kept).values_list("date", flat=True)
+    )
+    for record in ProductPriceHistory.objects.filter(product__in=duplicates).order_by(
+        "date"
+    ):
+        if record.date in dates:
+            continue
+        dates.add(record.date)
+        record.product = kept
+        record.save()
+
+
+def dedupe_parse_urls(apps, schema_editor):
+    Product = apps.get_model("catalog", "Product")
+    ProductCategories = apps.get_model("catalog", "ProductCategories")
+    ProductPriceHistory = apps.get_model("catalog", "ProductPriceHistory")
+    ProductPropertyValue = apps.get_model("catalog", "ProductPropertyValue")
+
+    # Пустой URL у товаров, заведенных вручную, не должен попасть под уникальность
+    Product.objects.filter(parse_url="").update(parse_url=None)
+
+    duplicated = (
+        Product.objects.exclude(parse_url=None)
+        .values("parse_url")
+        .annotate(count=Count("id"))
+        .filter(count__gt=1)
+        .values_list("parse_url", flat=True)
+    )
+    conflicts = []
+    for parse_url in list(duplicated):
+        # Оставляем продукт в наличии, обновлявшийся последним
+        kept, *duplicates = Product.objects.filter(parse_url=parse_url).order_by(
+            "-in_stock", "-updated_date", "id"
+        )
+        fields = merge_fields(kept, duplicates)
+        properties = merge_property_values(ProductPropertyValue, kept, duplicates)
+        if fields or properties:
+            ids = [kept.id, *(product.id for product in duplicates)]
+            conflicts.append(f"{ids}: поля {fields}, свойства {properties}")
+            continue
+        kept.save()
+        merge_links(ProductCategories, kept, duplicates)
+        merge_price_history(ProductPriceHistory, kept, duplicates)
+        Product.objects.filter(id__in=[product.id for product in duplicates]).delete()
+
+    # Миграция идет в транзакции: перенесенное выше откатится
+    if conflicts:
+        raise RuntimeError(
+            "Дубли продуктов по parse_url с разными данными, объедините их "
+            "вручную и повторите миграцию:\n" + "\n".join(conflicts)
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0013_category_parse_checkpoint"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="product",
+            name="parse_url",
+            field=models.URLField(
+                blank=True, max_length=500, null=True, verbose_name="URL парсинга"
+            ),
+        ),
+        migrations.RunPython(dedupe_parse_urls, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0014_product_parse_url_dedupe"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="product",
+            name="parse_url",
+            field=models.URLField(
+                blank=True,
+                max_length=500,
+                null=True,
+                unique=True,
+                verbose_name="URL парсинга",
+            ),
+        ),
+    ]
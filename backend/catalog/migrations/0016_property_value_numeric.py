@@ -0,0 +1,86 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:18
+
+import math
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+# Копия ProductPropertyValue.get_value_numeric/get_value_key на момент миграции
+def get_value_numeric(value):
+    try:
+        number = float(value.replace(",", "."))
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def get_value_key(value):
+    number = get_value_numeric(value)
+    if number is None:
+        return " ".join(value.strip().replace(",", ".").split())
+    return str(int(number)) if number.is_integer() else repr(number)
+
+
+def fill_values(apps, schema_editor):
+    ProductPropertyValue = apps.get_model("catalog", "ProductPropertyValue")
+
+    last_id = 0
+    while True:
+        values = list(
+            ProductPropertyValue.objects.filter(id__gt=last_id)
+            .only("id", "value")
+            .order_by("id")[:BATCH_SIZE]
+        )
+        if not values:
+            break
+        last_id = values[-1].id
+        for value in values:
+            value.value_numeric = get_value_numeric(value.value)
+            value.value_key = get_value_key(value.value)
+        ProductPropertyValue.objects.bulk_update(values, ["value_numeric", "value_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0015_product_parse_url_unique"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productpropertyvalue",
+            name="value_key",
+            field=models.CharField(
+                blank=True,
+                help_text="Значение в едином написании, для фильтров и списка значений",
+                max_length=250,
+                verbose_name="Ключ значения",
+            ),
+        ),
+        migrations.AddField(
+            model_name="productpropertyvalue",
+            name="value_numeric",
+            field=models.FloatField(
+                blank=True,
+                help_text="Заполняется из значения, для сортировки и фильтров по диапазону",
+                null=True,
+                verbose_name="Числовое значение",
+            ),
+        ),
+        # Индексы - после заполнения, чтобы не перестраивать их на каждой пачке
+        migrations.RunPython(fill_values, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="productpropertyvalue",
+            index=models.Index(
+                fields=["property", "value_numeric"], name="catalog_value_numeric_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productpropertyvalue",
+            index=models.Index(
+                fields=["property", "value_key"], name="catalog_value_key_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:24
+
+from django.db import migrations, models
+
+# Копия services.prices.DISPLAY_PRICES_SQL на момент миграции, для всего каталога
+FILL_DISPLAY_PRICES_SQL = """
+WITH coefficient AS (
+    SELECT DISTINCT ON (p.id)
+        p.id AS product_id,
+        coalesce(c.price_coefficient, 1) AS coefficient
+    FROM catalog_product AS p
+    LEFT JOIN catalog_product_categories AS pc
+        ON pc.product_id = p.id AND pc.is_primary
+    LEFT JOIN catalog_category AS c ON c.id = pc.category_id
+    ORDER BY p.id, c.id
+),
+price AS (
+    SELECT
+        p.id,
+        coalesce(nullif(p.custom_ton_price, 0), p.ton_price) * k.coefficient
+            AS ton,
+        coalesce(nullif(p.custom_meter_price, 0), p.meter_price) * k.coefficient
+            AS meter,
+        coalesce(nullif(p.custom_unit_price, 0), p.unit_price) * k.coefficient
+            AS unit
+    FROM catalog_product AS p
+    JOIN coefficient AS k ON k.product_id = p.id
+)
+UPDATE catalog_product AS p
+SET
+    display_ton_price = CASE WHEN price.ton = 0 THEN 0 ELSE (
+        div(round(price.ton), 100) + 1
+    ) * 100 END,
+    display_meter_price = ceil(price.meter),
+    display_unit_price = ceil(price.unit)
+FROM price
+WHERE p.id = price.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0016_property_value_numeric"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="display_meter_price",
+            field=models.DecimalField(
+                db_index=True,
+                decimal_places=2,
+                default=0.0,
+                editable=False,
+                max_digits=20,
+                verbose_name="Цена за метр на сайте",
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="display_ton_price",
+            field=models.DecimalField(
+                db_index=True,
+                decimal_places=2,
+                default=0.0,
+                editable=False,
+                max_digits=20,
+                verbose_name="Цена за тонну на сайте",
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="display_unit_price",
+            field=models.DecimalField(
+                db_index=True,
+                decimal_places=2,
+                default=0.0,
+                editable=False,
+                max_digits=20,
+                verbose_name="Цена за штуку на сайте",
+            ),
+        ),
+        migrations.RunSQL(FILL_DISPLAY_PRICES_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.11 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0017_product_display_prices"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="parse_queued_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Сбрасывается, когда разбор завершен",
+                null=True,
+                verbose_name="Поставлена в очередь парсинга",
+            ),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import math
+from datetime import timedelta
 from functools import partial
 
 from django.db import models
@@ -18,6 +20,8 @@ class BaseModel(models.Model):
 
 
 class SEOModel(models.Model):
+    # bulk_create получает уже уникальные slug (get_unique_slug) и сохраняет их,
+    # при создании через save() slug генерируется заново (signals.py)
     slug = AutoSlugField(
         verbose_name="slug",
         editable=True,
@@ -25,6 +29,7 @@ class SEOModel(models.Model):
         populate_from="name",
         slugify_function=partial(slugify, replacements=[["я", "ya"], ["/", ""]]),
         max_length=150,
+        overwrite_on_add=False,
     )
     seo_title = models.CharField(max_length=350, blank=True, verbose_name="SEO Title")
     seo_description = models.CharField(
@@ -57,6 +62,40 @@ class Category(BaseModel, SEOModel, MP_Node):  # type: ignore
     is_parsing_successful = models.BooleanField(
         verbose_name="Парсинг успешный", default=False
     )
+    parse_etag = models.CharField(
+        verbose_name="ETag страницы парсинга", max_length=250, blank=True
+    )
+    parse_last_modified = models.CharField(
+        verbose_name="Last-Modified страницы парсинга", max_length=100, blank=True
+    )
+    parse_content_hash = models.CharField(
+        verbose_name="Хэш страницы парсинга", max_length=64, blank=True
+    )
+    parse_checkpoint_hash = models.CharField(
+        verbose_name="Хэш страницы прерванного сохранения", max_length=64, blank=True
+    )
+    parse_checkpoint_index = models.PositiveIntegerField(
+        verbose_name="Сохранено продуктов до прерывания",
+        default=0,
+        help_text="С какого продукта страницы продолжить сохранение",
+    )
+    parse_interval = models.DurationField(
+        verbose_name="Интервал парсинга", default=timedelta(days=1)
+    )
+    next_parse_at = models.DateTimeField(
+        verbose_name="Следующий парсинг", blank=True, null=True, db_index=True
+    )
+    parse_queued_at = models.DateTimeField(
+        verbose_name="Поставлена в очередь парсинга",
+        blank=True,
+        null=True,
+        help_text="Сбрасывается, когда разбор завершен",
+    )
+    change_rate = models.FloatField(
+        verbose_name="Частота изменений",
+        default=0,
+        help_text="Доля последних парсингов, в которых менялись продукты",
+    )
     image = models.ImageField(
         verbose_name="Изображение", upload_to="categories/", blank=True
     )
@@ -110,13 +149,53 @@ class ProductProperty(BaseModel):
         db_table = "catalog_product_property"
 
 
+class CategoryPropertyMapping(models.Model):
+    """
+    В какое свойство продукта пишется колонка таблицы товаров mc.ru. Настройка
+    действует на категорию и всех ее потомков, если у них нет своей
+    """
+
+    class Column(models.TextChoices):
+        SIZE = "size", "Размер"
+        MARK = "mark", "Марка"
+        LENGTH = "length", "Длина"
+
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="property_mappings"
+    )
+    column = models.CharField(
+        verbose_name="Колонка таблицы", max_length=20, choices=Column.choices
+    )
+    property = models.ForeignKey(
+        ProductProperty,
+        verbose_name="Свойство",
+        on_delete=models.CASCADE,
+        related_name="category_mappings",
+        blank=True,
+        null=True,
+        help_text="Если не указано, колонка не сохраняется",
+    )
+
+    def __str__(self) -> str:
+        return f"{self.category}: {self.get_column_display()}"
+
+    class Meta:
+        unique_together = ("category", "column")
+        verbose_name = "Свойство колонки парсинга"
+        verbose_name_plural = "Свойства колонок парсинга"
+        db_table = "catalog_category_property_mapping"
+
+
 class Product(BaseModel, SEOModel):
     image = models.FileField(
         verbose_name="Изображение", upload_to="products/", blank=True
     )
     name = models.CharField(verbose_name="Название продукта", max_length=500)
     description = models.TextField(verbose_name="Описание", max_length=2500, blank=True)
-    parse_url = models.URLField(verbose_name="URL парсинга", blank=True, max_length=500)
+    # Уникален: по нему парсер делает upsert. У товаров, заведенных вручную, NULL
+    parse_url = models.URLField(
+        verbose_name="URL парсинга", blank=True, null=True, unique=True, max_length=500
+    )
     unit_price = models.DecimalField(
         verbose_name="Цена за штуку",
         max_digits=20,
@@ -159,6 +238,33 @@ class Product(BaseModel, SEOModel):
         default=0.00,
         help_text="Приоритет отображения цены выше, чем у спаршеной",
     )
+    # Цены для витрины: своя или спаршенная цена с коэффициентом главной
+    # категории. Обновляются пересчетом цен (services.prices), по ним API
+    # сортирует и фильтрует
+    display_ton_price = models.DecimalField(
+        verbose_name="Цена за тонну на сайте",
+        max_digits=20,
+        decimal_places=2,
+        default=0.00,
+        editable=False,
+        db_index=True,
+    )
+    display_meter_price = models.DecimalField(
+        verbose_name="Цена за метр на сайте",
+        max_digits=20,
+        decimal_places=2,
+        default=0.00,
+        editable=False,
+        db_index=True,
+    )
+    display_unit_price = models.DecimalField(
+        verbose_name="Цена за штуку на сайте",
+        max_digits=20,
+        decimal_places=2,
+        default=0.00,
+        editable=False,
+        db_index=True,
+    )
     categories = models.ManyToManyField[Category, "ProductCategories"](
         Category,
         verbose_name="Категории",
@@ -171,6 +277,14 @@ class Product(BaseModel, SEOModel):
         related_name="products",
         through="ProductPropertyValue",
     )
+    # Идентификаторы товара на mc.ru, нужны для запроса веса метра
+    idt = models.CharField(verbose_name="idt", max_length=50, blank=True)
+    idf = models.CharField(verbose_name="idf", max_length=50, blank=True)
+    idb = models.CharField(verbose_name="idb", max_length=50, blank=True)
+    # Отпечаток спаршенных данных: строку не перезаписываем, если он не изменился
+    parse_fingerprint = models.CharField(
+        verbose_name="Отпечаток парсинга", max_length=40, blank=True
+    )
     in_stock = models.BooleanField(verbose_name="В наличии", default=True)
     always_in_stock = models.BooleanField(
         verbose_name="Всегда в наличии",
@@ -203,6 +317,29 @@ class ProductCategories(models.Model):
         db_table = "catalog_product_categories"
 
 
+class ProductPriceHistory(models.Model):
+    """
+    История цены и наличия продукта. Пишется только при изменениях, по одной
+    строке на продукт за день: повторное изменение в тот же день обновляет строку
+    """
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="price_history"
+    )
+    date = models.DateField(verbose_name="Дата")
+    ton_price = models.DecimalField(
+        verbose_name="Цена за тонну", max_digits=20, decimal_places=2
+    )
+    in_stock = models.BooleanField(verbose_name="В наличии")
+
+    class Meta:
+        unique_together = ("product", "date")
+        verbose_name = "История цены продукта"
+        verbose_name_plural = "История цен продуктов"
+        ordering = ("date",)
+        db_table = "catalog_product_price_history"
+
+
 class ProductPropertyValue(models.Model):
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name="properties_through"
@@ -211,14 +348,110 @@ class ProductPropertyValue(models.Model):
         ProductProperty, on_delete=models.CASCADE, related_name="values_through"
     )
     value = models.CharField(verbose_name="Значение", max_length=250, blank=True)
+    value_numeric = models.FloatField(
+        verbose_name="Числовое значение",
+        null=True,
+        blank=True,
+        help_text="Заполняется из значения, для сортировки и фильтров по диапазону",
+    )
+    value_key = models.CharField(
+        verbose_name="Ключ значения",
+        max_length=250,
+        blank=True,
+        help_text="Значение в едином написании, для фильтров и списка значений",
+    )
 
     class Meta:
         unique_together = ("product", "property")
+        indexes = [
+            models.Index(
+                fields=["property", "value_numeric"],
+                name="catalog_value_numeric_idx",
+            ),
+            models.Index(
+                fields=["property", "value_key"],
+                name="catalog_value_key_idx",
+            ),
+        ]
         verbose_name = "Значение свойства продукта"
         verbose_name_plural = "Значения свойств продукта"
         ordering = ("property__ordering",)
         db_table = "catalog_product_property_value"
 
+    @staticmethod
+    def normalize_value(value: str) -> str:
+        return value.strip().replace(",", ".")
+
+    @staticmethod
+    def get_value_numeric(value: str) -> float | None:
+        try:
+            number = float(value.replace(",", "."))
+        except ValueError:
+            return None
+        return number if math.isfinite(number) else None
+
+    @classmethod
+    def get_value_key(cls, value: str) -> str:
+        """
+        Число - в одном написании ("2.50" и "2,5" -> "2.5", "6000.0" -> "6000"),
+        остальное - без лишних пробелов
+        """
+        number = cls.get_value_numeric(value)
+        if number is None:
+            return " ".join(cls.normalize_value(value).split())
+        return str(int(number)) if number.is_integer() else repr(number)
+
+    def fill_value(self) -> "ProductPropertyValue":
+        """
+        Нормализует значение и заполняет по нему value_numeric и value_key.
+        Вызывать перед bulk_create/bulk_update: save() делает это сам
+        """
+        self.value = self.normalize_value(self.value)
+        self.value_numeric = self.get_value_numeric(self.value)
+        self.value_key = self.get_value_key(self.value)
+        return self
+
     def save(self, *args, **kwargs) -> None:
-        self.value = self.value.strip().replace(",", ".")
+        self.fill_value()
         super().save(*args, **kwargs)
+
+
+class ParseRun(models.Model):
+    """
+    Один разбор страницы категории: время по этапам, объем страницы, количество
+    продуктов и SQL-запросов
+    """
+
+    class Status(models.TextChoices):
+        SUCCESS = "success", "Успешно"
+        UNCHANGED = "unchanged", "Страница не изменилась"
+        EMPTY = "empty", "Категория пуста"
+        BLOCKED = "blocked", "Блокировка парсинга"
+        FAILED = "failed", "Ошибка"
+
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="parse_runs"
+    )
+    started_at = models.DateTimeField(verbose_name="Начало", db_index=True)
+    status = models.CharField(
+        verbose_name="Статус", max_length=20, choices=Status.choices
+    )
+    fetch_time = models.FloatField(verbose_name="Загрузка, сек", default=0)
+    parse_time = models.FloatField(verbose_name="Разбор, сек", default=0)
+    persist_time = models.FloatField(verbose_name="Сохранение, сек", default=0)
+    total_time = models.FloatField(verbose_name="Всего, сек", default=0)
+    page_bytes = models.PositiveIntegerField(verbose_name="Размер страницы", default=0)
+    products_count = models.PositiveIntegerField(verbose_name="Спаршено", default=0)
+    created_count = models.PositiveIntegerField(verbose_name="Добавлено", default=0)
+    updated_count = models.PositiveIntegerField(verbose_name="Обновлено", default=0)
+    queries_count = models.PositiveIntegerField(verbose_name="SQL-запросов", default=0)
+    error = models.TextField(verbose_name="Ошибка", blank=True)
+
+    def __str__(self) -> str:
+        return f"{self.category} {self.started_at:%d.%m.%Y %H:%M}"
+
+    class Meta:
+        verbose_name = "Запуск парсинга"
+        verbose_name_plural = "Запуски парсинга"
+        ordering = ("-started_at",)
+        db_table = "catalog_parse_run"
@@ -0,0 +1,22 @@
+import hmac
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+class HasMetricsToken(BasePermission):
+    """
+    Доступ сборщика метрик (Prometheus) по статическому токену из настройки
+    PARSER_METRICS_TOKEN: заголовок `Authorization: Bearer <токен>`.
+    Без токена в настройках доступ закрыт
+    """
+
+    def has_permission(self, request, view) -> bool:
+        token = settings.PARSER_METRICS_TOKEN
+        if not token:
+            return False
+        header = request.headers.get("Authorization", "")
+        auth_type, _, credentials = header.partition(" ")
+        return auth_type == "Bearer" and hmac.compare_digest(
+            credentials.encode(), token.encode()
+        )
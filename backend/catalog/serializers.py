@@ -1,5 +1,3 @@
-import math
-
 from django.conf import settings
 from drf_spectacular.utils import extend_schema_field
 
@@ -12,6 +10,7 @@ from backend.catalog.services.categories import (
 )
 from backend.catalog.services.products import (
     get_img_path,
+    get_primary_category,
     get_related_products,
     get_same_category_products,
 )
@@ -81,43 +80,29 @@ class ProductListOutputSerializer(serializers.Serializer):
     id = serializers.IntegerField(read_only=True)
     name = serializers.CharField(read_only=True)
     slug = serializers.CharField(read_only=True)
-    ton_price_with_coef = serializers.SerializerMethodField(read_only=True)
-    unit_price_with_coef = serializers.SerializerMethodField(read_only=True)
-    meter_price_with_coef = serializers.SerializerMethodField(read_only=True)
+    ton_price_with_coef = serializers.IntegerField(
+        read_only=True, source="display_ton_price"
+    )
+    unit_price_with_coef = serializers.IntegerField(
+        read_only=True, source="display_unit_price"
+    )
+    meter_price_with_coef = serializers.IntegerField(
+        read_only=True, source="display_meter_price"
+    )
     properties = serializers.SerializerMethodField(read_only=True)
     in_stock = serializers.SerializerMethodField(read_only=True)
 
     def get_in_stock(self, obj):
         return obj.always_in_stock if obj.always_in_stock else obj.in_stock
 
-    def get_unit_price_with_coef(self, obj):
-        primary_category = obj.categories.filter(
-            product_categories__is_primary=True
-        ).first()
-        unit_price = obj.custom_unit_price or obj.unit_price
-        return math.ceil(unit_price * primary_category.price_coefficient)
-
-    def get_meter_price_with_coef(self, obj):
-        primary_category = obj.categories.filter(
-            product_categories__is_primary=True
-        ).first()
-        meter_price = obj.custom_meter_price or obj.meter_price
-        return math.ceil(meter_price * primary_category.price_coefficient)
-
-    def get_ton_price_with_coef(self, obj):
-        primary_category = obj.categories.filter(
-            product_categories__is_primary=True
-        ).first()
-        ton_price = obj.custom_ton_price if obj.custom_ton_price else obj.ton_price
-        if not ton_price:
-            return 0
-        return (round(ton_price * primary_category.price_coefficient) // 100 + 1) * 100
-
     @extend_schema_field(ProductPropertySerializer(many=True))
     def get_properties(self, obj):
-        return ProductPropertySerializer(
-            obj.properties_through.filter(property__is_display_in_list=True), many=True
-        ).data
+        properties = getattr(obj, "list_properties", None)
+        if properties is None:
+            properties = obj.properties_through.filter(
+                property__is_display_in_list=True
+            )
+        return ProductPropertySerializer(properties, many=True).data
 
 
 class ProductDetailOutputSerializer(ProductListOutputSerializer, SEOMixin):
@@ -132,16 +117,20 @@ class ProductDetailOutputSerializer(ProductListOutputSerializer, SEOMixin):
     related_products = serializers.SerializerMethodField(read_only=True)
 
     def get_category(self, obj):
-        return obj.categories.filter(product_categories__is_primary=True).first().name
+        category = get_primary_category(obj)
+        return category.name if category is not None else None
 
     def get_breadcrumbs(self, obj):
-        category = obj.categories.filter(product_categories__is_primary=True).first()
+        category = get_primary_category(obj)
         last_item = {
-            "level": category.depth + 1,
+            "level": category.depth + 1 if category is not None else 1,
             "name": obj.name,
             "href": f"/product/{obj.slug}",
             "disabled": True,
         }
+        # Продукт без категорий: в крошках только он сам
+        if category is None:
+            return [last_item]
         breadcrumbs = create_breadcrumbs(category, disable_last=False)
         breadcrumbs.append(last_item)
         return breadcrumbs
@@ -167,6 +156,37 @@ class ProductDetailOutputSerializer(ProductListOutputSerializer, SEOMixin):
         return img_path
 
 
+class ProductPriceHistoryFilterSerializer(serializers.Serializer):
+    days = serializers.IntegerField(required=False, min_value=1)
+
+
+class ProductPriceHistorySerializer(serializers.Serializer):
+    date = serializers.DateField(read_only=True)
+    ton_price = serializers.DecimalField(
+        read_only=True, max_digits=20, decimal_places=2
+    )
+    in_stock = serializers.BooleanField(read_only=True)
+
+
+class ParseRunStatsFilterSerializer(serializers.Serializer):
+    days = serializers.IntegerField(required=False, min_value=1, default=7)
+
+
+class ParseRunStatsSerializer(serializers.Serializer):
+    category_id = serializers.IntegerField(read_only=True)
+    category_name = serializers.CharField(read_only=True, source="category__name")
+    runs_count = serializers.IntegerField(read_only=True)
+    failed_count = serializers.IntegerField(read_only=True)
+    avg_fetch_time = serializers.FloatField(read_only=True)
+    avg_parse_time = serializers.FloatField(read_only=True)
+    avg_persist_time = serializers.FloatField(read_only=True)
+    avg_total_time = serializers.FloatField(read_only=True)
+    max_total_time = serializers.FloatField(read_only=True)
+    avg_page_bytes = serializers.FloatField(read_only=True)
+    avg_products_count = serializers.FloatField(read_only=True)
+    avg_queries_count = serializers.FloatField(read_only=True)
+
+
 class CategoryFilterSerializer(serializers.Serializer):
     name = serializers.CharField(required=False)
 
@@ -0,0 +1,179 @@
+"""
+Замеры парсера страниц категорий: продуктов в секунду, пиковая память
+(tracemalloc) и запросов к БД на продукт для разбора и сохранения.
+
+Страницы берутся синтетические, в разметке mc.ru из benchmark_pages.py, или из
+сохраненных снимков (services.snapshots). Сохранение выполняется в транзакции,
+которая откатывается, так что база не меняется, но замеры имеют смысл только
+на локальном Postgres.
+"""
+
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, replace
+from typing import Any
+
+from bs4 import BeautifulSoup
+from django.db import connection, transaction
+
+from backend.catalog.models import Category, ProductProperty
+from backend.catalog.services import snapshots
+from backend.catalog.services.benchmark_pages import make_category_page
+from backend.catalog.services.page_parser import parse_category_page
+from backend.catalog.services.persistence import ParsedProduct, save_category_products
+from backend.catalog.services.property_mappings import DEFAULT_PROPERTY_CODES
+
+# Размеры синтетических страниц: строк в таблице товаров
+PAGE_SIZES = {"small": 20, "medium": 500, "large": 5000}
+
+
+@dataclass
+class BenchmarkPage:
+    name: str
+    text: str
+
+
+class _QueryCounter:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def get_synthetic_pages(sizes: list[str]) -> Iterator[BenchmarkPage]:
+    for size in sizes:
+        yield BenchmarkPage(
+            f"{size}-{PAGE_SIZES[size]}", make_category_page(PAGE_SIZES[size])
+        )
+
+
+def get_snapshot_pages(limit: int) -> Iterator[BenchmarkPage]:
+    for i, ref in enumerate(snapshots.iter_snapshot_refs(snapshots.CATEGORY)):
+        if i >= limit:
+            break
+        yield BenchmarkPage(ref["url"], snapshots.load_object(ref["hash"]))
+
+
+def _get_stage_result(
+    seconds: float, products_count: int, peak_memory: int, queries_count: int = 0
+) -> dict[str, Any]:
+    return {
+        "seconds": round(seconds, 6),
+        "products_per_second": round(products_count / seconds, 1) if seconds else None,
+        "peak_memory_kb": round(peak_memory / 1024, 1),
+        "queries": queries_count,
+        "queries_per_product": (
+            round(queries_count / products_count, 3) if products_count else None
+        ),
+    }
+
+
+def _measure(func: Callable[[], Any], repeat: int) -> tuple[Any, float, int]:
+    """
+    Лучшее время из `repeat` запусков и пиковая память отдельного запуска:
+    tracemalloc замедляет выполнение и не должен влиять на время
+    """
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        seconds.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, min(seconds), peak_memory
+
+
+def _create_category() -> Category:
+    # Без свойств колонок таблицы сохранение не пишет значения свойств
+    for code in DEFAULT_PROPERTY_CODES.values():
+        ProductProperty.objects.get_or_create(code=code, defaults={"name": code})
+    return Category.add_root(
+        name="Benchmark",
+        parsed_name="Benchmark",
+        parse_url="https://mc.ru/metalloprokat/benchmark",
+    )
+
+
+def _save_once(products: list[ParsedProduct], trace_memory: bool) -> dict[str, tuple]:
+    """
+    Сохраняет продукты в новую категорию, затем обновляет им цены. Транзакция
+    откатывается. Возвращает {этап: (сек, пиковая память, запросов)}
+    """
+    changed = [replace(product, price=product.price + 1) for product in products]
+    results = {}
+    with transaction.atomic():
+        category = _create_category()
+        for stage, stage_products in (
+            ("persist_create", products),
+            ("persist_update", changed),
+        ):
+            counter = _QueryCounter()
+            if trace_memory:
+                tracemalloc.start()
+            started = time.perf_counter()
+            try:
+                with connection.execute_wrapper(counter):
+                    save_category_products(category, stage_products)
+                peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+            finally:
+                if trace_memory:
+                    tracemalloc.stop()
+            results[stage] = (time.perf_counter() - started, peak_memory, counter.count)
+        transaction.set_rollback(True)
+    return results
+
+
+def _benchmark_persist(
+    products: list[ParsedProduct], repeat: int
+) -> dict[str, dict[str, Any]]:
+    runs = [_save_once(products, trace_memory=False) for _ in range(repeat)]
+    traced = _save_once(products, trace_memory=True)
+    return {
+        stage: _get_stage_result(
+            min(run[stage][0] for run in runs),
+            len(products),
+            traced[stage][1],
+            traced[stage][2],
+        )
+        for stage in traced
+    }
+
+
+def benchmark_page(
+    page: BenchmarkPage, backend: str, repeat: int = 3, persist: bool = True
+) -> dict[str, Any]:
+    """
+    Замеряет на странице разбор по DOM (tasks.get_unique_products), потоковый
+    разбор (page_parser) и, если `persist`, создание и обновление продуктов
+    """
+    from backend.catalog.tasks import get_unique_products
+
+    products, seconds, peak_memory = _measure(
+        lambda: get_unique_products(BeautifulSoup(page.text, "html.parser")), repeat
+    )
+    stages = {"dom_parse": _get_stage_result(seconds, len(products), peak_memory)}
+
+    parsed, seconds, peak_memory = _measure(
+        lambda: parse_category_page([page.text], backend), repeat
+    )
+    stages["stream_parse"] = _get_stage_result(
+        seconds, len(parsed.products), peak_memory
+    )
+
+    if persist:
+        stages.update(_benchmark_persist(list(parsed.products.values()), repeat))
+
+    return {
+        "page": page.name,
+        "page_bytes": len(page.text.encode()),
+        "products": len(parsed.products),
+        "stages": stages,
+    }
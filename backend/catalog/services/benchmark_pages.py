@@ -0,0 +1,43 @@
+"""
+Синтетические страницы категорий mc.ru в той разметке, которую разбирает парсер.
+Используются в замерах парсера (manage.py benchmark_parser) и в тестах, чтобы
+замеры шли на той же разметке
+"""
+
+PRODUCT_ROW = """
+<tr itemscope itemtype="http://schema.org/Product" data-nm="Труба  {n}х{n}"
+    idt="{n}" idf="1{n}" idb="2{n}">
+  <td class="_name"><a href="/metalloprokat/product_{n}" itemprop="name">
+    Труба {n}х{n}</a></td>
+  <td class="_razmer">{n}</td>
+  <td class="_mark">Ст3</td>
+  <td class="_dlina">6000</td>
+  <td class="_price" itemprop="offers" itemscope itemtype="http://schema.org/Offer">
+    <meta itemprop="price" content="{price}">
+  </td>
+  <td><button class="btn _basket">В корзину</button></td>
+</tr>
+"""
+
+CATEGORY_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+  <title>Трубы купить в МЕТАЛЛСЕРВИС</title>
+  <meta name="description" content="Трубы по всей стране от МЕТАЛЛСЕРВИС">
+  <script>var ts = "{ts}";</script>
+</head>
+<body>
+  <h1>Трубы МЕТАЛЛСЕРВИС</h1>
+  <table class="catalogTable">
+    <tbody>{rows}</tbody>
+  </table>
+</body>
+</html>
+"""
+
+
+def make_category_page(rows_count: int, price: float = 100_000.0, ts: str = "0") -> str:
+    rows = "".join(
+        PRODUCT_ROW.format(n=n, price=price) for n in range(1, rows_count + 1)
+    )
+    return CATEGORY_PAGE.format(rows=rows, ts=ts)
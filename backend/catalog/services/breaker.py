@@ -0,0 +1,98 @@
+"""
+Общий для всех воркеров предохранитель (circuit breaker) на случай блокировки
+парсинга.
+
+Первая же блокировка (форма /check-human) размыкает предохранитель: задачи
+парсинга откладываются, не делая запросов. После паузы пропускается один
+пробный запрос. Если он прошел - предохранитель замыкается, если снова
+блокировка - пауза удваивается, до PARSER_BREAKER_MAX_COOLDOWN.
+Без Redis предохранитель не действует.
+"""
+
+import time
+from typing import cast
+from urllib.parse import urlsplit
+
+import redis
+from django.conf import settings
+from loguru import logger
+
+from backend.catalog.services.locks import get_redis
+
+
+class CircuitBreaker:
+    def __init__(self, name: str) -> None:
+        self.open_key = f"catalog:breaker:{name}:open-until"
+        self.probe_key = f"catalog:breaker:{name}:probe"
+        self.blocks_key = f"catalog:breaker:{name}:blocks"
+
+    def allow_request(self) -> bool:
+        """
+        Можно ли делать запрос: предохранитель замкнут, или пауза прошла и этот
+        запрос будет пробным (пробный пропускается только один)
+        """
+        client = get_redis()
+        if client is None:
+            return True
+
+        # Синхронный клиент, но в аннотациях redis-py get/incr могут вернуть Awaitable
+        open_until = cast(bytes | None, client.get(self.open_key))
+        if open_until is None:
+            return True
+        if time.time() < float(open_until):
+            return False
+        return bool(
+            client.set(self.probe_key, 1, nx=True, ex=settings.PARSER_BREAKER_COOLDOWN)
+        )
+
+    def get_retry_after(self) -> float:
+        """
+        Через сколько секунд имеет смысл повторить отложенную задачу
+        """
+        client = get_redis()
+        if client is None:
+            return settings.PARSER_HOST_INTERVAL
+        open_until = cast(bytes | None, client.get(self.open_key))
+        if open_until is None:
+            return settings.PARSER_HOST_INTERVAL
+        return max(float(open_until) - time.time(), settings.PARSER_HOST_INTERVAL)
+
+    def record_block(self) -> None:
+        """
+        Размыкает предохранитель. Пауза растет только при переходе в разомкнутое
+        состояние: блокировки запросов, начатых до размыкания, ее не удваивают
+        """
+        client = get_redis()
+        if client is None:
+            return
+
+        with client.pipeline() as pipe:
+            try:
+                pipe.watch(self.open_key)
+                open_until = cast(bytes | None, pipe.get(self.open_key))
+                if open_until is not None and time.time() < float(open_until):
+                    return
+                blocks = int(cast(bytes | None, pipe.get(self.blocks_key)) or 0) + 1
+                cooldown = min(
+                    settings.PARSER_BREAKER_COOLDOWN * 2 ** (blocks - 1),
+                    settings.PARSER_BREAKER_MAX_COOLDOWN,
+                )
+                ttl = settings.PARSER_BREAKER_MAX_COOLDOWN * 2
+                pipe.multi()
+                pipe.set(self.open_key, time.time() + cooldown, ex=ttl)
+                pipe.set(self.blocks_key, blocks, ex=ttl)
+                pipe.delete(self.probe_key)
+                pipe.execute()
+            except redis.WatchError:
+                # Предохранитель одновременно разомкнул другой воркер
+                return
+        logger.warning("Парсинг заблокирован, пауза {} сек", cooldown)
+
+    def record_success(self) -> None:
+        client = get_redis()
+        if client is not None:
+            client.delete(self.open_key, self.probe_key, self.blocks_key)
+
+
+def get_host_breaker(url: str) -> CircuitBreaker:
+    return CircuitBreaker(urlsplit(url).hostname or "")
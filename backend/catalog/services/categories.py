@@ -1,4 +1,8 @@
-from django.db.models import Q
+from dataclasses import dataclass
+from typing import Any
+
+from django.db import transaction
+from django.db.models import F
 from django.db.models.query import QuerySet
 
 # from loguru import logger as log
@@ -10,7 +14,7 @@ from backend.catalog.models import (
     ProductProperty,
     ProductPropertyValue,
 )
-from backend.utils.custom import get_object_or_None
+from backend.utils.custom import get_object_or_None, get_unique_slug
 
 
 def get_category_list() -> QuerySet:
@@ -74,35 +78,200 @@ def get_unique_property_values(
     и ее подкатегорий
     """
 
-    digit_values: list[int | float] = []
-    non_digit_values = []
     categories = []
     categories.append(category)
     if not category.is_leaf():
         categories.extend(category.get_descendants().filter(is_published=True))
 
+    # Числа по возрастанию, затем остальные значения: порядок дает индекс
+    # (property, value_numeric), строки не разбираются в Python
     property_values = (
-        ProductPropertyValue.objects.select_related(
-            "product__product_categories__category"
-        )
-        .prefetch_related("product__product_categories")
-        .filter(
+        ProductPropertyValue.objects.filter(
             property=property,
             product__product_categories__category__in=categories,
         )
-        .exclude(Q(value=None) | Q(value=""))
-        .values_list("value", flat=True)
+        .exclude(value_key="")
+        .values_list("value_numeric", "value_key")
+        .order_by(F("value_numeric").asc(nulls_last=True), "value_key")
         .distinct()
     )
+    return [value_key for _, value_key in property_values]
+
+
+def propagate_category_properties(category: Category) -> tuple[int, int]:
+    """
+    Делает набор свойств всех подкатегорий `category`, на любой глубине, равным
+    набору самой категории. Меняются только отличающиеся строки связи: одна
+    вставка и одно удаление, если есть что менять. Возвращает (добавлено, удалено)
+    """
+    through = ProductProperty.categories.through
+    property_ids = set(
+        through.objects.filter(category=category).values_list(
+            "productproperty_id", flat=True
+        )
+    )
+    # Подкатегории со своими свойствами, одним запросом; без свойств - (id, None)
+    current: dict[int, set[int]] = {}
+    for category_id, property_id in Category.objects.filter(
+        path__startswith=category.path, depth__gt=category.depth
+    ).values_list("id", "product_properties"):
+        current.setdefault(category_id, set())
+        if property_id is not None:
+            current[category_id].add(property_id)
+
+    missing = [
+        through(category_id=category_id, productproperty_id=property_id)
+        for category_id, category_properties in current.items()
+        for property_id in property_ids - category_properties
+    ]
+    has_redundant = any(
+        category_properties - property_ids for category_properties in current.values()
+    )
+    if not missing and not has_redundant:
+        return 0, 0
+
+    removed_count = 0
+    with transaction.atomic():
+        if has_redundant:
+            removed_count, _ = (
+                through.objects.filter(category_id__in=current)
+                .exclude(productproperty_id__in=property_ids)
+                .delete()
+            )
+        through.objects.bulk_create(missing, batch_size=1000)
+    return len(missing), removed_count
+
+
+@dataclass
+class CategoryTreeSyncResult:
+    created_count: int = 0
+    renamed_count: int = 0
+
+
+def _inherit_parent_properties(
+    new_categories: list[Category], existing_by_path: dict[str, Category]
+) -> None:
+    """
+    Новые категории получают свойства ближайшего существующего предка, как если
+    бы свойства передались им через propagate_category_properties
+    """
+    ancestor_paths: dict[int, str] = {}
+    for category in new_categories:
+        path = category.path[: -Category.steplen]
+        while path and path not in existing_by_path:
+            path = path[: -Category.steplen]
+        if path:
+            ancestor_paths[category.id] = path
+    if not ancestor_paths:
+        return
+
+    through = ProductProperty.categories.through
+    properties: dict[str, list[int]] = {}
+    for path, property_id in through.objects.filter(
+        category__path__in=set(ancestor_paths.values())
+    ).values_list("category__path", "productproperty_id"):
+        properties.setdefault(path, []).append(property_id)
+    through.objects.bulk_create(
+        [
+            through(category_id=category_id, productproperty_id=property_id)
+            for category_id, path in ancestor_paths.items()
+            for property_id in properties.get(path, [])
+        ],
+        batch_size=1000,
+    )
+
+
+def sync_category_tree(tree: list[dict[str, Any]]) -> CategoryTreeSyncResult:
+    """
+    Синхронизирует дерево категорий из карты сайта с базой. Узлы сопоставляются
+    по parse_url: переименованные обновляются на месте, недостающие поддеревья
+    создаются одним bulk_create с заранее посчитанными path/depth/numchild.
+    Новые узлы добавляются после существующих соседей, поэтому порядок по
+    node_order_by соблюдается только среди новых.
+
+    Повторный запуск на той же карте сайта ничего не меняет и делает один запрос.
+    """
+    result = CategoryTreeSyncResult()
+    categories = list(
+        Category.objects.only(
+            "id", "path", "depth", "numchild", "name", "parsed_name", "parse_url"
+        )
+    )
+    by_url = {
+        category.parse_url: category for category in categories if category.parse_url
+    }
+    # Последний занятый шаг пути среди детей каждого узла ("" - корни)
+    last_steps: dict[str, int] = {}
+    for category in categories:
+        parent_path = category.path[: -Category.steplen]
+        step = Category._str2int(category.path[-Category.steplen :])
+        last_steps[parent_path] = max(last_steps.get(parent_path, 0), step)
+
+    new_categories: list[Category] = []
+    changed_categories: dict[int, Category] = {}
+    added_children: dict[str, int] = {}
+    seen_urls: set[str] = set()
+    used_slugs: set[str] | None = None
+
+    def sync_children(parent_path: str, depth: int, nodes: list[dict[str, Any]]):
+        nonlocal used_slugs
+
+        for node in sorted(nodes, key=lambda node: node["name"]):
+            url = node["href"]
+            if url in seen_urls:
+                continue
+            seen_urls.add(url)
+
+            category = by_url.get(url)
+            if category is None:
+                if used_slugs is None:
+                    used_slugs = set(Category.objects.values_list("slug", flat=True))
+                step = last_steps.get(parent_path, 0) + 1
+                last_steps[parent_path] = step
+                category = Category(
+                    path=Category._get_path(parent_path, depth, step),
+                    depth=depth,
+                    numchild=0,
+                    parsed_name=node["name"],
+                    name=node["name"],
+                    slug=get_unique_slug(Category, node["name"], used_slugs),
+                    parse_url=url,
+                )
+                new_categories.append(category)
+                added_children[parent_path] = added_children.get(parent_path, 0) + 1
+            elif category.parsed_name != node["name"]:
+                # Название, заданное вручную, не трогаем
+                if category.name in ("", category.parsed_name):
+                    category.name = node["name"]
+                category.parsed_name = node["name"]
+                changed_categories[category.id] = category
+                result.renamed_count += 1
+
+            sync_children(category.path, category.depth + 1, node.get("children", []))
+
+    sync_children("", 1, tree)
+
+    new_by_path = {category.path: category for category in new_categories}
+    existing_by_path = {category.path: category for category in categories}
+    for parent_path, count in added_children.items():
+        if parent_path in new_by_path:
+            new_by_path[parent_path].numchild = count
+        elif parent_path:
+            parent = existing_by_path[parent_path]
+            parent.numchild += count
+            changed_categories[parent.id] = parent
+
+    if not new_categories and not changed_categories:
+        return result
+
+    with transaction.atomic():
+        Category.objects.bulk_create(new_categories, batch_size=1000)
+        Category.objects.bulk_update(
+            changed_categories.values(),
+            ["name", "parsed_name", "numchild"],
+            batch_size=1000,
+        )
+        _inherit_parent_properties(new_categories, existing_by_path)
 
-    for value in property_values:
-        try:
-            digit_values.append(int(value))
-        except ValueError:
-            try:
-                digit_values.append(float(value.replace(",", ".")))
-            except ValueError:
-                non_digit_values.append(value)
-
-    result = sorted(digit_values) + non_digit_values
-    return [str(value) for value in result]
+    result.created_count = len(new_categories)
+    return result
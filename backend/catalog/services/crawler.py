@@ -0,0 +1,118 @@
+import asyncio
+import queue
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from typing import Any
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+_DONE = object()
+
+
+@dataclass
+class CrawlResult:
+    url: str
+    # То, что вернула функция загрузки
+    page: Any = None
+    error: Exception | None = None
+
+
+class HostRateLimiter:
+    """
+    Ограничивает частоту запросов: не чаще одного запроса в `interval` секунд
+    к одному хосту
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._next_at: dict[str, float] = {}
+
+    async def wait(self, url: str) -> None:
+        host = urlsplit(url).netloc
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next_at.get(host, 0.0) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_at[host] = loop.time() + self.interval
+
+
+async def _crawl(
+    urls: Iterable[str],
+    fetch: Callable[[str], Any],
+    put: Callable[[CrawlResult], None],
+    is_stopped: Callable[[], bool],
+    concurrency: int,
+    interval: float,
+) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = HostRateLimiter(interval)
+
+    async def worker(url: str) -> None:
+        async with semaphore:
+            if is_stopped():
+                return
+            await limiter.wait(url)
+            try:
+                page = await asyncio.to_thread(fetch, url)
+            except Exception as e:
+                logger.error("Ошибка при загрузке страницы {}: {}", url, e)
+                result = CrawlResult(url=url, error=e)
+            else:
+                result = CrawlResult(url=url, page=page)
+            # Отдаем результат потребителю, ожидая, пока он освободит место в
+            # очереди. Место семафора держим до этого, иначе загрузки уходят
+            # вперед медленного потребителя без ограничения
+            await asyncio.to_thread(put, result)
+
+    await asyncio.gather(*(worker(url) for url in urls))
+
+
+def crawl(
+    urls: Iterable[str],
+    fetch: Callable[[str], Any],
+    *,
+    concurrency: int = 8,
+    interval: float = 1.0,
+) -> Iterator[CrawlResult]:
+    """
+    Загружает страницы параллельно (не более `concurrency` запросов одновременно
+    и не чаще одного запроса в `interval` секунд к хосту) и отдает их по мере
+    готовности.
+
+    Загрузка идет в отдельном потоке со своим event loop, поэтому вызывающий код
+    остается синхронным и может спокойно работать с ORM, пока качаются следующие
+    страницы. Очередь результатов ограничена, так что в памяти одновременно
+    находится не больше `concurrency` непрочитанных страниц.
+    """
+    results: queue.Queue = queue.Queue(maxsize=concurrency)
+    stopped = threading.Event()
+
+    def put(item: object) -> None:
+        while not stopped.is_set():
+            try:
+                results.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def run() -> None:
+        try:
+            asyncio.run(
+                _crawl(list(urls), fetch, put, stopped.is_set, concurrency, interval)
+            )
+        finally:
+            put(_DONE)
+
+    thread = threading.Thread(target=run, name="catalog-crawler", daemon=True)
+    thread.start()
+    try:
+        while (item := results.get()) is not _DONE:
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
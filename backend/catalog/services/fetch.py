@@ -0,0 +1,120 @@
+import codecs
+from dataclasses import dataclass
+from time import perf_counter
+
+import requests
+
+from backend.catalog.services.page_parser import (
+    ParsedCategoryPage,
+    parse_category_page,
+)
+from backend.catalog.services.session import get_session
+
+# Размер куска при потоковой загрузке страницы, байт
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class PageFetchResult:
+    text: str = ""
+    etag: str = ""
+    last_modified: str = ""
+    content_hash: str = ""
+    # Сервер ответил 304 Not Modified
+    not_modified: bool = False
+    # Время загрузки, сек, и размер распакованного тела, байт
+    fetch_time: float = 0.0
+    page_bytes: int = 0
+    # Страница, разобранная во время потоковой загрузки
+    parsed: ParsedCategoryPage | None = None
+
+
+def _get(url: str, etag: str, last_modified: str, stream: bool) -> requests.Response:
+    """
+    Условный GET-запрос: если переданы ETag или Last-Modified с прошлой загрузки
+    и страница не менялась, сервер отвечает 304 без тела
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    response = get_session().get(url, headers=headers, stream=stream)
+    # allow_redirects=False
+    # if response.status_code == 302:
+    #     raise Exception("Блок парсинга")
+    response.raise_for_status()
+    return response
+
+
+def fetch_page(url: str, etag: str = "", last_modified: str = "") -> PageFetchResult:
+    """
+    Загружает страницу целиком
+    """
+    started = perf_counter()
+    response = _get(url, etag, last_modified, stream=False)
+    fetch_time = perf_counter() - started
+
+    if response.status_code == requests.codes.not_modified:
+        return PageFetchResult(
+            etag=etag,
+            last_modified=last_modified,
+            not_modified=True,
+            fetch_time=fetch_time,
+        )
+
+    return PageFetchResult(
+        text=response.text,
+        etag=response.headers.get("ETag", ""),
+        last_modified=response.headers.get("Last-Modified", ""),
+        fetch_time=fetch_time,
+        page_bytes=len(response.content),
+    )
+
+
+def _iter_text(response: requests.Response, result: PageFetchResult, keep_text: bool):
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(
+        errors="replace"
+    )
+    parts: list[str] = []
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        result.page_bytes += len(chunk)
+        text = decoder.decode(chunk)
+        if keep_text:
+            parts.append(text)
+        yield text
+    text = decoder.decode(b"", final=True)
+    if keep_text:
+        parts.append(text)
+        result.text = "".join(parts)
+    yield text
+
+
+def fetch_category_page(
+    url: str, etag: str = "", last_modified: str = "", keep_text: bool = False
+) -> PageFetchResult:
+    """
+    Загружает страницу категории потоком и разбирает ее по мере загрузки: в
+    памяти не бывает ни всего тела страницы (кроме `keep_text`, например для
+    снимков), ни ее DOM. Время разбора не входит в fetch_time
+    """
+    started = perf_counter()
+    with _get(url, etag, last_modified, stream=True) as response:
+        if response.status_code == requests.codes.not_modified:
+            return PageFetchResult(
+                etag=etag,
+                last_modified=last_modified,
+                not_modified=True,
+                fetch_time=perf_counter() - started,
+            )
+
+        result = PageFetchResult(
+            etag=response.headers.get("ETag", ""),
+            last_modified=response.headers.get("Last-Modified", ""),
+        )
+        result.parsed = parse_category_page(_iter_text(response, result, keep_text))
+
+    result.content_hash = result.parsed.content_hash
+    result.fetch_time = perf_counter() - started - result.parsed.parse_time
+    return result
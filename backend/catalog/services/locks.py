@@ -0,0 +1,161 @@
+"""
+Распределенные примитивы синхронизации воркеров на Redis.
+
+Если Redis не настроен (PARSER_REDIS_URL пуст, например в тестах), ограничения
+не действуют: семафор и блокировка всегда захватываются.
+"""
+
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from uuid import uuid4
+
+import redis
+from django.conf import settings
+
+_client: redis.Redis | None = None
+# Как часто повторять попытку захвата семафора при ожидании, сек
+SEMAPHORE_POLL_INTERVAL = 0.5
+
+
+def get_redis() -> redis.Redis | None:
+    global _client
+
+    if not settings.PARSER_REDIS_URL:
+        return None
+    if _client is None:
+        _client = redis.Redis.from_url(settings.PARSER_REDIS_URL)
+    return _client
+
+
+class RedisSemaphore:
+    """
+    Семафор на сортированном множестве Redis: участник - случайный токен,
+    вес - время захвата. Токены старше `timeout` считаются брошенными (воркер
+    упал, не освободив семафор) и удаляются при следующем захвате
+    """
+
+    def __init__(self, name: str, limit: int, timeout: float) -> None:
+        self.name = name
+        self.limit = limit
+        self.timeout = timeout
+
+    def acquire(self) -> str | None:
+        """
+        Пытается захватить семафор без ожидания. Возвращает токен для release
+        или None, если все места заняты
+        """
+        client = get_redis()
+        token = uuid4().hex
+        if client is None:
+            return token
+
+        now = time.time()
+        pipe = client.pipeline()
+        pipe.zremrangebyscore(self.name, "-inf", now - self.timeout)
+        pipe.zadd(self.name, {token: now})
+        pipe.zrank(self.name, token)
+        pipe.expire(self.name, int(self.timeout))
+        _, _, rank, _ = pipe.execute()
+        if rank < self.limit:
+            return token
+
+        client.zrem(self.name, token)
+        return None
+
+    def release(self, token: str) -> None:
+        client = get_redis()
+        if client is not None:
+            client.zrem(self.name, token)
+
+    @contextmanager
+    def hold(self, wait: float = 0) -> Iterator[bool]:
+        """
+        Контекстный менеджер: отдает True, если семафор захвачен, и освобождает
+        его на выходе. Занятый семафор ждет до `wait` секунд
+        """
+        token = self.acquire()
+        deadline = time.monotonic() + wait
+        while token is None and time.monotonic() < deadline:
+            time.sleep(SEMAPHORE_POLL_INTERVAL)
+            token = self.acquire()
+        try:
+            yield token is not None
+        finally:
+            if token is not None:
+                self.release(token)
+
+
+class RedisLock:
+    """
+    Взаимоисключающая блокировка: ключ со случайным токеном владельца, который
+    ставится только если ключа нет (SET NX). TTL `timeout` снимает блокировку
+    воркера, упавшего не освободив ее. Освобождает блокировку только владелец
+    """
+
+    def __init__(self, name: str, timeout: float) -> None:
+        self.name = name
+        self.timeout = timeout
+
+    def acquire(self) -> str | None:
+        """
+        Пытается захватить блокировку без ожидания. Возвращает токен для release
+        или None, если блокировка занята
+        """
+        client = get_redis()
+        token = uuid4().hex
+        if client is None:
+            return token
+        if client.set(self.name, token, nx=True, ex=int(self.timeout)):
+            return token
+        return None
+
+    def release(self, token: str) -> None:
+        client = get_redis()
+        if client is None:
+            return
+        with client.pipeline() as pipe:
+            try:
+                pipe.watch(self.name)
+                # Блокировка могла истечь и достаться другому воркеру
+                if pipe.get(self.name) == token.encode():
+                    pipe.multi()
+                    pipe.delete(self.name)
+                    pipe.execute()
+            except redis.WatchError:
+                pass
+
+    @contextmanager
+    def hold(self) -> Iterator[bool]:
+        """
+        Контекстный менеджер: отдает True, если блокировка захвачена, и
+        освобождает ее на выходе
+        """
+        token = self.acquire()
+        try:
+            yield token is not None
+        finally:
+            if token is not None:
+                self.release(token)
+
+
+def get_category_lock(category_id: int) -> RedisLock:
+    """
+    Блокировка разбора категории: одновременно категорию разбирает один воркер
+    """
+    return RedisLock(
+        f"catalog:lock:category:{category_id}",
+        timeout=settings.PARSER_CATEGORY_LOCK_TIMEOUT,
+    )
+
+
+def get_host_semaphore(url: str) -> RedisSemaphore:
+    """
+    Семафор, ограничивающий число одновременных запросов всех воркеров к хосту
+    """
+    return RedisSemaphore(
+        f"catalog:semaphore:{urlsplit(url).hostname}",
+        limit=settings.PARSER_HOST_CONCURRENCY,
+        timeout=settings.PARSER_SEMAPHORE_TIMEOUT,
+    )
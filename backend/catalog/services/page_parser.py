@@ -0,0 +1,342 @@
+"""
+Потоковый разбор страницы категории mc.ru.
+
+Страница подается кусками (feed), строки таблицы товаров
+`tr[itemtype=schema.org/Product]` превращаются в ParsedProduct по мере
+закрытия тега, поэтому DOM всей страницы не строится, а память не зависит от
+размера категории. Попутно считается хэш содержимого страницы.
+
+HTML разбирает html.parser из стандартной библиотеки или lxml
+(PARSER_HTML_BACKEND).
+"""
+
+import hashlib
+import re
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from time import perf_counter
+
+from django.conf import settings
+from loguru import logger
+from lxml import etree
+
+from backend.catalog.services.persistence import ParsedProduct
+
+HOST = "https://mc.ru"
+PRODUCT_ITEMTYPE = "http://schema.org/Product"
+# Колонки таблицы товаров: класс ячейки -> поле ParsedProduct
+PRODUCT_COLUMNS = {"_razmer": "size", "_mark": "mark", "_dlina": "length"}
+# Теги, содержимое которых меняется от запроса к запросу и не влияет на товары
+VOLATILE_TAGS = {"script", "style"}
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def get_product_name(data_nm: str) -> str:
+    name = WHITESPACE_RE.sub(" ", data_nm)
+    return re.sub(r"(?<=\d)х(?=\d)", "x", name)
+
+
+def parse_price(value: str | None) -> float:
+    try:
+        return float((value or "").strip())
+    except ValueError:
+        logger.info("Цена отсутствует: {}", value)
+        return 0.0
+
+
+def add_unique_product(
+    products: dict[str, ParsedProduct], product: ParsedProduct, name: str
+) -> None:
+    """
+    Оставляет один продукт на название: в наличии и с меньшей ценой
+    """
+    existing = products.get(name)
+    # TODO: проверить не нулевая ли цена
+    if existing is None:
+        products[name] = product
+    elif product.price < existing.price and product.in_stock:
+        products[name] = product
+    elif not existing.in_stock and product.in_stock:
+        products[name] = product
+
+
+class PageHasher:
+    """
+    Считает sha256 страницы по мере разбора: теги с атрибутами и текст без
+    скриптов, стилей, комментариев и различий в пробелах. Получает события
+    start/end/data/close от любого бэкенда разбора (get_feed_parser)
+    """
+
+    def __init__(self) -> None:
+        self._hash = hashlib.sha256()
+        self._text: list[str] = []
+        self._volatile_depth = 0
+
+    @property
+    def content_hash(self) -> str:
+        return self._hash.hexdigest()
+
+    def _flush_text(self) -> None:
+        text = WHITESPACE_RE.sub(" ", "".join(self._text)).strip()
+        self._text.clear()
+        if text:
+            self._hash.update(text.encode())
+
+    def start(self, tag: str, attrs: dict[str, str]) -> None:
+        self._flush_text()
+        if tag in VOLATILE_TAGS:
+            self._volatile_depth += 1
+        attrs_text = " ".join(f'{name}="{value}"' for name, value in attrs.items())
+        self._hash.update(f"<{tag} {attrs_text}>".encode())
+
+    def end(self, tag: str) -> None:
+        self._flush_text()
+        if tag in VOLATILE_TAGS and self._volatile_depth:
+            self._volatile_depth -= 1
+        self._hash.update(f"</{tag}>".encode())
+
+    def data(self, data: str) -> None:
+        if not self._volatile_depth:
+            self._text.append(data)
+
+    def close(self) -> None:
+        self._flush_text()
+
+
+class _HtmlParserFeeder(HTMLParser):
+    """
+    Бэкенд на html.parser из стандартной библиотеки
+    """
+
+    def __init__(self, handler: PageHasher) -> None:
+        super().__init__(convert_charrefs=True)
+        self.handler = handler
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self.handler.start(tag, {name: value or "" for name, value in attrs})
+
+    def handle_endtag(self, tag: str) -> None:
+        self.handler.end(tag)
+
+    def handle_data(self, data: str) -> None:
+        self.handler.data(data)
+
+    def close(self) -> None:
+        super().close()
+        self.handler.close()
+
+
+class _LxmlTarget:
+    """
+    Цель для потокового HTMLParser из lxml: пересылает события обработчику.
+    Комментарии lxml цели без метода comment() не передает
+    """
+
+    def __init__(self, handler: PageHasher) -> None:
+        self.handler = handler
+
+    def start(self, tag: str, attrib) -> None:
+        self.handler.start(tag, dict(attrib))
+
+    def end(self, tag: str) -> None:
+        self.handler.end(tag)
+
+    def data(self, data: str) -> None:
+        self.handler.data(data)
+
+    def close(self) -> None:
+        self.handler.close()
+
+
+def _make_lxml_parser(handler: PageHasher):
+    return etree.HTMLParser(target=_LxmlTarget(handler))
+
+
+HTML_BACKENDS = {
+    "html.parser": _HtmlParserFeeder,
+    "lxml": _make_lxml_parser,
+}
+
+
+def get_feed_parser(handler: PageHasher, backend: str | None = None):
+    """
+    Создает потоковый парсер (feed/close) выбранного бэкенда, по умолчанию
+    PARSER_HTML_BACKEND. Бэкенды по-разному достраивают неполную разметку,
+    поэтому хэш страницы зависит от бэкенда
+    """
+    backend = backend or settings.PARSER_HTML_BACKEND
+    try:
+        make_parser = HTML_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Неизвестный бэкенд разбора HTML: {backend}") from None
+    return make_parser(handler)
+
+
+def get_content_hash(text: str, backend: str | None = None) -> str:
+    hasher = PageHasher()
+    parser = get_feed_parser(hasher, backend)
+    parser.feed(text)
+    parser.close()
+    return hasher.content_hash
+
+
+@dataclass
+class ParsedCategoryPage:
+    title: str = ""
+    description: str = ""
+    h1: str = ""
+    # Вместо товаров показана форма проверки "я не робот"
+    is_blocked: bool = False
+    is_empty: bool = False
+    products: dict[str, ParsedProduct] = field(default_factory=dict)
+    content_hash: str = ""
+    # Время разбора, сек: при потоковой загрузке оно входит во время загрузки
+    parse_time: float = 0.0
+
+
+@dataclass
+class _ProductRow:
+    attrs: dict[str, str]
+    href: str | None = None
+    price: str | None = None
+    button_class: str | None = None
+    column: str | None = None
+    columns: dict[str, list[str]] = field(default_factory=dict)
+    # Глубина вложенных в строку тегов tr: строку закрывает только ее собственный
+    depth: int = 0
+
+
+class CategoryPageHandler(PageHasher):
+    """
+    Разбор страницы категории по событиям парсера. Готовые продукты забираются
+    через pop_products() после каждого feed()
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.page = ParsedCategoryPage()
+        self._ready: list[tuple[str, ParsedProduct]] = []
+        self._row: _ProductRow | None = None
+        self._capture: str | None = None
+        self._captured: list[str] = []
+
+    def pop_products(self) -> list[tuple[str, ParsedProduct]]:
+        """
+        Возвращает продукты, строки которых уже закрыты: [(название, продукт)]
+        """
+        ready, self._ready = self._ready, []
+        return ready
+
+    def start(self, tag: str, attrs: dict[str, str]) -> None:
+        super().start(tag, attrs)
+        classes = attrs.get("class", "").split()
+
+        if self._row is not None:
+            self._handle_row_tag(self._row, tag, attrs, classes)
+        elif tag == "tr" and attrs.get("itemtype") == PRODUCT_ITEMTYPE:
+            self._row = _ProductRow(attrs=attrs)
+        elif tag == "title" and not self.page.title:
+            self._start_capture("title")
+        elif tag == "h1" and not self.page.h1:
+            self._start_capture("h1")
+        elif tag == "meta" and attrs.get("name") == "description":
+            self.page.description = self.page.description or attrs.get("content", "")
+        elif tag == "form" and attrs.get("action") == "/check-human":
+            self.page.is_blocked = True
+        elif tag == "div" and {"catalogItems", "_empty"} <= set(classes):
+            self.page.is_empty = True
+
+    def _handle_row_tag(
+        self, row: _ProductRow, tag: str, attributes: dict[str, str], classes: list[str]
+    ) -> None:
+        if tag == "tr":
+            row.depth += 1
+        elif tag == "a" and row.href is None:
+            row.href = attributes.get("href", "")
+        elif tag == "meta" and attributes.get("itemprop") == "price":
+            row.price = (
+                row.price if row.price is not None else attributes.get("content")
+            )
+        elif tag == "button" and row.button_class is None:
+            row.button_class = attributes.get("class", "")
+        elif tag == "td":
+            row.column = next(
+                (PRODUCT_COLUMNS[cls] for cls in classes if cls in PRODUCT_COLUMNS),
+                None,
+            )
+            if row.column is not None:
+                row.columns.setdefault(row.column, [])
+
+    def end(self, tag: str) -> None:
+        super().end(tag)
+        if self._row is not None:
+            if tag == "td":
+                self._row.column = None
+            elif tag == "tr" and self._row.depth:
+                self._row.depth -= 1
+            elif tag == "tr":
+                self._ready.append(self._build_product(self._row))
+                self._row = None
+        elif tag == self._capture:
+            setattr(self.page, self._capture, "".join(self._captured).strip())
+            self._capture = None
+
+    def data(self, data: str) -> None:
+        super().data(data)
+        if self._row is not None and self._row.column is not None:
+            self._row.columns[self._row.column].append(data)
+        elif self._capture is not None:
+            self._captured.append(data)
+
+    def _start_capture(self, tag: str) -> None:
+        self._capture = tag
+        self._captured = []
+
+    def _build_product(self, row: _ProductRow) -> tuple[str, ParsedProduct]:
+        name = get_product_name(row.attrs.get("data-nm", ""))
+        if not row.button_class:
+            logger.error("Не удалось определить наличие у товара: {}", name)
+        columns = {
+            column: "".join(texts).strip() for column, texts in row.columns.items()
+        }
+        product = ParsedProduct(
+            name=name.capitalize(),
+            price=parse_price(row.price),
+            in_stock="_basket" in (row.button_class or "").split(),
+            parse_url=HOST + (row.href or ""),
+            size=columns.get("size", ""),
+            mark=columns.get("mark", ""),
+            length=columns.get("length", ""),
+            idt=row.attrs.get("idt", ""),
+            idf=row.attrs.get("idf", ""),
+            idb=row.attrs.get("idb", ""),
+        )
+        return name, product
+
+
+def parse_category_page(
+    chunks: Iterable[str], backend: str | None = None
+) -> ParsedCategoryPage:
+    """
+    Разбирает страницу категории, поданную кусками. Держит в памяти только
+    уникальные продукты, а не дерево страницы
+    """
+    handler = CategoryPageHandler()
+    parser = get_feed_parser(handler, backend)
+    page = handler.page
+    parse_time = 0.0
+    for chunk in chunks:
+        started = perf_counter()
+        parser.feed(chunk)
+        for name, product in handler.pop_products():
+            add_unique_product(page.products, product, name)
+        parse_time += perf_counter() - started
+
+    started = perf_counter()
+    parser.close()
+    for name, product in handler.pop_products():
+        add_unique_product(page.products, product, name)
+    page.content_hash = handler.content_hash
+    page.parse_time = parse_time + perf_counter() - started
+    return page
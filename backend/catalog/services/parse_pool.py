@@ -0,0 +1,130 @@
+"""
+Разбор страниц категорий в пуле процессов.
+
+Разбор HTML упирается в процессор и держит GIL, поэтому в процессе задачи он
+тормозит параллельные загрузки (воркер с -P threads/gevent).
+Если задан PARSER_PARSE_WORKERS, текст страницы уходит в отдельный процесс, а
+обратно приходят компактные кортежи вместо объектов ParsedProduct.
+
+Пул нужен только воркерам с -P threads/gevent: дочерние процессы prefork
+демонические и своих процессов создавать не могут, такой воркер с
+PARSER_PARSE_WORKERS не запустится (check_worker_pool).
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import astuple
+
+import django
+from celery.concurrency import get_implementation
+from celery.concurrency.prefork import TaskPool as PreforkPool
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from backend.catalog.services.page_parser import (
+    ParsedCategoryPage,
+    parse_category_page,
+)
+from backend.catalog.services.persistence import ParsedProduct
+
+# (title, description, h1, is_blocked, is_empty, content_hash, parse_time,
+#  [(название, поля ParsedProduct по порядку)])
+PackedPage = tuple
+
+_executor: ProcessPoolExecutor | None = None
+_lock = threading.Lock()
+
+
+def _parse_packed(text: str, backend: str) -> PackedPage:
+    page = parse_category_page([text], backend)
+    return (
+        page.title,
+        page.description,
+        page.h1,
+        page.is_blocked,
+        page.is_empty,
+        page.content_hash,
+        page.parse_time,
+        [(name, astuple(product)) for name, product in page.products.items()],
+    )
+
+
+def _unpack(packed: PackedPage) -> ParsedCategoryPage:
+    title, description, h1, is_blocked, is_empty, content_hash, parse_time, rows = (
+        packed
+    )
+    return ParsedCategoryPage(
+        title=title,
+        description=description,
+        h1=h1,
+        is_blocked=is_blocked,
+        is_empty=is_empty,
+        products={name: ParsedProduct(*row) for name, row in rows},
+        content_hash=content_hash,
+        parse_time=parse_time,
+    )
+
+
+PREFORK_ERROR = (
+    "PARSER_PARSE_WORKERS требует воркер с -P threads или -P gevent: процессы "
+    "prefork не могут создавать дочерние процессы"
+)
+
+
+def check_worker_pool(pool_cls: type | str) -> None:
+    """
+    Не дает запустить воркер prefork с пулом процессов разбора: иначе разбор
+    каждой категории падал бы с AssertionError уже во время работы
+    """
+    if settings.PARSER_PARSE_WORKERS <= 0:
+        return
+    pool = get_implementation(pool_cls) if isinstance(pool_cls, str) else pool_cls
+    if issubclass(pool, PreforkPool):
+        raise ImproperlyConfigured(PREFORK_ERROR)
+
+
+def get_parse_executor() -> ProcessPoolExecutor | None:
+    """
+    Пул процессов разбора, общий для процесса. None, если PARSER_PARSE_WORKERS
+    не задан и разбирать нужно на месте
+    """
+    global _executor
+    if settings.PARSER_PARSE_WORKERS <= 0:
+        return None
+    if multiprocessing.current_process().daemon:
+        raise ImproperlyConfigured(PREFORK_ERROR)
+    with _lock:
+        if _executor is None:
+            # django.setup нужен, если процессы запускаются через spawn
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PARSER_PARSE_WORKERS, initializer=django.setup
+            )
+    return _executor
+
+
+def shutdown_parse_executor() -> None:
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(cancel_futures=True)
+            _executor = None
+
+
+def parse_page_text(text: str) -> ParsedCategoryPage:
+    """
+    Разбирает загруженную целиком страницу категории: в пуле процессов, если он
+    включен, иначе в текущем процессе. Вызывающий поток ждет результат, но GIL
+    при этом свободен
+    """
+    backend = settings.PARSER_HTML_BACKEND
+    executor = get_parse_executor()
+    if executor is None:
+        return parse_category_page([text], backend)
+    try:
+        return _unpack(executor.submit(_parse_packed, text, backend).result())
+    except BrokenProcessPool:
+        # Процесс пула убит (например, по памяти) - следующий вызов создаст новый
+        shutdown_parse_executor()
+        raise
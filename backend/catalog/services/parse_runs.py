@@ -0,0 +1,160 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import timedelta
+from time import perf_counter
+
+from django.db import connection
+from django.db.models import Avg, Count, Max, Q
+from django.db.models.query import QuerySet
+from django.utils import timezone
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+from backend.catalog.models import Category, ParseRun
+from backend.catalog.services.fetch import PageFetchResult
+
+STAGES = ("fetch", "parse", "persist")
+
+
+class ParseRunRecorder:
+    """
+    Собирает метрики одного разбора страницы категории в ParseRun:
+    время этапов (stage), количество SQL-запросов (count_queries)
+    """
+
+    def __init__(self, category: Category, page: PageFetchResult | None = None) -> None:
+        self.run = ParseRun(
+            category=category,
+            started_at=timezone.now(),
+            status=ParseRun.Status.SUCCESS,
+        )
+        # Время, потраченное до создания записи: загрузка и разбор при потоковой
+        # загрузке
+        self._elapsed = 0.0
+        if page is not None:
+            self.run.fetch_time = page.fetch_time
+            self.run.page_bytes = page.page_bytes
+            if page.parsed is not None:
+                self.run.parse_time = page.parsed.parse_time
+            self._elapsed = self.run.fetch_time + self.run.parse_time
+        self._started = perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            field = f"{name}_time"
+            setattr(
+                self.run, field, getattr(self.run, field) + perf_counter() - started
+            )
+
+    @contextmanager
+    def count_queries(self) -> Iterator[None]:
+        with connection.execute_wrapper(self._count_query):
+            yield
+
+    def _count_query(self, execute, sql, params, many, context):
+        self.run.queries_count += 1
+        return execute(sql, params, many, context)
+
+    def finish(self, status: str | None = None, error: str = "") -> ParseRun:
+        if status is not None:
+            self.run.status = status
+        self.run.error = error
+        self.run.total_time = self._elapsed + perf_counter() - self._started
+        self.run.save()
+        return self.run
+
+
+def record_failed_fetch(category: Category, error: Exception) -> ParseRun:
+    return ParseRunRecorder(category).finish(ParseRun.Status.FAILED, str(error))
+
+
+def delete_old_parse_runs(days: int) -> int:
+    """
+    Удаляет запуски парсинга старше `days` дней, возвращает количество удаленных
+    """
+    deleted_count, _ = ParseRun.objects.filter(
+        started_at__lt=timezone.now() - timedelta(days=days)
+    ).delete()
+    return deleted_count
+
+
+def get_parse_run_stats(days: int = 7) -> QuerySet:
+    """
+    Сводка запусков парсинга по категориям за последние `days` дней,
+    самые медленные категории первыми
+    """
+    return (
+        ParseRun.objects.filter(started_at__gte=timezone.now() - timedelta(days=days))
+        .values("category_id", "category__name")
+        .annotate(
+            runs_count=Count("id"),
+            failed_count=Count(
+                "id",
+                filter=Q(status__in=[ParseRun.Status.FAILED, ParseRun.Status.BLOCKED]),
+            ),
+            avg_fetch_time=Avg("fetch_time"),
+            avg_parse_time=Avg("parse_time"),
+            avg_persist_time=Avg("persist_time"),
+            avg_total_time=Avg("total_time"),
+            max_total_time=Max("total_time"),
+            avg_page_bytes=Avg("page_bytes"),
+            avg_products_count=Avg("products_count"),
+            avg_queries_count=Avg("queries_count"),
+        )
+        .order_by("-avg_total_time")
+    )
+
+
+class ParseRunCollector:
+    """
+    Коллектор Prometheus: метрики берутся из ParseRun, поэтому не зависят от того,
+    в каком процессе воркера прошел разбор
+    """
+
+    def __init__(self, days: int = 1) -> None:
+        self.days = days
+
+    def collect(self):
+        stage_time = GaugeMetricFamily(
+            "catalog_parse_stage_seconds",
+            "Среднее время этапа разбора категории",
+            labels=["category", "stage"],
+        )
+        queries = GaugeMetricFamily(
+            "catalog_parse_queries",
+            "Среднее количество SQL-запросов на разбор категории",
+            labels=["category"],
+        )
+        page_bytes = GaugeMetricFamily(
+            "catalog_parse_page_bytes",
+            "Средний размер страницы категории",
+            labels=["category"],
+        )
+        runs = GaugeMetricFamily(
+            "catalog_parse_runs",
+            "Количество запусков разбора категории",
+            labels=["category", "result"],
+        )
+        for stats in get_parse_run_stats(self.days):
+            category = str(stats["category_id"])
+            for stage in STAGES:
+                stage_time.add_metric(
+                    [category, stage], stats[f"avg_{stage}_time"] or 0
+                )
+            queries.add_metric([category], stats["avg_queries_count"] or 0)
+            page_bytes.add_metric([category], stats["avg_page_bytes"] or 0)
+            runs.add_metric([category, "failed"], stats["failed_count"])
+            runs.add_metric(
+                [category, "ok"], stats["runs_count"] - stats["failed_count"]
+            )
+        yield from (stage_time, queries, page_bytes, runs)
+
+
+def render_parse_run_metrics(days: int = 1) -> bytes:
+    registry = CollectorRegistry()
+    registry.register(ParseRunCollector(days))
+    return generate_latest(registry)
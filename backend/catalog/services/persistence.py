@@ -0,0 +1,423 @@
+import hashlib
+import operator
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from decimal import Decimal
+from functools import reduce
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Q
+from django.utils import timezone
+
+from backend.catalog.models import (
+    Category,
+    CategoryPropertyMapping,
+    Product,
+    ProductCategories,
+    ProductPriceHistory,
+    ProductPropertyValue,
+)
+from backend.catalog.services.prices import (
+    recalculate_display_prices,
+    recalculate_prices,
+)
+from backend.catalog.services.property_mappings import (
+    MappedProperty,
+    get_category_properties,
+)
+from backend.utils.custom import get_base_slug, get_unique_slug
+
+BATCH_SIZE = 1000
+
+
+@dataclass
+class ParsedProduct:
+    in_stock: bool
+    name: str
+    parse_url: str
+    size: str
+    mark: str
+    length: str
+    idt: str
+    idf: str
+    idb: str
+    price: float
+    weight: str = ""
+
+
+@dataclass
+class SaveResult:
+    created_count: int = 0
+    updated_count: int = 0
+    # Продукты, данные которых не изменились с прошлого парсинга
+    unchanged_count: int = 0
+    created_ids: list[int] = field(default_factory=list)
+    # id продуктов категории, которые были в результатах парсинга
+    parsed_ids: list[int] = field(default_factory=list)
+
+
+def get_product_fingerprint(product: ParsedProduct) -> str:
+    """
+    Отпечаток данных продукта, которые парсер пишет в базу
+    """
+    data = "|".join(
+        [
+            f"{product.price:.2f}",
+            str(product.in_stock),
+            product.size,
+            product.mark,
+            product.length,
+            product.idt,
+            product.idf,
+            product.idb,
+        ]
+    )
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+def _get_history_record(product: Product, date) -> ProductPriceHistory:
+    return ProductPriceHistory(
+        product=product,
+        date=date,
+        ton_price=product.ton_price,
+        in_stock=product.in_stock,
+    )
+
+
+def save_price_history(records: list[ProductPriceHistory]) -> None:
+    """
+    Записывает изменения цены и наличия: одна строка на продукт за день,
+    более позднее изменение в тот же день заменяет значения
+    """
+    ProductPriceHistory.objects.bulk_create(
+        records,
+        update_conflicts=True,
+        unique_fields=["product", "date"],
+        update_fields=["ton_price", "in_stock"],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def _fill_slugs(new_products: list[Product]) -> None:
+    """
+    Уникальные slug новых продуктов одним запросом на часть: AutoSlugField
+    в bulk_create проверяет только базу, и продукты одной части получали
+    одинаковые slug ("Труба 1/2" и "Труба 12")
+    """
+    bases = {get_base_slug(Product, product.name) for product in new_products}
+    used_slugs = set(
+        Product.objects.filter(
+            reduce(operator.or_, (Q(slug__startswith=base) for base in bases))
+        ).values_list("slug", flat=True)
+    )
+    for product in new_products:
+        product.slug = get_unique_slug(Product, product.name, used_slugs)
+
+
+def _upsert_new_products(category: Category, new_products: list[Product]) -> None:
+    """
+    Создает новые продукты и привязывает их к категории. Вставка - upsert по
+    parse_url: если продукт с тем же URL уже записал параллельный парсинг,
+    обновляются его цена и наличие, дубль не создается
+    """
+    if not new_products:
+        return
+    _fill_slugs(new_products)
+    Product.objects.bulk_create(
+        new_products,
+        update_conflicts=True,
+        unique_fields=["parse_url"],
+        update_fields=[
+            "ton_price",
+            "in_stock",
+            "idt",
+            "idf",
+            "idb",
+            "parse_fingerprint",
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    # bulk_create с update_conflicts в Django 4.2 не возвращает id, заодно
+    # узнаем, какие продукты уже привязаны к категории параллельным парсингом
+    linked_ids = set()
+    ids = {}
+    for parse_url, product_id, is_linked in (
+        Product.objects.filter(
+            parse_url__in=[product.parse_url for product in new_products]
+        )
+        .annotate(
+            is_linked=Exists(
+                ProductCategories.objects.filter(
+                    category=category, product=OuterRef("pk")
+                )
+            )
+        )
+        .values_list("parse_url", "id", "is_linked")
+    ):
+        ids[parse_url] = product_id
+        if is_linked:
+            linked_ids.add(product_id)
+    for product in new_products:
+        product.id = ids[product.parse_url]
+    ProductCategories.objects.bulk_create(
+        [
+            ProductCategories(
+                product=product,
+                category=category,
+                is_display=True,
+                is_primary=True,
+            )
+            for product in new_products
+            if product.id not in linked_ids
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def _save_chunk(
+    category: Category,
+    parsed_products: list[ParsedProduct],
+    properties: dict[str, MappedProperty],
+    result: SaveResult,
+) -> None:
+    now = timezone.now()
+    today = timezone.localdate()
+
+    # parse_url уникален, поэтому продукт ищем по нему во всем каталоге: продукт,
+    # перенесенный на mc.ru в другую категорию, обновится, а не задвоится
+    existing_products = {
+        product.parse_url: product
+        for product in Product.objects.filter(
+            parse_url__in=[parsed.parse_url for parsed in parsed_products]
+        ).annotate(
+            is_linked=Exists(
+                ProductCategories.objects.filter(
+                    category=category, product=OuterRef("pk")
+                )
+            ),
+            has_primary=Exists(
+                ProductCategories.objects.filter(
+                    product=OuterRef("pk"), is_primary=True
+                )
+            ),
+        )
+    }
+
+    new_products: list[Product] = []
+    updated_products: list[Product] = []
+    unchanged_products: list[Product] = []
+    history: list[ProductPriceHistory] = []
+    for parsed in parsed_products:
+        fingerprint = get_product_fingerprint(parsed)
+        product = existing_products.get(parsed.parse_url)
+        if product is None:
+            new_products.append(
+                Product(
+                    name=parsed.name,
+                    parse_url=parsed.parse_url,
+                    ton_price=parsed.price,
+                    in_stock=parsed.in_stock,
+                    is_published=True,  # if product.in_stock else False,
+                    idt=parsed.idt,
+                    idf=parsed.idf,
+                    idb=parsed.idb,
+                    parse_fingerprint=fingerprint,
+                )
+            )
+            continue
+
+        if product.parse_fingerprint == fingerprint:
+            unchanged_products.append(product)
+            continue
+
+        price = Decimal(f"{parsed.price:.2f}")
+        if product.ton_price != price or product.in_stock != parsed.in_stock:
+            product.ton_price = price
+            product.in_stock = parsed.in_stock
+            history.append(_get_history_record(product, today))
+        product.parse_fingerprint = fingerprint
+        product.updated_date = now
+        product.idt, product.idf, product.idb = parsed.idt, parsed.idf, parsed.idb
+        updated_products.append(product)
+
+    _upsert_new_products(category, new_products)
+    # Продукт из другой категории (перенесенный на mc.ru) привязываем и к этой.
+    # Главной она станет, когда продукт пропадет из прежней категории
+    ProductCategories.objects.bulk_create(
+        [
+            ProductCategories(
+                product=product,
+                category=category,
+                is_display=True,
+                is_primary=not product.has_primary,
+            )
+            for product in existing_products.values()
+            if not product.is_linked
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    Product.objects.bulk_update(
+        updated_products,
+        [
+            "in_stock",
+            "ton_price",
+            "updated_date",
+            "idt",
+            "idf",
+            "idb",
+            "parse_fingerprint",
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    history.extend(_get_history_record(product, today) for product in new_products)
+
+    products = {product.parse_url: product for product in new_products}
+    products.update({product.parse_url: product for product in updated_products})
+    property_values: list[ProductPropertyValue] = []
+    for parsed in parsed_products:
+        if parsed.parse_url not in products:
+            continue
+        # Две колонки в одном свойстве: upsert не может обновить строку дважды
+        values: dict[int, str] = {}
+        for column, value in (
+            (CategoryPropertyMapping.Column.LENGTH, parsed.length),
+            (CategoryPropertyMapping.Column.MARK, parsed.mark),
+            (CategoryPropertyMapping.Column.SIZE, parsed.size),
+        ):
+            if column in properties:
+                values.setdefault(properties[column].id, value)
+        property_values.extend(
+            ProductPropertyValue(
+                product=products[parsed.parse_url],
+                property_id=property_id,
+                value=value,
+            ).fill_value()
+            for property_id, value in values.items()
+        )
+    ProductPropertyValue.objects.bulk_create(
+        property_values,
+        update_conflicts=True,
+        unique_fields=["product", "property"],
+        update_fields=["value", "value_numeric", "value_key"],
+        batch_size=BATCH_SIZE,
+    )
+    save_price_history(history)
+    # Цены метра и штуки - после записи длины, одним запросом на часть. Новым
+    # продуктам нужны хотя бы цены для витрины
+    recalculate_prices([product.id for product in updated_products + new_products])
+
+    result.parsed_ids.extend(
+        product.id for product in updated_products + unchanged_products
+    )
+    result.created_ids.extend(product.id for product in new_products)
+    result.created_count += len(new_products)
+    result.updated_count += len(updated_products)
+    result.unchanged_count += len(unchanged_products)
+
+
+def _move_primary_category(category: Category, product_ids: list[int]) -> None:
+    """
+    Делает главной для продуктов последнюю привязку к другой спаршенной
+    категории вместо `category`
+    """
+    ProductCategories.objects.filter(
+        category=category, product_id__in=product_ids
+    ).update(is_primary=False)
+    latest_links = (
+        ProductCategories.objects.filter(
+            product_id__in=product_ids, category__last_parsed_at__isnull=False
+        )
+        .exclude(category=category)
+        .values("product_id")
+        .annotate(last_id=Max("id"))
+        .values_list("last_id", flat=True)
+    )
+    ProductCategories.objects.filter(id__in=list(latest_links)).update(is_primary=True)
+    # Коэффициент цены берется из главной категории
+    recalculate_display_prices(product_ids)
+
+
+def _mark_missing_products(category: Category, parse_urls: set[str]) -> None:
+    """
+    Убирает отметку "В наличии" у продуктов, которые отсутствовали в результатах
+    парсинга. Отпечаток сбрасываем, чтобы при возвращении продукта в таблицу он
+    снова записался. Продукт, который есть в другой спаршенной категории,
+    перенесен на mc.ru: с наличия его не снимаем, а переносим главную категорию
+    """
+    today = timezone.localdate()
+    missing_products = list(
+        Product.objects.filter(
+            product_categories__category=category,
+            product_categories__is_primary=True,
+            in_stock=True,
+        )
+        .exclude(parse_url__in=parse_urls)
+        .annotate(
+            is_moved=Exists(
+                ProductCategories.objects.filter(
+                    product=OuterRef("pk"), category__last_parsed_at__isnull=False
+                ).exclude(category=category)
+            )
+        )
+    )
+    moved_ids = [product.id for product in missing_products if product.is_moved]
+    if moved_ids:
+        _move_primary_category(category, moved_ids)
+    missing_products = [product for product in missing_products if not product.is_moved]
+
+    history = []
+    for product in missing_products:
+        product.in_stock = False
+        history.append(_get_history_record(product, today))
+    Product.objects.filter(id__in=[product.id for product in missing_products]).update(
+        in_stock=False, parse_fingerprint=""
+    )
+    save_price_history(history)
+
+
+def save_category_products(
+    category: Category,
+    parsed_products: Iterable[ParsedProduct],
+    start: int = 0,
+    checkpoint: Callable[[int], None] | None = None,
+) -> SaveResult:
+    """
+    Сохраняет спаршенные продукты категории пачками: создание, обновление, привязка
+    к категории и значения свойств - несколько bulk-запросов вместо save() на
+    каждый продукт. Сигналы модели при этом не вызываются, поэтому цены метра и
+    штуки обновленных продуктов пересчитываются здесь же (services.prices). Для
+    новых продуктов AutoSlugField по-прежнему проверяет уникальность slug
+    отдельным запросом на каждый продукт.
+
+    Существующий продукт перезаписывается, только если изменился его отпечаток
+    (get_product_fingerprint). Изменения цены и наличия попадают в
+    ProductPriceHistory.
+
+    Продукты пишутся частями по PARSER_PERSIST_CHUNK_SIZE, каждая в своей
+    транзакции. После части вызывается `checkpoint(сколько продуктов сохранено)`
+    в той же транзакции, так что прогресс фиксируется вместе с данными, а
+    прерванное сохранение можно продолжить с продукта `start`. Продукты, которых
+    нет в результатах парсинга, снимаются с наличия только после сохранения
+    всех частей.
+    """
+    result = SaveResult()
+    # Один продукт на URL, иначе upsert значений свойств затронет строку дважды
+    parsed_products = list(
+        {product.parse_url: product for product in parsed_products}.values()
+    )
+    properties = get_category_properties(category)
+    chunk_size = settings.PARSER_PERSIST_CHUNK_SIZE
+
+    for offset in range(start, len(parsed_products), chunk_size):
+        chunk = parsed_products[offset : offset + chunk_size]
+        with transaction.atomic():
+            _save_chunk(category, chunk, properties, result)
+            if checkpoint is not None:
+                checkpoint(offset + len(chunk))
+
+    with transaction.atomic():
+        _mark_missing_products(
+            category, {product.parse_url for product in parsed_products}
+        )
+    return result
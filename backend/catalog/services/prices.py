@@ -0,0 +1,301 @@
+"""
+Пересчет цен метра и штуки по цене тонны, весу метра ("ves-metra") и длине
+("dlina").
+
+Цены набора продуктов, категории или всего каталога пересчитываются одним
+UPDATE ... FROM по значениям свойств: продукты не загружаются в Python, сигналы
+модели не вызываются. Расчет повторяет services.products.calculate_prices,
+включая арифметику с плавающей точкой, поэтому результат тот же, что и при
+расчете в Python.
+
+Сигналы моделей не пересчитывают цены сразу, а копят id продуктов до коммита
+транзакции (schedule_prices_recalculation): сохранение сотни строк в админке
+дает один пересчет, а не запросы на каждое сохранение.
+
+Вместе с ценами метра и штуки обновляются цены для витрины (display_*): своя
+или рассчитанная цена с коэффициентом главной категории.
+
+Весь каталог пересчитывается по диапазонам id (recalculate_all_prices,
+manage.py recalc_prices, recalculate_prices_task).
+"""
+
+import threading
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from backend.catalog.models import (
+    Category,
+    Product,
+    ProductCategories,
+    ProductProperty,
+    ProductPropertyValue,
+)
+
+METER_WEIGHT_CODE = "ves-metra"
+LENGTH_CODE = "dlina"
+
+# Что принимают parse_meter_weight (float после замены запятой) и parse_length
+# (int нижней границы диапазона)
+FLOAT_RE = r"^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$"
+INT_RE = r"^\s*\+?\d+\s*$"
+
+# id продуктов, ждущих пересчета после коммита, свои в каждом потоке
+_pending = threading.local()
+
+PRICES_SQL = """
+WITH raw AS (
+    SELECT
+        v.product_id,
+        max(v.value) FILTER (WHERE pp.code = %(weight_code)s) AS weight,
+        max(v.value) FILTER (WHERE pp.code = %(length_code)s) AS length
+    FROM {value_table} AS v
+    JOIN {property_table} AS pp ON pp.id = v.property_id
+    WHERE pp.code IN (%(weight_code)s, %(length_code)s) {values_filter}
+    GROUP BY v.product_id
+),
+parsed AS (
+    SELECT
+        raw.product_id,
+        CASE WHEN replace(raw.weight, ',', '.') ~ %(float_re)s
+            THEN replace(raw.weight, ',', '.')::float8
+        END AS weight,
+        CASE WHEN split_part(raw.length, '-', 1) ~ %(int_re)s
+            THEN split_part(raw.length, '-', 1)::bigint
+        END AS length
+    FROM raw
+),
+meter AS (
+    SELECT
+        parsed.product_id,
+        parsed.length,
+        ceil(
+            coalesce(nullif(p.custom_ton_price, 0), p.ton_price)::float8
+            / 1000 * parsed.weight
+        ) AS meter_price
+    FROM parsed
+    JOIN {product_table} AS p ON p.id = parsed.product_id
+    WHERE coalesce(nullif(p.custom_ton_price, 0), p.ton_price) != 0
+        AND parsed.weight != 0
+)
+UPDATE {product_table} AS p
+SET
+    meter_price = meter.meter_price,
+    unit_price = CASE WHEN meter.length != 0
+        THEN ceil(meter.meter_price * meter.length / 1000)
+        ELSE p.unit_price
+    END
+FROM meter
+WHERE p.id = meter.product_id
+RETURNING p.id, p.meter_price, p.unit_price
+"""
+
+# Цены для витрины, как их раньше считал сериализатор списка: своя цена, если
+# задана, иначе спаршенная/рассчитанная, умноженная на коэффициент главной
+# категории. Цена тонны поднимается до следующей сотни: округление половины
+# вверх, а не до четного, как round() в Python, на сотню не влияет. Строки без
+# изменений не перезаписываются
+DISPLAY_PRICES_SQL = """
+WITH coefficient AS (
+    SELECT DISTINCT ON (p.id)
+        p.id AS product_id,
+        coalesce(c.price_coefficient, 1) AS coefficient
+    FROM {product_table} AS p
+    LEFT JOIN {link_table} AS pc ON pc.product_id = p.id AND pc.is_primary
+    LEFT JOIN {category_table} AS c ON c.id = pc.category_id
+    WHERE TRUE {products_filter}
+    ORDER BY p.id, c.id
+),
+price AS (
+    SELECT
+        p.id,
+        coalesce(nullif(p.custom_ton_price, 0), p.ton_price) * k.coefficient
+            AS ton,
+        coalesce(nullif(p.custom_meter_price, 0), p.meter_price) * k.coefficient
+            AS meter,
+        coalesce(nullif(p.custom_unit_price, 0), p.unit_price) * k.coefficient
+            AS unit
+    FROM {product_table} AS p
+    JOIN coefficient AS k ON k.product_id = p.id
+),
+display AS (
+    SELECT
+        price.id,
+        CASE WHEN price.ton = 0 THEN 0 ELSE (
+            div(round(price.ton), 100) + 1
+        ) * 100 END AS ton,
+        ceil(price.meter) AS meter,
+        ceil(price.unit) AS unit
+    FROM price
+)
+UPDATE {product_table} AS p
+SET
+    display_ton_price = display.ton,
+    display_meter_price = display.meter,
+    display_unit_price = display.unit
+FROM display
+WHERE p.id = display.id
+    AND (p.display_ton_price, p.display_meter_price, p.display_unit_price)
+        IS DISTINCT FROM (display.ton, display.meter, display.unit)
+"""
+
+
+def _get_values_filter(
+    product_ids: Iterable[int] | None,
+    category: Category | None,
+    id_range: tuple[int, int] | None = None,
+    column: str = "v.product_id",
+) -> tuple[str, dict]:
+    if id_range is not None:
+        return f"AND {column} BETWEEN %(first_id)s AND %(last_id)s", {
+            "first_id": id_range[0],
+            "last_id": id_range[1],
+        }
+    if product_ids is not None:
+        return f"AND {column} = ANY(%(product_ids)s)", {
+            "product_ids": list(product_ids)
+        }
+    if category is not None:
+        # Категория вместе с подкатегориями: у treebeard это префикс пути
+        return (
+            f"""AND {column} IN (
+                SELECT pc.product_id
+                FROM {ProductCategories._meta.db_table} AS pc
+                JOIN {Category._meta.db_table} AS c ON c.id = pc.category_id
+                WHERE c.path LIKE %(category_path)s
+            )""",
+            {"category_path": f"{category.path}%"},
+        )
+    return "", {}
+
+
+def _execute(
+    product_ids: Iterable[int] | None = None,
+    category: Category | None = None,
+    id_range: tuple[int, int] | None = None,
+) -> dict[int, tuple[Decimal, Decimal]]:
+    values_filter, params = _get_values_filter(product_ids, category, id_range)
+    sql = PRICES_SQL.format(
+        value_table=ProductPropertyValue._meta.db_table,
+        property_table=ProductProperty._meta.db_table,
+        product_table=Product._meta.db_table,
+        values_filter=values_filter,
+    )
+    params.update(
+        weight_code=METER_WEIGHT_CODE,
+        length_code=LENGTH_CODE,
+        float_re=FLOAT_RE,
+        int_re=INT_RE,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    # Цены для витрины зависят от пересчитанных цен метра и штуки
+    _execute_display(product_ids, category, id_range)
+    return {product_id: (meter, unit) for product_id, meter, unit in rows}
+
+
+def _execute_display(
+    product_ids: Iterable[int] | None = None,
+    category: Category | None = None,
+    id_range: tuple[int, int] | None = None,
+) -> int:
+    products_filter, params = _get_values_filter(
+        product_ids, category, id_range, column="p.id"
+    )
+    sql = DISPLAY_PRICES_SQL.format(
+        product_table=Product._meta.db_table,
+        link_table=ProductCategories._meta.db_table,
+        category_table=Category._meta.db_table,
+        products_filter=products_filter,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def recalculate_prices(
+    product_ids: Iterable[int] | None = None, category: Category | None = None
+) -> dict[int, tuple[Decimal, Decimal]]:
+    """
+    Пересчитывает цены метра и штуки продуктов `product_ids`, продуктов
+    категории `category` с подкатегориями или, без аргументов, всего каталога.
+    Как и calculate_prices, не трогает цену метра, если нет цены тонны или веса
+    метра, и цену штуки, если нет длины. Заодно обновляет цены для витрины
+    (display_*). Возвращает новые цены: {product_id: (цена метра, цена штуки)}
+    """
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return {}
+    return _execute(product_ids, category)
+
+
+def recalculate_display_prices(
+    product_ids: Iterable[int] | None = None, category: Category | None = None
+) -> int:
+    """
+    Обновляет только цены для витрины (display_*): цены с коэффициентом главной
+    категории. Для смены коэффициента, когда сами цены не менялись. Возвращает
+    количество измененных продуктов
+    """
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return 0
+    return _execute_display(product_ids, category)
+
+
+@dataclass
+class PricesRecalculationResult:
+    updated_count: int = 0
+    chunks_count: int = 0
+    seconds: float = 0.0
+
+
+def recalculate_all_prices(chunk_size: int | None = None) -> PricesRecalculationResult:
+    """
+    Пересчитывает цены всего каталога по диапазонам id продуктов: каждый
+    диапазон - отдельный UPDATE в своей транзакции, чтобы не держать
+    блокировки всех строк каталога до конца пересчета
+    """
+    chunk_size = chunk_size or settings.PRICES_RECALCULATE_CHUNK_SIZE
+    result = PricesRecalculationResult()
+    started = time.perf_counter()
+    bounds = Product.objects.aggregate(first_id=Min("id"), last_id=Max("id"))
+    if bounds["first_id"] is not None:
+        for first_id in range(bounds["first_id"], bounds["last_id"] + 1, chunk_size):
+            with transaction.atomic():
+                prices = _execute(id_range=(first_id, first_id + chunk_size - 1))
+                result.updated_count += len(prices)
+            result.chunks_count += 1
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def _recalculate_pending_prices() -> None:
+    product_ids = getattr(_pending, "product_ids", None)
+    if not product_ids:
+        return
+    _pending.product_ids = set()
+    recalculate_prices(product_ids)
+
+
+def schedule_prices_recalculation(product_ids: Iterable[int]) -> None:
+    """
+    Пересчитывает цены продуктов после коммита текущей транзакции, всех
+    накопленных за транзакцию продуктов - одним запросом. Вне транзакции
+    пересчет выполняется сразу
+    """
+    if not hasattr(_pending, "product_ids"):
+        _pending.product_ids = set()
+    _pending.product_ids.update(product_ids)
+    # Первый сработавший обработчик забирает все id, остальные ничего не делают.
+    # Обработчик регистрируется каждый раз: при откате точки сохранения
+    # обработчики из нее отбрасываются, а id остаются до следующего коммита
+    transaction.on_commit(_recalculate_pending_prices)
@@ -1,6 +1,19 @@
+import math
+from datetime import timedelta
+
+from django.db.models import Prefetch
 from django.db.models.query import QuerySet
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
 
-from backend.catalog.models import Product
+from backend.catalog.models import (
+    Category,
+    Product,
+    ProductCategories,
+    ProductPriceHistory,
+    ProductPropertyValue,
+)
+from backend.utils.custom import get_object_or_None
 
 
 def add_product_properties(product: Product) -> None:
@@ -33,29 +46,63 @@ def remove_redundant_product_properties(product: Product) -> None:
     # # product.properties_through.filter(property__in=remove_properties).delete()
 
 
+def prefetch_product_list_data(queryset: QuerySet) -> QuerySet:
+    """
+    Подгружает для списка продуктов главную категорию (для коэффициента цены) и
+    свойства, отображаемые в списке: по запросу на всю страницу, а не на продукт
+    """
+    return queryset.prefetch_related(
+        Prefetch(
+            "product_categories",
+            queryset=ProductCategories.objects.filter(is_primary=True).select_related(
+                "category"
+            ),
+            to_attr="primary_category_links",
+        ),
+        Prefetch(
+            "properties_through",
+            queryset=ProductPropertyValue.objects.filter(
+                property__is_display_in_list=True
+            ).select_related("property"),
+            to_attr="list_properties",
+        ),
+    )
+
+
+def get_primary_category(product: Product) -> Category | None:
+    """
+    Главная категория продукта: из prefetch_product_list_data, если продукт
+    загружен через него, иначе запросом
+    """
+    links = getattr(product, "primary_category_links", None)
+    if links is None:
+        return product.categories.filter(product_categories__is_primary=True).first()
+    return links[0].category if links else None
+
+
 def get_same_category_products(product: Product) -> QuerySet:
-    category = product.categories.filter(product_categories__is_primary=True).first()
+    category = get_primary_category(product)
     if category is None:
         return Product.objects.none()
     else:
-        products = category.products.filter(is_published=True).exclude(id=product.id)[
-            :5
-        ]
+        products = prefetch_product_list_data(
+            category.products.filter(is_published=True).exclude(id=product.id)
+        )[:5]
 
     return products
 
 
 def get_related_products(product: Product) -> QuerySet:
-    products = Product.objects.filter(
-        is_published=True,
+    products = prefetch_product_list_data(
+        Product.objects.filter(
+            is_published=True,
+        )
     )
     return products[:5]
 
 
 def get_img_path(product: Product) -> str | None:
-    main_cateory = product.categories.filter(
-        product_categories__is_primary=True
-    ).first()
+    main_cateory = get_primary_category(product)
     if product.image:
         img_url = product.image.name
     elif main_cateory is not None and main_cateory.product_image:
@@ -65,3 +112,54 @@ def get_img_path(product: Product) -> str | None:
     else:
         img_url = None
     return img_url
+
+
+def get_product_price_history(slug: str, days: int | None = None) -> QuerySet:
+    """
+    Возвращает историю цены и наличия опубликованного продукта, при необходимости
+    только за последние `days` дней
+    """
+    product = get_object_or_None(Product, slug=slug, is_published=True)
+    if product is None:
+        raise NotFound(f"Продукт slug={slug} не существует")
+
+    qs = ProductPriceHistory.objects.filter(product=product)
+    if days is not None:
+        qs = qs.filter(date__gte=timezone.localdate() - timedelta(days=days))
+    return qs
+
+
+def parse_meter_weight(value: str) -> float | None:
+    """
+    Возвращает вес метра из значения свойства "ves-metra"
+    """
+    try:
+        return float(value.replace(",", "."))
+    except ValueError:
+        return None
+
+
+def parse_length(value: str) -> int | None:
+    """
+    Возвращает длину из значения свойства "dlina". Для диапазона (6000-12000)
+    берется нижняя граница
+    """
+    try:
+        return int(value.split("-")[0]) if "-" in value else int(value)
+    except ValueError:
+        return None
+
+
+def calculate_prices(
+    ton_price: float, meter_weight: float | None, length: int | None
+) -> tuple[int | None, int | None]:
+    """
+    Рассчитывает цену метра и цену штуки по цене тонны, весу метра и длине.
+    Если данных для расчета не хватает, соответствующая цена - None
+    """
+    if not ton_price or not meter_weight:
+        return None, None
+    meter_price = math.ceil(ton_price / 1_000 * meter_weight)
+    if not length:
+        return meter_price, None
+    return meter_price, math.ceil(meter_price * length / 1000)
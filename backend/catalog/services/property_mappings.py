@@ -0,0 +1,92 @@
+import time
+from typing import NamedTuple, cast
+
+from django.core.cache import cache
+
+from backend.catalog.models import Category, CategoryPropertyMapping, ProductProperty
+
+Column = CategoryPropertyMapping.Column
+
+# Свойства колонок для категорий без настройки в CategoryPropertyMapping
+DEFAULT_PROPERTY_CODES = {
+    Column.SIZE: "diametr",
+    Column.MARK: "marka-stali",
+    Column.LENGTH: "dlina",
+}
+
+CACHE_TIMEOUT = 60 * 60 * 24
+VERSION_KEY = "catalog:property-mapping:version"
+
+
+class MappedProperty(NamedTuple):
+    id: int
+    code: str
+
+
+def _get_cache_version() -> int:
+    # Новая версия - текущее время, а не 1: после вытеснения ключа версии из кэша
+    # старые записи не должны снова стать актуальными
+    return cast(int, cache.get_or_set(VERSION_KEY, time.time_ns, timeout=None))
+
+
+def invalidate_category_properties() -> None:
+    """
+    Сбрасывает закэшированные свойства всех категорий: настройка родителя
+    действует на потомков, поэтому сбрасываем все сразу
+    """
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def _resolve_category_properties(category: Category) -> dict[str, MappedProperty]:
+    # Пути категории и ее предков, от корня к самой категории
+    paths = [
+        category.path[:end]
+        for end in range(Category.steplen, len(category.path) + 1, Category.steplen)
+    ]
+    resolved: dict[str, MappedProperty | None] = {}
+    for mapping in (
+        CategoryPropertyMapping.objects.filter(category__path__in=paths)
+        .select_related("property")
+        .order_by("category__depth")
+    ):
+        # Настройка ближайшей категории перекрывает настройки предков
+        resolved[mapping.column] = (
+            MappedProperty(mapping.property.id, mapping.property.code)
+            if mapping.property is not None
+            else None
+        )
+
+    default_codes = {
+        column: code
+        for column, code in DEFAULT_PROPERTY_CODES.items()
+        if column not in resolved
+    }
+    if default_codes:
+        default_ids = dict(
+            ProductProperty.objects.filter(code__in=default_codes.values()).values_list(
+                "code", "id"
+            )
+        )
+        for column, code in default_codes.items():
+            if code in default_ids:
+                resolved[column] = MappedProperty(default_ids[code], code)
+
+    return {column: mapped for column, mapped in resolved.items() if mapped is not None}
+
+
+def get_category_properties(category: Category) -> dict[str, MappedProperty]:
+    """
+    Возвращает свойства, в которые пишутся колонки таблицы товаров категории:
+    {колонка: (id, code)}. Колонок, которые не сохраняются, в словаре нет.
+    Результат кэшируется и сбрасывается при изменении CategoryPropertyMapping
+    """
+    key = f"catalog:property-mapping:{category.id}"
+    version = _get_cache_version()
+    properties = cache.get(key, version=version)
+    if properties is None:
+        properties = _resolve_category_properties(category)
+        cache.set(key, properties, timeout=CACHE_TIMEOUT, version=version)
+    return properties
@@ -0,0 +1,97 @@
+"""
+Адаптивное расписание парсинга листовых категорий.
+
+После каждого разбора обновляется частота изменений категории (change_rate) и
+интервал до следующего парсинга: если продукты изменились, интервал делится
+пополам, если нет - растет в полтора раза, в пределах
+PARSER_MIN_INTERVAL..PARSER_MAX_INTERVAL. За час запрашивается не больше
+PARSER_HOURLY_BUDGET страниц, первыми - самые просроченные категории.
+
+Категория, поставленная в очередь, помечается parse_queued_at до конца разбора:
+повторно в очередь она не попадает и занимает место в бюджете.
+"""
+
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.db.models.query import QuerySet
+from django.utils import timezone
+
+from backend.catalog.models import Category, ParseRun
+
+FAILED_STATUSES = (ParseRun.Status.FAILED, ParseRun.Status.BLOCKED)
+
+
+def _clamp_interval(interval: timedelta) -> timedelta:
+    return min(
+        max(interval, timedelta(seconds=settings.PARSER_MIN_INTERVAL)),
+        timedelta(seconds=settings.PARSER_MAX_INTERVAL),
+    )
+
+
+def update_parse_schedule(category: Category, run: ParseRun) -> None:
+    """
+    Планирует следующий парсинг категории по результату разбора
+    """
+    now = timezone.now()
+    if run.status in FAILED_STATUSES:
+        # Ошибку повторяем через минимальный интервал, частоту не трогаем
+        category.next_parse_at = now + timedelta(seconds=settings.PARSER_MIN_INTERVAL)
+    else:
+        changed = run.created_count + run.updated_count > 0
+        alpha = settings.PARSER_CHANGE_RATE_ALPHA
+        category.change_rate = alpha * changed + (1 - alpha) * category.change_rate
+        category.parse_interval = _clamp_interval(
+            category.parse_interval / 2 if changed else category.parse_interval * 1.5
+        )
+        category.next_parse_at = now + category.parse_interval
+
+    category.parse_queued_at = None
+    category.save(
+        update_fields=[
+            "change_rate",
+            "parse_interval",
+            "next_parse_at",
+            "parse_queued_at",
+        ]
+    )
+
+
+def _get_queued_since() -> datetime:
+    return timezone.now() - timedelta(seconds=settings.PARSER_QUEUED_TIMEOUT)
+
+
+def mark_categories_queued(categories_ids: Iterable[int]) -> None:
+    Category.objects.filter(id__in=list(categories_ids)).update(
+        parse_queued_at=timezone.now()
+    )
+
+
+def get_remaining_budget() -> int:
+    """
+    Сколько страниц категорий еще можно запросить в текущем часе: запуски за
+    час и категории, которые еще ждут в очереди
+    """
+    used = ParseRun.objects.filter(
+        started_at__gte=timezone.now() - timedelta(hours=1)
+    ).count()
+    queued = Category.objects.filter(parse_queued_at__gte=_get_queued_since()).count()
+    return max(settings.PARSER_HOURLY_BUDGET - used - queued, 0)
+
+
+def get_due_categories(categories_ids: list[int] | None = None) -> QuerySet:
+    """
+    Листовые категории, которым пора парситься, в пределах часового бюджета:
+    сначала никогда не парсившиеся и самые просроченные, при равенстве - более
+    изменчивые
+    """
+    qs = Category.objects.filter(numchild=0).exclude(parse_url="")
+    if categories_ids is not None:
+        qs = qs.filter(id__in=categories_ids)
+    qs = qs.filter(Q(next_parse_at__isnull=True) | Q(next_parse_at__lte=timezone.now()))
+    qs = qs.exclude(parse_queued_at__gte=_get_queued_since())
+    return qs.order_by(F("next_parse_at").asc(nulls_first=True), "-change_rate")[
+        : get_remaining_budget()
+    ]
@@ -0,0 +1,80 @@
+import os
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,"
+    "image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36",
+    "Connection": "keep-alive",  # close
+    "Cache-Control": "no-cache",  # max-age 3600
+    "Accept-Language": "ru-RU",
+    # br распаковывается urllib3, если установлен пакет brotli
+    "Accept-Encoding": "gzip, deflate, br",
+}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session: requests.Session | None = None
+_session_pid: int | None = None
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter с таймаутом по умолчанию: у requests его нет, и зависший сокет
+    навсегда занимает воркер
+    """
+
+    def __init__(self, *args, timeout: tuple[float, float], **kwargs) -> None:
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def _create_session() -> requests.Session:
+    retry = Retry(
+        total=settings.PARSER_HTTP_RETRIES,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=["GET", "HEAD"],
+        # Экспоненциальная задержка со случайным смещением: 0.5, 1, 2, 4... сек
+        backoff_factor=settings.PARSER_HTTP_BACKOFF,
+        backoff_jitter=settings.PARSER_HTTP_BACKOFF,
+        respect_retry_after_header=True,
+        # После исчерпания попыток отдаем последний ответ, raise_for_status решит
+        raise_on_status=False,
+    )
+    adapter = TimeoutHTTPAdapter(
+        timeout=(
+            settings.PARSER_HTTP_CONNECT_TIMEOUT,
+            settings.PARSER_HTTP_READ_TIMEOUT,
+        ),
+        max_retries=retry,
+        pool_maxsize=settings.PARSER_CRAWL_CONCURRENCY,
+    )
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Возвращает общую для процесса сессию с пулом keep-alive соединений, таймаутами
+    и повторами запросов. После fork (воркеры celery) создается новая сессия, чтобы
+    не делить сокеты с родительским процессом
+    """
+    global _session, _session_pid
+
+    if _session is None or _session_pid != os.getpid():
+        _session = _create_session()
+        _session_pid = os.getpid()
+    return _session
@@ -0,0 +1,116 @@
+"""
+Хранилище загруженных страниц mc.ru на диске.
+
+Тела страниц лежат сжатыми в objects/<2 символа>/<sha256>.html.gz, поэтому
+одинаковые страницы хранятся один раз. Для каждого URL в refs/<sha256 url>.jsonl
+дописывается строка со ссылкой на содержимое, последняя строка - актуальный снимок.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from collections.abc import Iterator
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+from django.conf import settings
+from django.utils import timezone
+from loguru import logger
+
+SITEMAP = "sitemap"
+CATEGORY = "category"
+WEIGHT = "weight"
+
+
+def _get_root() -> Path:
+    return Path(settings.PARSER_SNAPSHOTS_ROOT)
+
+
+def _get_object_path(content_hash: str) -> Path:
+    return _get_root() / "objects" / content_hash[:2] / f"{content_hash}.html.gz"
+
+
+def _get_ref_path(url: str) -> Path:
+    return _get_root() / "refs" / f"{hashlib.sha256(url.encode()).hexdigest()}.jsonl"
+
+
+def save_snapshot(url: str, text: str, kind: str) -> str | None:
+    """
+    Сохраняет страницу, если снимки включены (PARSER_SNAPSHOTS_ENABLED).
+    Возвращает хэш содержимого. Ошибки записи только логируются: снимки не должны
+    ломать парсинг
+    """
+    if not settings.PARSER_SNAPSHOTS_ENABLED:
+        return None
+
+    content = text.encode()
+    content_hash = hashlib.sha256(content).hexdigest()
+    try:
+        object_path = _get_object_path(content_hash)
+        if not object_path.exists():
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+            # Пишем во временный файл и переименовываем, чтобы параллельные
+            # загрузки не увидели недописанный снимок
+            with NamedTemporaryFile(dir=object_path.parent, delete=False) as tmp:
+                tmp.write(gzip.compress(content))
+            os.replace(tmp.name, object_path)
+
+        ref_path = _get_ref_path(url)
+        ref_path.parent.mkdir(parents=True, exist_ok=True)
+        ref = {
+            "url": url,
+            "kind": kind,
+            "hash": content_hash,
+            "fetched_at": timezone.now().isoformat(),
+        }
+        with ref_path.open("a") as f:
+            f.write(json.dumps(ref) + "\n")
+    except OSError as e:
+        logger.error("Не удалось сохранить снимок {}: {}", url, e)
+        return None
+
+    return content_hash
+
+
+def get_snapshot_refs(url: str) -> list[dict]:
+    """
+    Возвращает все снимки URL, от старых к новым
+    """
+    ref_path = _get_ref_path(url)
+    if not ref_path.exists():
+        return []
+    with ref_path.open() as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def iter_snapshot_refs(kind: str | None = None) -> Iterator[dict]:
+    """
+    Отдает последний снимок каждого URL, при необходимости только заданного типа
+    """
+    for ref_path in sorted((_get_root() / "refs").glob("*.jsonl")):
+        with ref_path.open() as f:
+            lines = [line for line in f if line.strip()]
+        if not lines:
+            continue
+        ref = json.loads(lines[-1])
+        if kind is None or ref["kind"] == kind:
+            yield ref
+
+
+def load_object(content_hash: str) -> str:
+    return gzip.decompress(_get_object_path(content_hash).read_bytes()).decode()
+
+
+def load_snapshot(url: str, content_hash: str | None = None) -> str | None:
+    """
+    Возвращает последний снимок URL или снимок с заданным хэшем
+    """
+    refs = get_snapshot_refs(url)
+    if content_hash is None:
+        if not refs:
+            return None
+        content_hash = refs[-1]["hash"]
+    elif not any(ref["hash"] == content_hash for ref in refs):
+        return None
+    return load_object(content_hash)
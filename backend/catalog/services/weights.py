@@ -0,0 +1,175 @@
+import re
+
+from bs4 import BeautifulSoup
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from loguru import logger
+from requests.exceptions import HTTPError
+
+from backend.catalog.models import Product, ProductProperty, ProductPropertyValue
+from backend.catalog.services import snapshots
+from backend.catalog.services.breaker import get_host_breaker
+from backend.catalog.services.crawler import crawl
+from backend.catalog.services.locks import get_host_semaphore
+from backend.catalog.services.prices import recalculate_prices
+from backend.catalog.services.session import get_session
+from backend.catalog.services.snapshots import save_snapshot
+
+WEIGHT_PROPERTY_CODE = "ves-metra"
+# Форма проверки "я не робот", которую mc.ru показывает при блокировке
+CHECK_HUMAN_RE = re.compile(r"<form[^>]+action=[\"']?/check-human", re.I)
+
+WeightKey = tuple[str, str, str]
+
+
+def get_weight_url(idt: str, idf: str, idb: str) -> str:
+    return f"https://mc.ru/pages/blocks/add_basket.asp/id/{idt}/idf/{idf}/idb/{idb}"
+
+
+def _get_cache_key(key: WeightKey) -> str:
+    return "catalog:weight:{}:{}:{}".format(*key)
+
+
+def parse_weight_page(text: str) -> str | None:
+    """
+    Достает вес метра (кг) из всплывающего окна добавления в корзину: там он
+    записан в тоннах в переменную `k`
+    """
+    soup = BeautifulSoup(text, "html.parser")
+    script = soup.find("script", language="Javascript")
+    if script is None:
+        logger.error("Не найден скрипт с весом")
+        return None
+    # Получаем значение переменной
+    k = re.search("var k=(.*?);", script.text)
+    if k is None:
+        logger.error("Не удалось получить значение переменной")
+        return None
+    try:
+        return str(round(float(k.group(1)) * 1000, 3))
+    except ValueError:
+        logger.error("Некорректный вес: {}", k.group(1))
+        return None
+
+
+def fetch_weight(url: str) -> str | None:
+    """
+    Загружает вес метра. Запрос занимает место в семафоре хоста наравне с
+    разбором категорий, свободного места ждет до PARSER_SEMAPHORE_TIMEOUT
+    """
+    breaker = get_host_breaker(url)
+    if not breaker.allow_request():
+        raise HTTPError("Парсинг приостановлен после блокировки")
+
+    semaphore = get_host_semaphore(url)
+    with semaphore.hold(wait=settings.PARSER_SEMAPHORE_TIMEOUT) as acquired:
+        if not acquired:
+            raise TimeoutError("Нет свободного места в семафоре хоста")
+        response = get_session().get(url)
+    response.raise_for_status()
+    if CHECK_HUMAN_RE.search(response.text):
+        breaker.record_block()
+        raise HTTPError("Блокировка парсинга")
+    breaker.record_success()
+    save_snapshot(url, response.text, snapshots.WEIGHT)
+    return parse_weight_page(response.text)
+
+
+def get_weights(keys: set[WeightKey]) -> dict[WeightKey, str]:
+    """
+    Возвращает веса метра для набора (idt, idf, idb). Сначала смотрим в кэш,
+    недостающее качаем параллельно и кладем в кэш на PARSER_WEIGHT_CACHE_TTL.
+    Если на странице веса нет, в кэш попадает пустая строка, чтобы не запрашивать
+    ее снова до истечения TTL
+    """
+    cached = cache.get_many([_get_cache_key(key) for key in keys])
+    weights = {
+        key: cached[_get_cache_key(key)]
+        for key in keys
+        if _get_cache_key(key) in cached
+    }
+
+    urls = {get_weight_url(*key): key for key in keys if key not in weights}
+    fetched: dict[str, str] = {}
+    for page in crawl(
+        urls,
+        fetch_weight,
+        concurrency=settings.PARSER_CRAWL_CONCURRENCY,
+        interval=settings.PARSER_HOST_INTERVAL,
+    ):
+        if page.error is not None:
+            continue
+        weights[urls[page.url]] = page.page or ""
+        fetched[_get_cache_key(urls[page.url])] = page.page or ""
+
+    cache.set_many(fetched, timeout=settings.PARSER_WEIGHT_CACHE_TTL)
+    return {key: weight for key, weight in weights.items() if weight}
+
+
+def get_products_without_weight():
+    """
+    Продукты с идентификаторами mc.ru, у которых не заполнен вес метра
+    """
+    with_weight = ProductPropertyValue.objects.filter(
+        property__code=WEIGHT_PROPERTY_CODE
+    ).exclude(value="")
+    return (
+        Product.objects.exclude(Q(idt="") | Q(idf="") | Q(idb=""))
+        .exclude(id__in=with_weight.values("product_id"))
+        .order_by("id")
+    )
+
+
+def enrich_products_weights(
+    product_ids: list[int] | None = None, batch_size: int = 500
+) -> int:
+    """
+    Заполняет вес метра продуктам, у которых его нет, и пересчитывает им цены
+    метра и штуки. Продукты обрабатываются пачками по `batch_size`: веса пачки
+    качаются параллельно и записываются одним upsert. Возвращает количество
+    обновленных продуктов
+    """
+    weight_property = ProductProperty.objects.filter(code=WEIGHT_PROPERTY_CODE).first()
+    if weight_property is None:
+        logger.error("Не найдено свойство {}", WEIGHT_PROPERTY_CODE)
+        return 0
+
+    products = get_products_without_weight()
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+
+    updated_count = 0
+    last_id = 0
+    while True:
+        products_keys = {
+            product_id: (idt, idf, idb)
+            for product_id, idt, idf, idb in products.filter(
+                id__gt=last_id
+            ).values_list("id", "idt", "idf", "idb")[:batch_size]
+        }
+        if not products_keys:
+            break
+        last_id = max(products_keys)
+        weights = get_weights(set(products_keys.values()))
+
+        property_values = [
+            ProductPropertyValue(
+                product_id=product_id,
+                property=weight_property,
+                value=weights[key],
+            ).fill_value()
+            for product_id, key in products_keys.items()
+            if key in weights
+        ]
+        ProductPropertyValue.objects.bulk_create(
+            property_values,
+            update_conflicts=True,
+            unique_fields=["product", "property"],
+            update_fields=["value", "value_numeric", "value_key"],
+            batch_size=1000,
+        )
+        recalculate_prices([value.product_id for value in property_values])
+        updated_count += len(property_values)
+
+    return updated_count
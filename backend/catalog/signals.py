@@ -1,22 +1,43 @@
-import math
-
-from django.db.models.signals import post_save, pre_save  # m2m_changed, post_delete,
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_save,
+)
 from django.dispatch import receiver
-from slugify import slugify
 
 from backend.catalog.models import (  # ProductProperty,
     Category,
+    CategoryPropertyMapping,
     Product,
+    ProductCategories,
+    ProductProperty,
     ProductPropertyValue,
 )
+from backend.catalog.services.categories import propagate_category_properties
+from backend.catalog.services.prices import (
+    recalculate_display_prices,
+    schedule_prices_recalculation,
+)
+from backend.catalog.services.property_mappings import (
+    invalidate_category_properties,
+)
 
 # from backend.products.services.products import add_product_properties
 
 
 @receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=Category)
 def generate_slug_signal(sender, instance, **kwargs):
-    if instance.slug == "":
-        instance.slug = slugify(instance.name)
+    """
+    Новому объекту slug генерирует AutoSlugField с проверкой уникальности
+    """
+    if instance._state.adding:
+        instance.slug = ""
 
 
 @receiver(pre_save, sender=Category)
@@ -25,12 +46,60 @@ def fill_category_name_signal(sender, instance, **kwargs):
         instance.name = instance.parsed_name
 
 
+@receiver(post_init, sender=Category)
+def remember_price_coefficient_signal(sender, instance, **kwargs):
+    """
+    Запоминаем загруженный коэффициент цены, чтобы при сохранении не читать его
+    из базы. Через __dict__, чтобы отложенное поле не загружалось запросом
+    """
+    instance.initial_price_coefficient = instance.__dict__.get("price_coefficient")
+
+
+@receiver(pre_save, sender=Category)
+def check_price_coefficient_signal(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (
+        update_fields is not None and "price_coefficient" not in update_fields
+    ):
+        instance.price_coefficient_changed = False
+        return
+    instance.price_coefficient_changed = (
+        instance.initial_price_coefficient != instance.price_coefficient
+    )
+
+
 @receiver(post_save, sender=Category)
-def fill_child_categories_properties_signal(sender, instance, **kwargs):
-    if not instance.is_leaf() and instance.product_properties.exists():
-        for child in instance.get_children():
-            child.product_properties.clear()
-            child.product_properties.add(*instance.product_properties.all())
+def recalculate_display_prices_signal(sender, instance, update_fields=None, **kwargs):
+    """
+    Коэффициент цены категории изменился - обновляем цены на сайте ее
+    продуктов после коммита
+    """
+    if getattr(instance, "price_coefficient_changed", False):
+        transaction.on_commit(partial(recalculate_display_prices, category=instance))
+    if update_fields is None or "price_coefficient" in update_fields:
+        instance.initial_price_coefficient = instance.price_coefficient
+
+
+@receiver(m2m_changed, sender=ProductProperty.categories.through)
+def propagate_category_properties_signal(sender, instance, action, pk_set, **kwargs):
+    """
+    Передаем изменившийся набор свойств категории всем ее подкатегориям
+    """
+    if action == "pre_clear" and isinstance(instance, ProductProperty):
+        # В post_clear pk_set пуст: категории свойства запоминаем до очистки
+        category_ids = list(instance.categories.values_list("id", flat=True))
+        setattr(instance, "cleared_category_ids", category_ids)
+        return
+    if action == "post_clear" and isinstance(instance, ProductProperty):
+        pk_set = getattr(instance, "cleared_category_ids", None)
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if action != "post_clear" and not pk_set:
+        return
+    if isinstance(instance, Category):
+        propagate_category_properties(instance)
+    elif pk_set:
+        for category in Category.objects.filter(id__in=pk_set):
+            propagate_category_properties(category)
 
 
 @receiver(post_save, sender=Product)
@@ -51,69 +120,51 @@ def manage_product_properties_signal(sender, instance, **kwargs):
 @receiver(post_save, sender=ProductPropertyValue)
 def calculate_prices_when_update_property_signal(sender, instance, **kwargs):
     """
-    Если указана длина и вес тонны - рассчитываем вес штуки, цену метра и цену штуки
+    Если указана длина и вес тонны - рассчитываем вес штуки, цену метра и цену
+    штуки. Код свойства не проверяем, чтобы не запрашивать свойство: лишний
+    продукт в пересчете дешевле запроса на каждое сохранение
     """
-    meter_price = instance.product.meter_price
-    meter_weight = None
-    ton_price = (
-        instance.product.custom_ton_price
-        if instance.product.custom_ton_price
-        else instance.product.ton_price
-    )
-    if instance.property.code == "ves-metra" and ton_price:
-        try:
-            meter_weight = float(instance.value.replace(",", "."))
-        except ValueError:
-            pass
-        if meter_weight:
-            meter_price = math.ceil(float(ton_price) / 1_000 * meter_weight)
-            instance.product.meter_price = meter_price
-            instance.product.save()
-
-    if instance.property.code == "dlina" and meter_price:
-        try:
-            length = (
-                int(instance.value.split("-")[0])
-                if "-" in instance.value
-                else int(instance.value)
-            )
-        except ValueError:
-            pass
-
-        if length:
-            instance.product.unit_price = math.ceil(float(meter_price) * length / 1000)
-            instance.product.save()
+    schedule_prices_recalculation([instance.product_id])
 
 
-@receiver(pre_save, sender=Product)
+@receiver(post_save, sender=Product)
 def calculate_prices_when_ton_price_updated_signal(sender, instance, **kwargs):
-    length = meter_weight = None
-    ton_price = float(instance.custom_ton_price) or float(instance.ton_price)
-    meter_weight_instance = ProductPropertyValue.objects.filter(
-        product=instance,
-        property__code="ves-metra",
-    ).first()
-    if meter_weight_instance:
-        try:
-            meter_weight = float(meter_weight_instance.value.replace(",", "."))
-        except ValueError:
-            pass
-    length_instance = ProductPropertyValue.objects.filter(
-        product=instance,
-        property__code="dlina",
-    ).first()
-
-    if length_instance:
-        try:
-            length = (
-                int(length_instance.value.split("-")[0])
-                if "-" in length_instance.value
-                else int(length_instance.value)
-            )
-        except ValueError:
-            pass
-
-    if ton_price and meter_weight:
-        instance.meter_price = math.ceil(ton_price / 1_000 * meter_weight)
-        if length:
-            instance.unit_price = math.ceil(instance.meter_price * length / 1000)
+    """
+    Пересчитываем цены метра и штуки сохраненного продукта после коммита,
+    вместе с остальными продуктами транзакции
+    """
+    schedule_prices_recalculation([instance.id])
+
+
+@receiver([post_save, post_delete], sender=ProductCategories)
+def recalculate_prices_when_category_link_changed_signal(sender, instance, **kwargs):
+    """
+    Цены для витрины считаются с коэффициентом главной категории: при изменении
+    связи продукта с категорией пересчитываем их, даже если продукт не сохраняли
+    """
+    schedule_prices_recalculation([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def recalculate_prices_when_categories_changed_signal(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """
+    categories.add()/remove() пишут связи без post_save, поэтому ловим их отдельно
+    """
+    if action not in ("post_add", "post_remove"):
+        return
+    if not reverse:
+        schedule_prices_recalculation([instance.id])
+    elif pk_set:
+        schedule_prices_recalculation(pk_set)
+
+
+@receiver([post_save, post_delete], sender=CategoryPropertyMapping)
+@receiver([post_save, post_delete], sender=ProductProperty)
+def invalidate_category_properties_signal(sender, instance, **kwargs):
+    """
+    Сбрасываем кэш свойств колонок парсинга при изменении настройки или кода
+    свойства
+    """
+    invalidate_category_properties()
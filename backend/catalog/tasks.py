@@ -1,57 +1,82 @@
+import random
 import re
-import time
-from dataclasses import dataclass
-from datetime import timedelta
+from collections import Counter
+from functools import partial
 from typing import Any
 
 import requests
 from bs4 import BeautifulSoup
 from bs4.element import Tag
-from celery import current_task, shared_task  # group
+from celery import chord, shared_task
+from celery.exceptions import Retry, SoftTimeLimitExceeded
+from celery.signals import worker_init
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.db import transaction
-from django.db.models import Prefetch, Q
 from django.utils import timezone
 from loguru import logger
-from requests.exceptions import HTTPError, RequestException
-from treebeard.mp_tree import MP_Node
-
-from backend.catalog.models import (
-    Category,
-    Product,
-    ProductProperty,
-    ProductPropertyValue,
+from requests.exceptions import HTTPError
+
+from backend.catalog.models import Category, ParseRun, Product
+from backend.catalog.services import snapshots
+from backend.catalog.services.breaker import get_host_breaker
+from backend.catalog.services.categories import sync_category_tree
+from backend.catalog.services.fetch import (
+    PageFetchResult,
+    fetch_category_page,
+    fetch_page,
+)
+from backend.catalog.services.locks import get_category_lock, get_host_semaphore
+from backend.catalog.services.page_parser import (
+    add_unique_product,
+    get_product_name,
+    parse_price,
+)
+from backend.catalog.services.parse_pool import check_worker_pool, parse_page_text
+from backend.catalog.services.parse_runs import (
+    ParseRunRecorder,
+    delete_old_parse_runs,
+    record_failed_fetch,
+)
+from backend.catalog.services.persistence import (
+    ParsedProduct,
+    save_category_products,
+)
+from backend.catalog.services.prices import recalculate_all_prices
+from backend.catalog.services.scheduler import (
+    get_due_categories,
+    mark_categories_queued,
+    update_parse_schedule,
+)
+from backend.catalog.services.session import get_session
+from backend.catalog.services.snapshots import save_snapshot
+from backend.catalog.services.weights import (
+    enrich_products_weights,
+    fetch_weight,
+    get_weight_url,
 )
 from backend.utils.custom import get_object_or_None
 
-HEADERS = {
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,"
-    "image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
-    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36",
-    "Connection": "keep-alive",  # close
-    "Cache-Control": "no-cache",  # max-age 3600
-    "Accept-Language": "ru-RU",
-    "Accept-Encoding": "gzip, deflate, br",
-}
-
-
-@dataclass
-class ParsedProduct:
-    in_stock: bool
-    name: str
-    parse_url: str
-    size: str
-    mark: str
-    length: str
-    idt: str
-    idf: str
-    idb: str
-    price: float
-    weight: str = ""
+PARSE_SUCCESS = "success"
+PARSE_FAILED = "failed"
+# Категорию уже разбирает другой воркер
+PARSE_SKIPPED = "skipped"
+CATEGORY_FETCH_RETRIES = 3
+CATEGORY_RETRY_DELAY = 60 * 5
 
 
-@shared_task
-def parse_categories_task() -> list[dict[str, object]]:
+@worker_init.connect
+def check_worker_pool_signal(sender, **kwargs):
+    # Исключения обработчиков сигналов Celery только логирует, воркер
+    # останавливаем явно
+    try:
+        check_worker_pool(sender.pool_cls)
+    except ImproperlyConfigured as e:
+        raise SystemExit(str(e)) from e
+
+
+@shared_task(bind=True, max_retries=None)
+def parse_categories_task(self) -> list[dict[str, object]]:
     """
     This function parses categories from a sitemap and saves them to a database.
     :return: A list of dictionaries representing the parsed categories.
@@ -66,14 +91,20 @@ def parse_categories_task() -> list[dict[str, object]]:
     ]
     categories: list[dict[str, object]] = []
 
-    try:
-        response = requests.get(host + path, headers=HEADERS)
-        response.raise_for_status()
+    with get_host_semaphore(host).hold() as acquired:
+        if not acquired:
+            raise self.retry(
+                countdown=settings.PARSER_HOST_INTERVAL * random.uniform(1, 2)
+            )
+        try:
+            response = get_session().get(host + path)
+            response.raise_for_status()
 
-    except requests.exceptions.RequestException as e:
-        logger.error("Error: {}", e)
-        return categories
+        except requests.exceptions.RequestException as e:
+            logger.error("Error: {}", e)
+            return categories
 
+    save_snapshot(host + path, response.text, snapshots.SITEMAP)
     soup = BeautifulSoup(response.text, "html.parser")
     main_categories = soup.find_all("section", class_="category")
 
@@ -124,58 +155,52 @@ def parse_categories_task() -> list[dict[str, object]]:
             category["children"].append(subcategory)
         categories.append(category)
 
-    # Save categories to database
-    with transaction.atomic():
-        for cat in categories:
-            category_instance: MP_Node = Category.add_root(
-                parsed_name=cat["name"], parse_url=cat["href"]
-            )
-
-            for subcat in cat["children"]:
-                subcategory_instance: MP_Node = category_instance.add_child(
-                    parsed_name=subcat["name"], parse_url=subcat["href"]
-                )
-
-                for subsubcat in subcat["children"]:
-                    subcategory_instance.add_child(
-                        parsed_name=subsubcat["name"], parse_url=subsubcat["href"]
-                    )
+    result = sync_category_tree(categories)
+    logger.info(
+        "Категории синхронизированы: создано {}, переименовано {}",
+        result.created_count,
+        result.renamed_count,
+    )
 
     return categories
 
 
-@shared_task(soft_time_limit=600)
-def parse_products_task(categories_ids: list[int]):
-    # categories_id = Category.objects.values_list("id", flat=True)
-    # tasks = [
-    #     parse_category_products_task.s(category_id) for category_id in categories_id
-    # ]
-
-    # task_group = group(tasks)
-    # result = task_group.apply_async()
-    # result.ready()
-    # # дальнейшая логика
-    # if result.successful():
-    #     logger.info("Все задачи выполнены успешно")
-    # else:
-    #     logger.error("Парсинг завершился с ошибкой: {}", result.failed())
-
-    categories_id = [
-        cat.id
-        for cat in Category.objects.filter(
-            Q(id__in=categories_ids)
-            & (
-                Q(is_parsing_successful=False)
-                | Q(last_parsed_at__lt=timezone.now() - timedelta(days=1))
-                | Q(last_parsed_at__isnull=True)
-            )
+@shared_task
+def parse_products_task(categories_ids: list[int] | None = None) -> str | None:
+    """
+    Ставит в очередь "scrape" разбор листовых категорий, которым подошел срок по
+    адаптивному расписанию (services.scheduler). Задачи запускаются со сдвигом
+    PARSER_HOST_INTERVAL друг от друга, одновременные запросы к mc.ru ограничивает
+    семафор в Redis, итоги собирает summarize_parse_results_task. Сама задача
+    ничего не ждет и сразу освобождает воркер
+    """
+    categories_id = list(
+        get_due_categories(categories_ids).values_list("id", flat=True)
+    )
+    if not categories_id:
+        return None
+    mark_categories_queued(categories_id)
+
+    header = [
+        parse_category_products_task.si(category_id).set(
+            countdown=i * settings.PARSER_HOST_INTERVAL
         )
-        if cat.is_leaf()
+        for i, category_id in enumerate(categories_id)
     ]
+    return chord(header)(summarize_parse_results_task.s()).id
 
-    for category_id in categories_id:
-        parse_category_products_task.delay(category_id)
-        time.sleep(15)
+
+@shared_task
+def summarize_parse_results_task(results: list[dict[str, Any]]) -> str:
+    statuses = Counter(result["status"] for result in results)
+    logger.info("Парсинг категорий завершен: {}", dict(statuses))
+    message = (
+        f"Обработано {len(results)} категорий."
+        f" Успешно {statuses[PARSE_SUCCESS]}, с ошибкой {statuses[PARSE_FAILED]}."
+    )
+    if statuses[PARSE_SKIPPED]:
+        message += f" Пропущено {statuses[PARSE_SKIPPED]}: уже разбирались."
+    return message
 
 
 def _is_in_stock(product: Tag) -> bool:
@@ -191,47 +216,14 @@ def _is_in_stock(product: Tag) -> bool:
 
 
 def _get_product_price(product: Tag) -> float:
-    try:
-        price = float(product.find("meta", itemprop="price")["content"].strip())
-    except ValueError:
-        logger.info(
-            "Цена отсутствует: {}",
-        )
-        price = 0.0
-    return price
-
-
-def _get_product_weight(idt: str, idf: str, idb: str) -> str | None:
-    if idt and idf and idb:
-        weight_url = (
-            "https://mc.ru/pages/blocks/add_basket.asp/id/"
-            + f"{idt}/idf/{idf}/idb/{idb}"
-        )
-        logger.debug("weight_url: {}", weight_url)
-
-        try:
-            response = requests.get(weight_url, headers=HEADERS)
-            response.raise_for_status()
-
-        except RequestException as e:
-            logger.error("Error: {}", e)
-
-        soup = BeautifulSoup(response.text, "html.parser")
-        script = soup.find("script", language="Javascript")
-        # Получаем значение переменной
-        k = re.search("var k=(.*?);", script.text)
-        if k is None:
-            logger.error("Не удалось получить значение переменной")
-            return "Regexp failed"
-        found = k.group(1)
-        weight = float(found) * 1000
-        logger.debug("weight: {}", weight)
-
-        return str(weight)
-    return None
+    return parse_price(product.find("meta", itemprop="price")["content"])
 
 
 def get_unique_products(soup: BeautifulSoup) -> dict[str, ParsedProduct]:
+    """
+    Разбор таблицы товаров по готовому DOM. В парсинге используется потоковый
+    services.page_parser.parse_category_page, этот вариант нужен для отладки
+    """
     parsed_products: dict[str, ParsedProduct] = {}
     host = "https://mc.ru"
 
@@ -239,13 +231,11 @@ def get_unique_products(soup: BeautifulSoup) -> dict[str, ParsedProduct]:
     for product in soup.find_all("tr", itemtype="http://schema.org/Product"):
         # определяем, в наличии ли товар (трубка или корзинка)
         in_stock = _is_in_stock(product)
-        name = re.sub(r"\s+", " ", product["data-nm"])
-        name = re.sub(r"(?<=\d)х(?=\d)", "x", name)
+        name = get_product_name(product["data-nm"])
         parse_url = host + product.find("a")["href"]
         size = product.find("td", class_="_razmer").text.strip()
         mark = product.find("td", class_="_mark").text.strip()
         length = product.find("td", class_="_dlina").text.strip()
-        logger.info("Длина товара: {}", length)
 
         # получаем цену товара
         price = _get_product_price(product)
@@ -262,18 +252,8 @@ def get_unique_products(soup: BeautifulSoup) -> dict[str, ParsedProduct]:
             idf=product["idf"],
             idb=product["idb"],
         )
-
-        # existing_product = parsed_products.get(parse_url)
         # оставляем только уникальные названия
-        existing_product = parsed_products.get(name)
-        logger.debug("ex: {}\npars: {}", existing_product, parsed_product)
-        # TODO: проверить не нулевая ли цена
-        if existing_product is None:
-            parsed_products[name] = parsed_product
-        elif parsed_product.price < existing_product.price and parsed_product.in_stock:
-            parsed_products[name] = parsed_product
-        elif not existing_product.in_stock and parsed_product.in_stock:
-            parsed_products[name] = parsed_product
+        add_unique_product(parsed_products, parsed_product, name)
 
     return parsed_products
 
@@ -300,86 +280,269 @@ def get_unique_products(soup: BeautifulSoup) -> dict[str, ParsedProduct]:
 #                 logger.debug("Добавлено значение: {}", value_instance)
 
 
-@shared_task(
-    autoretry_for=(HTTPError,),
-    max_retries=3,
-    # retry_backoff=True,  # экспоненциальная задержка
-    # retry_backoff_max=700,  #  максимальное смещение по времени
-    retry_jitter=True,  # случайное смещение по времени при повторе
-    retry_delay=60 * 5,
-)
-def parse_category_products_task(category_id: int):
+def get_category_page_url(category: Category) -> str:
     # https://mc.ru/metalloprokat/listovoy
     # https://mc.ru/region/nnovgorod/metalloprokat/listovoy/PageAll/1
+    return (
+        category.parse_url.replace("https://mc.ru", "https://mc.ru/region/nnovgorod")
+        + "/PageAll/1"
+    )
 
-    # Достаем все продукты категории и категорию в один запрос
-    category = Category.objects.prefetch_related(
-        Prefetch(
-            "products",
-            queryset=Product.objects.filter(product_categories__is_primary=True),
-            to_attr="category_products",
+
+def _fetch_category_page(category: Category) -> PageFetchResult:
+    url = get_category_page_url(category)
+    # Условный запрос имеет смысл, только если прошлый разбор страницы удался:
+    # на 304 у нас нет тела, чтобы разобрать его заново
+    conditions = {}
+    if category.is_parsing_successful:
+        conditions = {
+            "etag": category.parse_etag,
+            "last_modified": category.parse_last_modified,
+        }
+    # С пулом процессов страница разбирается целиком в другом процессе
+    if settings.PARSER_STREAM_PAGES and not settings.PARSER_PARSE_WORKERS:
+        # Текст целиком нужен только для снимка
+        page = fetch_category_page(
+            url, keep_text=settings.PARSER_SNAPSHOTS_ENABLED, **conditions
         )
-    ).get(id=category_id)
+    else:
+        page = fetch_page(url, **conditions)
+    if page.text:
+        save_snapshot(url, page.text, snapshots.CATEGORY)
+    return page
 
-    category_products: list = category.category_products
 
-    # category = Category.objects.get(id=category_id)
-    # products = category.products.filter(product_categories__is_primary=True)
+def _is_page_unchanged(category: Category, page: PageFetchResult) -> bool:
+    if not category.is_parsing_successful:
+        return False
+    return page.not_modified or page.content_hash == category.parse_content_hash
 
-    url: str = (
-        category.parse_url.replace("https://mc.ru", "https://mc.ru/region/nnovgorod")
-        + "/PageAll/1"
+
+def _remember_page(category: Category, page: PageFetchResult) -> None:
+    category.parse_etag = page.etag
+    category.parse_last_modified = page.last_modified
+    category.parse_content_hash = page.content_hash
+    # Страница сохранена целиком, продолжать нечего
+    category.parse_checkpoint_hash = ""
+    category.parse_checkpoint_index = 0
+
+
+def _get_checkpoint_start(category: Category, page: PageFetchResult) -> int:
+    """
+    С какого продукта продолжить сохранение: прерванное сохранение продолжаем,
+    только если страница не изменилась, иначе порядок продуктов другой
+    """
+    if category.parse_checkpoint_hash != page.content_hash:
+        return 0
+    return category.parse_checkpoint_index
+
+
+def _save_checkpoint(category: Category, page: PageFetchResult, index: int) -> None:
+    category.parse_checkpoint_hash = page.content_hash
+    category.parse_checkpoint_index = index
+    Category.objects.filter(id=category.id).update(
+        parse_checkpoint_hash=page.content_hash, parse_checkpoint_index=index
     )
-    category.last_parsed_at = timezone.now()
 
+
+@shared_task(bind=True, max_retries=None)
+def parse_category_products_task(self, category_id: int, attempt: int = 0):
+    """
+    Загружает и разбирает страницу категории. Если все места семафора хоста
+    заняты, задача откладывается на PARSER_HOST_INTERVAL, если парсинг
+    заблокирован (services.breaker) - до окончания паузы. Такие откладывания не
+    считаются попытками. Ошибка загрузки или блокировка повторяются через
+    5 минут со случайным смещением, не больше CATEGORY_FETCH_RETRIES раз.
+    Сохранение, прерванное мягким лимитом времени, сразу продолжается с
+    контрольной точки (Category.parse_checkpoint_index).
+    Остальные ошибки не роняют задачу: она возвращает статус failed, чтобы
+    chord дождался всех категорий.
+
+    Одну категорию одновременно разбирает один воркер (services.locks): если
+    она уже разбирается, например после ручного запуска, задача пропускается
+    """
+    with get_category_lock(category_id).hold() as acquired:
+        if not acquired:
+            logger.info("Категория {} уже разбирается, пропускаем", category_id)
+            return {
+                "category_id": category_id,
+                "status": PARSE_SKIPPED,
+                "message": "Категория уже разбирается",
+            }
+        try:
+            return _parse_category_products(self, category_id, attempt)
+        except Retry:
+            raise
+        except Exception as e:
+            # Не падаем, чтобы chord дождался остальных категорий и собрал итоги.
+            # Ошибка разбора уже записана в ParseRun
+            logger.exception("Ошибка при разборе категории {}", category_id)
+            return {
+                "category_id": category_id,
+                "status": PARSE_FAILED,
+                "message": repr(e),
+            }
+
+
+def _parse_category_products(task, category_id: int, attempt: int):
+    category = Category.objects.get(id=category_id)
+
+    breaker = get_host_breaker(category.parse_url)
+    with get_host_semaphore(category.parse_url).hold() as acquired:
+        if not acquired:
+            raise task.retry(
+                countdown=settings.PARSER_HOST_INTERVAL * random.uniform(1, 2)
+            )
+        # Предохранитель проверяем под семафором: пробный запрос, пропущенный
+        # после паузы, точно будет сделан, а не отложен из-за занятого семафора
+        if not breaker.allow_request():
+            # Разносим отложенные задачи, чтобы после паузы они не пришли разом
+            raise task.retry(
+                countdown=breaker.get_retry_after()
+                + random.uniform(0, CATEGORY_RETRY_DELAY)
+            )
+
+        category.last_parsed_at = timezone.now()
+        try:
+            page = _fetch_category_page(category)
+        except (requests.exceptions.RequestException, SoftTimeLimitExceeded) as e:
+            logger.error(
+                "Ошибка при отправке запроса на получение категории {}: {}",
+                category.parsed_name,
+                e,
+            )
+            category.is_parsing_successful = False
+            category.save()
+            update_parse_schedule(category, record_failed_fetch(category, e))
+            return _retry_category(task, category, attempt, e)
+
+    checkpoint = (category.parse_checkpoint_hash, category.parse_checkpoint_index)
     try:
-        response = requests.get(url, headers=HEADERS)  # allow_redirects=False
-        # if response.status_code == 302:
-        #     raise Exception("Блок парсинга")
-        response.raise_for_status()
+        message = process_category_page(category, page)
+    except HTTPError as e:
+        breaker.record_block()
+        return _retry_category(task, category, attempt, e)
+    except SoftTimeLimitExceeded as e:
+        # Сохраненные части остались в БД, повтор продолжит с контрольной точки.
+        # Попыткой считаем только запуск, который не сохранил ни одной части
+        if checkpoint != (
+            category.parse_checkpoint_hash,
+            category.parse_checkpoint_index,
+        ):
+            logger.warning(
+                "Сохранение категории {} прервано по времени, продолжим с {}",
+                category.parsed_name,
+                category.parse_checkpoint_index,
+            )
+            raise task.retry(countdown=settings.PARSER_HOST_INTERVAL) from e
+        return _retry_category(task, category, attempt, e)
 
-    except requests.exceptions.RequestException as e:
-        logger.error(
-            "Ошибка при отправке запроса на получение категории {}: {}",
-            category.parsed_name,
-            e,
+    breaker.record_success()
+    return {"category_id": category.id, "status": PARSE_SUCCESS, "message": message}
+
+
+def _retry_category(task, category: Category, attempt: int, error: Exception):
+    if attempt < CATEGORY_FETCH_RETRIES:
+        raise task.retry(
+            kwargs={"attempt": attempt + 1},
+            countdown=CATEGORY_RETRY_DELAY + random.uniform(0, CATEGORY_RETRY_DELAY),
         )
-        category.is_parsing_successful = False
-        category.save()
-        current_task().raise_exception(e)
+    # Не падаем, чтобы chord дождался остальных категорий и собрал итоги
+    return {"category_id": category.id, "status": PARSE_FAILED, "message": str(error)}
 
-    soup = BeautifulSoup(response.text, "html.parser")
 
-    # Проверяем, не выкинули нам капчу
-    is_check_human = soup.find("form", action="/check-human")
-    if is_check_human:
-        category.is_parsing_successful = False
+def process_category_page(
+    category: Category,
+    page: PageFetchResult,
+    force: bool = False,
+    offline: bool = False,
+) -> str:
+    """
+    Разбирает загруженную страницу категории и сохраняет ее товары. Если страница
+    не изменилась с прошлого успешного разбора, товары не трогаем (кроме `force`).
+    Метрики разбора записываются в ParseRun.
+
+    `offline` - разбор сохраненной страницы (manage.py reparse): без загрузки
+    веса новых продуктов и без изменения состояния парсинга категории (хэш и
+    заголовки страницы, прогресс сохранения, расписание), чтобы следующий
+    обычный парсинг не счел страницу mc.ru неизменной. ParseRun при этом не
+    сохраняется: повторный разбор не тратит бюджет запросов и не искажает
+    статистику парсинга
+    """
+    recorder = ParseRunRecorder(category, page)
+
+    def finish(status: str | None = None, error: str = "") -> None:
+        if not offline:
+            update_parse_schedule(category, recorder.finish(status, error))
+
+    try:
+        with recorder.count_queries():
+            result = _process_category_page(category, page, recorder, force, offline)
+    except HTTPError as e:
+        finish(ParseRun.Status.BLOCKED, str(e))
+        raise
+    except Exception as e:
+        finish(ParseRun.Status.FAILED, repr(e))
+        raise
+    finish()
+    return result
+
+
+def _process_category_page(
+    category: Category,
+    page: PageFetchResult,
+    recorder: ParseRunRecorder,
+    force: bool,
+    offline: bool = False,
+) -> str:
+    run = recorder.run
+    if not force and category.is_parsing_successful and page.not_modified:
         category.save()
-        raise HTTPError("Блокировка парсинга", response=response)
+        run.status = ParseRun.Status.UNCHANGED
+        return f"Страница категории {category.parsed_name} не изменилась"
 
-    category_is_empty = soup.find("div", class_="catalogItems _empty")
-    if category_is_empty:
-        category.is_parsing_successful = True
+    if page.parsed is None:
+        with recorder.stage("parse"):
+            page.parsed = parse_page_text(page.text)
+    parsed = page.parsed
+    page.content_hash = parsed.content_hash
+
+    if not force and _is_page_unchanged(category, page):
         category.save()
+        run.status = ParseRun.Status.UNCHANGED
+        return f"Страница категории {category.parsed_name} не изменилась"
+
+    # Проверяем, не выкинули нам капчу
+    if parsed.is_blocked:
+        if not offline:
+            category.is_parsing_successful = False
+            category.save()
+        raise HTTPError("Блокировка парсинга")
+
+    if parsed.is_empty:
+        if not offline:
+            category.is_parsing_successful = True
+            _remember_page(category, page)
+            category.save()
+        run.status = ParseRun.Status.EMPTY
         return f"Категория {category.parsed_name} пуста"
 
     category_title = re.sub(
         r"\s+",
         " ",
-        soup.find("title").text.strip().replace("МЕТАЛЛСЕРВИС", "СПЕЦОПТТОРГ"),
+        parsed.title.strip().replace("МЕТАЛЛСЕРВИС", "СПЕЦОПТТОРГ"),
     )[:350]
     category_description = re.sub(
         r"\s+",
         " ",
-        soup.find("meta", attrs={"name": "description"})["content"]
-        .strip()
+        parsed.description.strip()
         .replace("МЕТАЛЛСЕРВИС", "СПЕЦОПТТОРГ")
         .replace("стране", "городе"),
     )[:500]
     category_h1 = re.sub(
         r"\s+",
         " ",
-        soup.find("h1").text.strip().replace("МЕТАЛЛСЕРВИС", ""),
+        parsed.h1.strip().replace("МЕТАЛЛСЕРВИС", ""),
     )[:250]
 
     if not category.seo_title:
@@ -393,201 +556,46 @@ def parse_category_products_task(category_id: int):
 
     # Если категория не лист дерева категорий, то выход
     if not category.is_leaf():
-        return
+        return f"Категория {category.parsed_name} не лист, продукты не разбираются"
 
-    parsed_products = get_unique_products(soup)
+    parsed_products = parsed.products
     logger.debug("Получено {} продуктов", len(parsed_products))
 
     # Логика обновления продкутов в БД
-    instances_update_count = 0
-    instances_create_count = 0
-    exist_in_parsed_products = []
-    for name, product in parsed_products.items():
-        # product_instance = get_object_or_None(Product, parse_url=parse_url)
-        try:
-            product_instance = next(
-                p for p in category_products if p.parse_url == product.parse_url
-            )
-        except StopIteration:
-            # продукт с таким именем не найден
-            product_instance = None
-
-        # продукт существует в БД - обновляем
-        if product_instance:
-            product_instance.in_stock = product.in_stock
-            product_instance.ton_price = product.price
-            exist_in_parsed_products.append(product_instance.id)
-            # счетчик обновлений
-            instances_update_count += 1
-        else:
-            product_instance = Product(
-                name=product.name,
-                parse_url=product.parse_url,
-                ton_price=product.price,
-                in_stock=product.in_stock,
-                is_published=True,  # if product.in_stock else False,
-            )
-            # счетчик созданий
-            instances_create_count += 1
-            # Тут можно парсить вес и картинку с детальной страницы
-            # weight = _get_product_weight(product.idt, product.idf, product.idb)
-            # ProductPropertyValue.objects.get_or_create(
-            #     product=product_instance,
-            #     property=ProductProperty.objects.get(code="ves-metra"),
-            #     value=weight,
-            # )
-
-        product_instance.save()
-        product_instance.categories.add(
-            category,
-            through_defaults={"is_display": True, "is_primary": True},
+    start = 0 if offline else _get_checkpoint_start(category, page)
+    if start:
+        logger.info(
+            "Продолжаем сохранение категории {} с продукта {}",
+            category.parsed_name,
+            start,
         )
-
-        # size, mark, length
-        size_is_h = [
-            "Балки (Двутавр)",
-            "Балки (Двутавр) низколегированные",
-            "Швеллер",
-            "Швеллер гнутый",
-            "Швеллер низколегированный",
-            "Уголок неравнополочный",
-            "Уголок нержавеющий никельсодержащий",
-            "Уголок равнополочный",
-            "Уголок равнополочный низколегированный",
-            "Уголок равнополочный судостроительный",
-            "Лист г/к",
-            "Лист г/к конструкционный",
-            "Лист г/к мостостроительный",
-            "Лист г/к низколегированный",
-            "Лист г/к Ст3",
-            "Лист г/к судостроительный",
-            "Лист нержавеющий без никеля",
-            "Лист нержавеющий никельсодержащий",
-            "Лист нержавеющий ПВЛ",
-            "Лист оцинкованный",
-            "Лист рифленый",
-            "Лист холоднокатанный х/к",
-            "Лист холоднокатанный х/к Ст",
-            "Лист просечно-вытяжной (ПВЛ)",
-        ]
-        size_is_b = [
-            "Полоса оцинкованная",
-            "Квадрат  горячекатаный",
-            "Полоса г/к",
-            "Полоса г/к оцинкованная",
-            "Полоса нержавеющая никельсодержащая",
-        ]
-        length_is_poverkhnost = [
-            "Лист г/к",
-            "Лист г/к конструкционный",
-            "Лист г/к мостостроительный",
-            "Лист г/к низколегированный",
-            "Лист г/к Ст3",
-            "Лист г/к судостроительный",
-            "Лист нержавеющий без никеля",
-            "Лист нержавеющий никельсодержащий",
-            "Лист нержавеющий ПВЛ",
-            "Лист оцинкованный",
-            "Лист рифленый",
-            "Лист холоднокатанный х/к",
-            "Лист холоднокатанный х/к Ст",
-            "Лист просечно-вытяжной (ПВЛ)",
-        ]
-        mark_is_dlina = [
-            "Лист рифленый",
-        ]
-        mark_is_shirina = [
-            "Рулоны г/к",
-            "Рулоны нержавеющие",
-            "Рулоны оцинкованные",
-            "Рулоны оцинкованные с полимерным покрытием",
-            "Рулоны х/к",
-        ]
-        mark_is_stenka = [
-            "Трубы стальные горячедеформированные",
-            "Трубы стальные холоднодеформированные",
-        ]
-        mark_is_none = [
-            "Трубы оцинкованные квадратные",
-            "Трубы оцинкованные круглые",
-            "Трубы оцинкованные прямоугольные",
-            "Доборные элементы",
-            "Саморезы кровельные",
-        ]
-        mark_is_profil = [
-            "Профнастил Н114",
-            "Профнастил Н57",
-            "Профнастил Н60",
-            "Профнастил Н75",
-            "Профнастил НС35",
-            "Профнастил НС44",
-            "Профнастил окрашенный",
-            "Профнастил оцинкованный",
-            "Профнастил С10",
-            "Профнастил С20",
-            "Профнастил С21",
-            "Профнастил С44",
-            "Профнастил С8",
-        ]
-
-        if category.parsed_name in size_is_h:
-            size_code = "vysota-h"
-        elif category.parsed_name in size_is_b:
-            size_code = "shirina-b"
-        else:
-            size_code = "diametr"
-
-        if category.parsed_name in mark_is_dlina:
-            mark_code = "dlina"
-        if category.parsed_name in mark_is_shirina:
-            mark_code = "shirina-b"
-        if category.parsed_name in mark_is_stenka:
-            mark_code = "stenka"
-        if category.parsed_name in mark_is_profil:
-            mark_code = "profil"
-        if category.parsed_name in mark_is_none:
-            mark_code = ""
-        else:
-            mark_code = "marka-stali"
-
-        if category.parsed_name in length_is_poverkhnost:
-            length_code = "poverkhnost"
-        else:
-            length_code = "dlina"
-
-        ProductPropertyValue.objects.update_or_create(
-            product=product_instance,
-            property=ProductProperty.objects.get(code=length_code),
-            defaults={"value": product.length},
+    with recorder.stage("persist"):
+        save_result = save_category_products(
+            category,
+            parsed_products.values(),
+            start=start,
+            checkpoint=None if offline else partial(_save_checkpoint, category, page),
         )
-        if mark_code:
-            ProductPropertyValue.objects.update_or_create(
-                product=product_instance,
-                property=ProductProperty.objects.get(code=mark_code),
-                defaults={"value": product.mark},
-            )
-        ProductPropertyValue.objects.update_or_create(
-            product=product_instance,
-            property=ProductProperty.objects.get(code=size_code),
-            defaults={"value": product.size},
+    run.products_count = len(parsed_products)
+    run.created_count = save_result.created_count
+    run.updated_count = save_result.updated_count
+    if save_result.created_ids and not offline:
+        # Вес метра новых продуктов качаем в фоне, чтобы не тормозить парсинг
+        transaction.on_commit(
+            partial(enrich_products_weights_task.delay, save_result.created_ids)
         )
 
-    # Убираем отметку "В наличии" у продуктов, которые отсутствовали в
-    # результатах парсинга
-    Product.objects.filter(id__in=[prod.id for prod in category_products]).exclude(
-        id__in=exist_in_parsed_products
-    ).update(in_stock=False)
-    # category_products.exclude(id__in=exist_in_parsed_products).update(in_stock=False)
-
     # парсим фильтры
     # parse_category_properties(soup)
-    if len(parsed_products) > 0:
+    if len(parsed_products) > 0 and not offline:
         category.is_parsing_successful = True
+        _remember_page(category, page)
         category.save()
 
     result = f"Спаршено {len(parsed_products)} продуктов."
-    result += f" Обновлено {instances_update_count} продуктов."
-    result += f" Добавлено в БД {instances_create_count} продуктов."
+    result += f" Обновлено {save_result.updated_count} продуктов."
+    result += f" Добавлено в БД {save_result.created_count} продуктов."
+    result += f" Без изменений {save_result.unchanged_count} продуктов."
     return result
 
 
@@ -598,30 +606,39 @@ def parse_weight(product_id: int):
     if not product:
         return
 
-    url = (
-        "https://mc.ru/pages/blocks/add_basket.asp/id/"
-        + f"{product.idt}/idf/{product.idf}/idb/{product.idb}"
-    )
-
     try:
-        response = requests.get(url, headers=HEADERS)
-        response.raise_for_status()
-
+        return fetch_weight(get_weight_url(product.idt, product.idf, product.idb))
     except requests.exceptions.RequestException as e:
         logger.error("Error: {}", e)
-        # return categories
-
-    # lxml фэйлился на этой разметке...
-    soup = BeautifulSoup(response.text, "lxml")
-    script = soup.find("script", language="Javascript")
-    # script = soup.find('script', text=re.compile('var k'))
-    logger.debug("script: {}", script.text)
-    # Получаем значение переменной
-    k = re.search("var k=(.*?);", script.text)
-    if k is None:
-        logger.error("Не удалось Получить значение переменной")
-        return "Regexp failed"
-    found = k.group(1)
-    weight = float(found) * 1000
-
-    return weight
+
+
+@shared_task(soft_time_limit=60 * 60, time_limit=65 * 60)
+def enrich_products_weights_task(product_ids: list[int] | None = None) -> str:
+    """
+    Фоновое заполнение веса метра (и цен метра и штуки) для продуктов без веса.
+    Без аргументов обходит весь каталог
+    """
+    updated_count = enrich_products_weights(product_ids)
+    return f"Заполнен вес метра у {updated_count} продуктов."
+
+
+@shared_task
+def prune_parse_runs_task() -> str:
+    """
+    Удаление запусков парсинга старше PARSER_RUNS_RETENTION_DAYS дней,
+    запускается периодически из django-celery-beat
+    """
+    deleted_count = delete_old_parse_runs(settings.PARSER_RUNS_RETENTION_DAYS)
+    return f"Удалено {deleted_count} запусков парсинга."
+
+
+@shared_task(soft_time_limit=60 * 60, time_limit=65 * 60)
+def recalculate_prices_task() -> str:
+    """
+    Пересчет цен метра и штуки всего каталога, например после смены поставщика
+    """
+    result = recalculate_all_prices()
+    return (
+        f"Пересчитаны цены {result.updated_count} продуктов"
+        f" за {result.seconds:.1f} сек ({result.chunks_count} частей)."
+    )
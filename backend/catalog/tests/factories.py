@@ -0,0 +1,37 @@
+from factory import Faker, Sequence
+from factory.django import DjangoModelFactory
+
+from backend.catalog.models import Category, Product, ProductProperty
+
+
+class CategoryFactory(DjangoModelFactory):
+    name = Faker("word")
+    parsed_name = Faker("word")
+    parse_url = Sequence(lambda n: f"https://mc.ru/metalloprokat/category_{n}")
+
+    class Meta:
+        model = Category
+
+    @classmethod
+    def _create(cls, model_class, *args, **kwargs):
+        parent = kwargs.pop("parent", None)
+        if parent is None:
+            return model_class.add_root(**kwargs)
+        return parent.add_child(**kwargs)
+
+
+class ProductPropertyFactory(DjangoModelFactory):
+    name = Faker("word")
+
+    class Meta:
+        model = ProductProperty
+        django_get_or_create = ["code"]
+
+
+class ProductFactory(DjangoModelFactory):
+    name = Faker("word")
+    parse_url = Sequence(lambda n: f"https://mc.ru/metalloprokat/product_{n}")
+    is_published = True
+
+    class Meta:
+        model = Product
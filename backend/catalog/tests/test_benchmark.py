@@ -0,0 +1,29 @@
+import json
+
+import pytest
+from django.core.management import call_command
+
+from backend.catalog.models import Category, Product
+
+pytestmark = pytest.mark.django_db
+
+
+def test_benchmark_parser_writes_json_and_rolls_back(tmp_path):
+    output = tmp_path / "benchmark.json"
+
+    call_command(
+        "benchmark_parser", "--sizes", "small", "--repeat", "1", "--output", output
+    )
+
+    report = json.loads(output.read_text())
+    [result] = report["results"]
+    assert result["products"] == 20
+    assert set(result["stages"]) == {
+        "dom_parse",
+        "stream_parse",
+        "persist_create",
+        "persist_update",
+    }
+    assert result["stages"]["persist_create"]["queries"] > 0
+    assert not Category.objects.exists()
+    assert not Product.objects.exists()
@@ -0,0 +1,145 @@
+import pytest
+
+from backend.catalog import signals
+from backend.catalog.models import Category
+from backend.catalog.services.categories import (
+    propagate_category_properties,
+    sync_category_tree,
+)
+from backend.catalog.tests.factories import CategoryFactory, ProductPropertyFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def make_tree(pipes_name: str = "Трубы") -> list[dict]:
+    return [
+        {
+            "name": pipes_name,
+            "href": "https://mc.ru/metalloprokat/truby",
+            "children": [
+                {
+                    "name": "Трубы стальные",
+                    "href": "https://mc.ru/metalloprokat/truby_stalnye",
+                    "children": [
+                        {
+                            "name": "Труба ВГП",
+                            "href": "https://mc.ru/metalloprokat/vgp",
+                        },
+                        {
+                            "name": "Труба б/ш",
+                            "href": "https://mc.ru/metalloprokat/bsh",
+                        },
+                    ],
+                },
+            ],
+        },
+        {
+            "name": "Листовой прокат",
+            "href": "https://mc.ru/metalloprokat/list",
+            "children": [],
+        },
+    ]
+
+
+def test_sync_category_tree_creates_valid_tree():
+    CategoryFactory(name="Акции", parse_url="")
+
+    result = sync_category_tree(make_tree())
+
+    assert result.created_count == 5
+    assert Category.find_problems() == ([], [], [], [], [])
+    pipes = Category.objects.get(parse_url="https://mc.ru/metalloprokat/truby")
+    assert pipes.name == "Трубы"
+    assert [category.name for category in Category.get_root_nodes()] == [
+        "Акции",
+        "Листовой прокат",
+        "Трубы",
+    ]
+    assert [child.name for child in pipes.get_children()[0].get_children()] == [
+        "Труба ВГП",
+        "Труба б/ш",
+    ]
+
+
+def test_sync_category_tree_is_idempotent(django_assert_num_queries):
+    sync_category_tree(make_tree())
+
+    with django_assert_num_queries(1):
+        result = sync_category_tree(make_tree())
+
+    assert (result.created_count, result.renamed_count) == (0, 0)
+    assert Category.objects.count() == 5
+
+
+def test_sync_category_tree_adds_missing_and_renames():
+    tree = make_tree()
+    leaf = tree[0]["children"][0]["children"].pop()
+    sync_category_tree(tree)
+    Category.objects.filter(parse_url="https://mc.ru/metalloprokat/list").update(
+        name="Листы"
+    )
+
+    tree = make_tree(pipes_name="Трубы и профили")
+    tree[1]["name"] = "Лист"
+    result = sync_category_tree(tree)
+
+    assert (result.created_count, result.renamed_count) == (1, 2)
+    assert Category.find_problems() == ([], [], [], [], [])
+    assert Category.objects.get(parse_url=leaf["href"]).depth == 3
+    pipes = Category.objects.get(parse_url="https://mc.ru/metalloprokat/truby")
+    assert (pipes.name, pipes.parsed_name) == ("Трубы и профили", "Трубы и профили")
+    sheets = Category.objects.get(parse_url="https://mc.ru/metalloprokat/list")
+    assert (sheets.name, sheets.parsed_name) == ("Листы", "Лист")
+
+
+def test_propagate_category_properties_to_subtree(django_assert_num_queries):
+    root = CategoryFactory(name="Трубы")
+    child = CategoryFactory(parent=root, name="Трубы стальные")
+    grandchild = CategoryFactory(parent=child, name="Труба ВГП")
+    diameter, length, mark = (
+        ProductPropertyFactory(name=code, code=code)
+        for code in ["diametr", "dlina", "marka"]
+    )
+    root.refresh_from_db()
+    grandchild.product_properties.add(mark)
+
+    # Сигнал m2m_changed передает набор всему поддереву, а не только детям
+    root.product_properties.add(diameter, length)
+    assert set(child.product_properties.all()) == {diameter, length}
+    assert set(grandchild.product_properties.all()) == {diameter, length}
+
+    # Набор не изменился: только чтение, без записи
+    with django_assert_num_queries(2):
+        assert propagate_category_properties(root) == (0, 0)
+
+    root.product_properties.remove(length)
+    assert list(grandchild.product_properties.all()) == [diameter]
+
+
+def test_sync_category_tree_new_categories_inherit_properties():
+    tree = make_tree()
+    leaf = tree[0]["children"][0]["children"].pop()
+    sync_category_tree(tree)
+    diameter = ProductPropertyFactory(name="diametr", code="diametr")
+    Category.objects.get(
+        parse_url="https://mc.ru/metalloprokat/truby"
+    ).product_properties.add(diameter)
+
+    sync_category_tree(make_tree())
+
+    new_leaf = Category.objects.get(parse_url=leaf["href"])
+    assert list(new_leaf.product_properties.all()) == [diameter]
+    sheets = Category.objects.get(parse_url="https://mc.ru/metalloprokat/list")
+    assert not sheets.product_properties.exists()
+
+
+def test_clear_property_categories_propagates(monkeypatch):
+    root = CategoryFactory(name="Трубы")
+    diameter = ProductPropertyFactory(name="diametr", code="diametr")
+    root.product_properties.add(diameter)
+    propagated: list[Category] = []
+    monkeypatch.setattr(signals, "propagate_category_properties", propagated.append)
+
+    diameter.categories.clear()
+
+    assert propagated == [root]
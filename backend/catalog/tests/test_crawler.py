@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import time
+
+from backend.catalog.services.crawler import HostRateLimiter, crawl
+
+
+class StubTransport:
+    """
+    Загрузка страниц без сети: запоминает запросы и одновременность
+    """
+
+    def __init__(self, delay: float = 0.0, fail: set[str] | None = None) -> None:
+        self.delay = delay
+        self.fail = fail or set()
+        self.fetched: list[str] = []
+        self.active = self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, url: str) -> str:
+        with self._lock:
+            self.fetched.append(url)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if url in self.fail:
+                raise ValueError(url)
+            return f"page {url}"
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def make_urls(count: int, host: str = "mc.ru") -> list[str]:
+    return [f"https://{host}/page/{n}" for n in range(count)]
+
+
+def test_crawl_returns_pages_and_errors():
+    urls = make_urls(5)
+    transport = StubTransport(fail={urls[2]})
+
+    results = {page.url: page for page in crawl(urls, transport, interval=0)}
+
+    assert set(results) == set(urls)
+    assert results[urls[0]].page == f"page {urls[0]}"
+    assert isinstance(results[urls[2]].error, ValueError)
+    assert results[urls[2]].page is None
+
+
+def test_crawl_limits_concurrency():
+    urls = make_urls(4, "a.ru") + make_urls(4, "b.ru")
+    transport = StubTransport(delay=0.02)
+
+    list(crawl(urls, transport, concurrency=2, interval=0))
+
+    assert transport.max_active == 2
+
+
+def test_crawl_does_not_run_ahead_of_slow_consumer():
+    transport = StubTransport()
+    pages = crawl(make_urls(10), transport, concurrency=1, interval=0)
+
+    next(pages)
+    time.sleep(0.2)
+
+    # Одна страница в очереди и одна ждет места в ней
+    assert len(transport.fetched) <= 3
+    assert len(list(pages)) == 9
+
+
+def test_crawl_stops_when_consumer_stops():
+    transport = StubTransport(delay=0.01)
+
+    for _ in crawl(make_urls(20), transport, concurrency=1, interval=0):
+        break
+
+    assert len(transport.fetched) <= 3
+
+
+def test_host_rate_limiter_paces_each_host():
+    calls: list[tuple[str, float]] = []
+
+    async def run() -> None:
+        limiter = HostRateLimiter(0.05)
+        loop = asyncio.get_running_loop()
+
+        async def request(url: str) -> None:
+            await limiter.wait(url)
+            calls.append((url, loop.time()))
+
+        await asyncio.gather(
+            *(request(url) for url in make_urls(3, "a.ru") + make_urls(1, "b.ru"))
+        )
+
+    asyncio.run(run())
+
+    a_times = [at for url, at in calls if "a.ru" in url]
+    b_time = next(at for url, at in calls if "b.ru" in url)
+    assert all(later - earlier >= 0.045 for earlier, later in zip(a_times, a_times[1:]))
+    # Другой хост не ждет очереди первого
+    assert b_time - a_times[0] < 0.04
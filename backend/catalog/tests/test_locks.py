@@ -0,0 +1,143 @@
+import threading
+import time
+
+import fakeredis
+import pytest
+from celery.exceptions import Retry
+
+from backend.catalog.services import locks
+from backend.catalog.services.breaker import get_host_breaker
+from backend.catalog.services.locks import get_category_lock, get_host_semaphore
+from backend.catalog.tasks import (
+    PARSE_SKIPPED,
+    _parse_category_products,
+    parse_category_products_task,
+)
+from backend.catalog.tests.factories import CategoryFactory
+
+
+@pytest.fixture(autouse=True)
+def redis_client(settings, monkeypatch):
+    settings.PARSER_REDIS_URL = "redis://localhost:6379/0"
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(locks, "_client", client)
+    return client
+
+
+def test_host_semaphore_limits_holders(settings):
+    settings.PARSER_HOST_CONCURRENCY = 2
+    semaphore = get_host_semaphore("https://mc.ru/metalloprokat/truby")
+
+    first, second = semaphore.acquire(), semaphore.acquire()
+    assert first and second
+    assert semaphore.acquire() is None
+
+    semaphore.release(first)
+    with semaphore.hold() as acquired:
+        assert acquired
+        assert semaphore.acquire() is None
+
+
+def test_host_semaphore_waits_for_free_place(settings):
+    settings.PARSER_HOST_CONCURRENCY = 1
+    semaphore = get_host_semaphore("https://mc.ru")
+    token = semaphore.acquire()
+    assert token
+
+    with semaphore.hold() as acquired:
+        assert not acquired
+    threading.Timer(0.2, semaphore.release, args=[token]).start()
+    with semaphore.hold(wait=5) as acquired:
+        assert acquired
+
+
+def test_host_semaphore_drops_abandoned_holders(settings):
+    settings.PARSER_HOST_CONCURRENCY = 1
+    settings.PARSER_SEMAPHORE_TIMEOUT = 0
+    semaphore = get_host_semaphore("https://mc.ru")
+
+    assert semaphore.acquire()
+    assert semaphore.acquire()
+
+
+def test_category_lock_is_released_only_by_owner(redis_client):
+    lock = get_category_lock(1)
+
+    token = lock.acquire()
+    assert token
+    assert lock.acquire() is None
+    assert get_category_lock(2).acquire()
+
+    # Блокировка истекла и досталась другому воркеру
+    redis_client.delete(lock.name)
+    other = lock.acquire()
+    assert other
+    lock.release(token)
+    assert lock.acquire() is None
+
+    lock.release(other)
+    with lock.hold() as acquired:
+        assert acquired
+
+
+def test_parse_category_task_skips_locked_category():
+    with get_category_lock(42).hold():
+        result = parse_category_products_task.apply(args=[42]).get()
+
+    assert result["status"] == PARSE_SKIPPED
+
+
+def test_breaker_opens_on_block_and_lets_one_probe(settings, monkeypatch):
+    settings.PARSER_BREAKER_COOLDOWN = 600
+    breaker = get_host_breaker("https://mc.ru/metalloprokat/truby")
+    assert breaker.allow_request()
+
+    breaker.record_block()
+    assert not breaker.allow_request()
+    assert breaker.get_retry_after() > 590
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 601)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    # Пробный запрос снова заблокирован - пауза удваивается
+    breaker.record_block()
+    assert breaker.get_retry_after() > 1190
+
+    breaker.record_success()
+    assert breaker.allow_request()
+    assert breaker.allow_request()
+
+
+def test_breaker_escalates_once_per_opening(settings):
+    settings.PARSER_BREAKER_COOLDOWN = 600
+    breaker = get_host_breaker("https://mc.ru/metalloprokat/truby")
+
+    # Блокировки запросов, начатых до размыкания, паузу не удваивают
+    for _ in range(3):
+        breaker.record_block()
+    assert 590 < breaker.get_retry_after() <= 600
+
+
+class RetryTask:
+    def retry(self, **kwargs):
+        return Retry()
+
+
+@pytest.mark.django_db
+def test_semaphore_back_off_keeps_breaker_probe(settings, monkeypatch):
+    settings.PARSER_BREAKER_COOLDOWN = 600
+    settings.PARSER_HOST_CONCURRENCY = 1
+    settings.PARSER_SEMAPHORE_TIMEOUT = 60 * 60
+    category = CategoryFactory(parse_url="https://mc.ru/metalloprokat/truby")
+    breaker = get_host_breaker(category.parse_url)
+    breaker.record_block()
+    assert get_host_semaphore(category.parse_url).acquire()
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 601)
+
+    # Семафор занят: задача откладывается, не заняв место пробного запроса
+    with pytest.raises(Retry):
+        _parse_category_products(RetryTask(), category.id, 0)
+    assert breaker.allow_request()
@@ -0,0 +1,98 @@
+import pytest
+from bs4 import BeautifulSoup
+from django.core.exceptions import ImproperlyConfigured
+
+from backend.catalog.services import parse_pool
+from backend.catalog.services.benchmark_pages import make_category_page
+from backend.catalog.services.page_parser import get_content_hash, parse_category_page
+from backend.catalog.services.parse_pool import (
+    check_worker_pool,
+    parse_page_text,
+    shutdown_parse_executor,
+)
+from backend.catalog.tasks import get_unique_products
+
+
+@pytest.mark.parametrize("backend", ["html.parser", "lxml"])
+def test_parse_category_page_matches_dom_parser(backend):
+    text = make_category_page(5)
+
+    page = parse_category_page([text], backend)
+
+    assert page.title == "Трубы купить в МЕТАЛЛСЕРВИС"
+    assert page.description == "Трубы по всей стране от МЕТАЛЛСЕРВИС"
+    assert page.h1 == "Трубы МЕТАЛЛСЕРВИС"
+    assert not page.is_blocked and not page.is_empty
+    assert page.products == get_unique_products(BeautifulSoup(text, "html.parser"))
+
+
+@pytest.mark.parametrize("backend", ["html.parser", "lxml"])
+def test_parse_category_page_does_not_depend_on_chunks(backend):
+    text = make_category_page(5)
+
+    page = parse_category_page([text], backend)
+    # Куски режут теги и атрибуты посередине
+    chunked = parse_category_page(
+        (text[i : i + 7] for i in range(0, len(text), 7)), backend
+    )
+
+    assert chunked.products == page.products
+    assert chunked.content_hash == page.content_hash
+    assert page.content_hash == get_content_hash(text, backend)
+
+
+@pytest.mark.parametrize("backend", ["html.parser", "lxml"])
+def test_parse_category_page_row_with_nested_table(backend):
+    # Вложенная таблица в ячейке не должна закрывать строку товара раньше времени
+    nested = '<table><tr><td>Упаковка</td></tr></table></td>\n  <td class="_razmer">'
+    text = make_category_page(2).replace('</td>\n  <td class="_razmer">', nested)
+
+    assert text.count("Упаковка") == 2
+
+    page = parse_category_page([text], backend)
+
+    assert page.products == parse_category_page([make_category_page(2)]).products
+    assert all(product.price and product.in_stock for product in page.products.values())
+
+
+def test_content_hash_ignores_scripts():
+    page = make_category_page(3)
+
+    assert get_content_hash(page) == get_content_hash(make_category_page(3, ts="1"))
+    assert get_content_hash(page) != get_content_hash(make_category_page(3, price=1))
+
+
+def test_parse_category_page_flags():
+    blocked = parse_category_page(['<form action="/check-human"></form>'])
+    empty = parse_category_page(['<div class="catalogItems _empty"></div>'])
+
+    assert blocked.is_blocked and not blocked.products
+    assert empty.is_empty and not empty.is_blocked
+
+
+def test_parse_page_text_in_process_pool(settings):
+    settings.PARSER_PARSE_WORKERS = 1
+    text = make_category_page(3)
+
+    try:
+        page = parse_page_text(text)
+    finally:
+        shutdown_parse_executor()
+
+    expected = parse_category_page([text])
+    assert page.products == expected.products
+    assert page.content_hash == expected.content_hash
+    assert (page.title, page.h1) == (expected.title, expected.h1)
+
+
+def test_parse_workers_refuse_prefork_pool(settings, monkeypatch):
+    check_worker_pool("prefork")
+    settings.PARSER_PARSE_WORKERS = 1
+    check_worker_pool("threads")
+    with pytest.raises(ImproperlyConfigured):
+        check_worker_pool("prefork")
+
+    # Дочерний процесс prefork демонический
+    monkeypatch.setattr(parse_pool.multiprocessing.current_process(), "daemon", True)
+    with pytest.raises(ImproperlyConfigured):
+        parse_page_text(make_category_page(1))
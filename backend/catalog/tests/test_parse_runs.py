@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from backend.catalog.models import ParseRun
+from backend.catalog.services.benchmark_pages import make_category_page
+from backend.catalog.services.fetch import PageFetchResult
+from backend.catalog.services.page_parser import get_content_hash
+from backend.catalog.tasks import process_category_page, prune_parse_runs_task
+from backend.catalog.tests.factories import CategoryFactory
+from backend.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def make_page(text: str) -> PageFetchResult:
+    return PageFetchResult(
+        text=text,
+        content_hash=get_content_hash(text),
+        fetch_time=0.5,
+        page_bytes=len(text.encode()),
+    )
+
+
+@pytest.fixture
+def api_client():
+    client = APIClient()
+    client.force_authenticate(UserFactory(is_staff=True))
+    return client
+
+
+def test_process_category_page_records_parse_run():
+    category = CategoryFactory()
+    page = make_page(make_category_page(3))
+
+    process_category_page(category, page)
+    process_category_page(category, page)
+
+    unchanged, run = category.parse_runs.all()
+    assert run.status == ParseRun.Status.SUCCESS
+    assert (run.products_count, run.created_count) == (3, 3)
+    assert run.page_bytes == page.page_bytes
+    assert run.queries_count > 0
+    assert run.total_time >= run.fetch_time + run.parse_time + run.persist_time
+    assert unchanged.status == ParseRun.Status.UNCHANGED
+
+
+def test_parse_run_stats_and_metrics(api_client):
+    category = CategoryFactory()
+    process_category_page(category, make_page(make_category_page(3)))
+
+    assert APIClient().get("/api/parse-runs/stats/").status_code == 401
+    response = api_client.get("/api/parse-runs/stats/?days=1")
+    assert response.status_code == 200
+    [stats] = response.json()
+    assert stats["category_id"] == category.id
+    assert stats["runs_count"] == 1
+    assert stats["avg_fetch_time"] == 0.5
+
+    response = api_client.get("/api/parse-runs/metrics/")
+    assert response.status_code == 200
+    assert (
+        f'catalog_parse_stage_seconds{{category="{category.id}",stage="fetch"}} 0.5'
+        in response.content.decode()
+    )
+
+
+def test_parse_run_metrics_token(settings):
+    client = APIClient()
+    assert client.get("/api/parse-runs/metrics/").status_code == 401
+    # Без токена в настройках доступ только у администраторов
+    client.credentials(HTTP_AUTHORIZATION="Bearer ")
+    assert client.get("/api/parse-runs/metrics/").status_code == 401
+
+    settings.PARSER_METRICS_TOKEN = "secret"
+    client.credentials(HTTP_AUTHORIZATION="Bearer wrong")
+    assert client.get("/api/parse-runs/metrics/").status_code == 401
+    client.credentials(HTTP_AUTHORIZATION="Bearer secret")
+    assert client.get("/api/parse-runs/metrics/").status_code == 200
+    # Токен метрик не открывает остальные методы
+    assert client.get("/api/parse-runs/stats/").status_code == 401
+
+
+def test_prune_parse_runs_task(settings):
+    settings.PARSER_RUNS_RETENTION_DAYS = 30
+    category = CategoryFactory()
+    now = timezone.now()
+    for days in (1, 29, 31, 60):
+        ParseRun.objects.create(
+            category=category,
+            started_at=now - timedelta(days=days),
+            status=ParseRun.Status.SUCCESS,
+        )
+
+    assert prune_parse_runs_task() == "Удалено 2 запусков парсинга."
+    assert ParseRun.objects.count() == 2
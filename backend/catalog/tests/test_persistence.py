@@ -0,0 +1,221 @@
+from typing import Any
+
+import pytest
+from django.utils import timezone
+
+from backend.catalog.models import Product, ProductPriceHistory, ProductPropertyValue
+from backend.catalog.services.persistence import (
+    ParsedProduct,
+    save_category_products,
+)
+from backend.catalog.tests.factories import (
+    CategoryFactory,
+    ProductFactory,
+    ProductPropertyFactory,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def make_parsed_product(n: int, **kwargs) -> ParsedProduct:
+    defaults: dict[str, Any] = {
+        "in_stock": True,
+        "name": f"Труба {n}",
+        "parse_url": f"https://mc.ru/metalloprokat/product_{n}",
+        "size": f"{n}",
+        "mark": "Ст3",
+        "length": "6000",
+        "idt": "1",
+        "idf": "2",
+        "idb": "3",
+        "price": 100_000.0,
+    }
+    defaults.update(kwargs)
+    return ParsedProduct(**defaults)
+
+
+@pytest.fixture
+def properties():
+    return {
+        code: ProductPropertyFactory(name=code, code=code)
+        for code in ["diametr", "marka-stali", "dlina", "ves-metra"]
+    }
+
+
+def test_save_category_products(properties, django_assert_max_num_queries):
+    category = CategoryFactory()
+    existing = ProductFactory(parse_url="https://mc.ru/metalloprokat/product_0")
+    existing.categories.add(category, through_defaults={"is_primary": True})
+    ProductPropertyValue.objects.create(
+        product=existing, property=properties["ves-metra"], value="2,5"
+    )
+    missing = ProductFactory(parse_url="https://mc.ru/metalloprokat/missing")
+    missing.categories.add(category, through_defaults={"is_primary": True})
+
+    parsed = [make_parsed_product(n) for n in range(50)]
+    # Число запросов не зависит от числа продуктов
+    with django_assert_max_num_queries(19):
+        result = save_category_products(category, parsed)
+
+    assert result.created_count == 49
+    assert result.updated_count == 1
+    assert category.products.count() == 51
+
+    existing.refresh_from_db()
+    assert existing.meter_price == 250
+    assert existing.unit_price == 1500
+    assert (existing.display_meter_price, existing.display_unit_price) == (250, 1500)
+    assert dict(existing.properties_through.values_list("property__code", "value")) == {
+        "ves-metra": "2.5",
+        "diametr": "0",
+        "marka-stali": "Ст3",
+        "dlina": "6000",
+    }
+
+    missing.refresh_from_db()
+    assert not missing.in_stock
+
+
+def test_save_category_products_is_idempotent(properties):
+    category = CategoryFactory()
+    parsed = [make_parsed_product(n) for n in range(5)]
+
+    save_category_products(category, parsed)
+    result = save_category_products(category, parsed)
+
+    assert result.created_count == 0
+    assert result.updated_count == 0
+    assert result.unchanged_count == 5
+    assert len(result.parsed_ids) == 5
+    assert ProductPropertyValue.objects.count() == 15
+
+
+def test_save_category_products_writes_only_changes(properties):
+    category = CategoryFactory()
+    save_category_products(category, [make_parsed_product(n) for n in range(3)])
+    assert ProductPriceHistory.objects.count() == 3
+
+    parsed = [
+        make_parsed_product(0, price=120_000.0),
+        make_parsed_product(1, mark="09Г2С"),
+    ]
+    result = save_category_products(category, parsed)
+
+    assert (result.updated_count, result.unchanged_count) == (2, 0)
+    changed = Product.objects.get(parse_url=parsed[0].parse_url)
+    assert list(changed.price_history.values_list("ton_price", "in_stock")) == [
+        (120_000, True)
+    ]
+    missing = Product.objects.get(parse_url=make_parsed_product(2).parse_url)
+    assert list(missing.price_history.values_list("in_stock", flat=True)) == [False]
+    assert ProductPriceHistory.objects.count() == 3
+
+    # Продукт вернулся в таблицу с прежними данными
+    result = save_category_products(category, [make_parsed_product(2)])
+    missing.refresh_from_db()
+    assert missing.in_stock
+    assert result.updated_count == 1
+
+
+def test_product_price_history_endpoint(client, properties):
+    category = CategoryFactory()
+    save_category_products(category, [make_parsed_product(0)])
+    product = Product.objects.get()
+
+    response = client.get(f"/api/products/{product.slug}/price-history/?days=7")
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {
+            "date": f"{timezone.localdate():%d.%m.%Y}",
+            "ton_price": "100000.00",
+            "in_stock": True,
+        }
+    ]
+    assert client.get("/api/products/missing/price-history/").status_code == 404
+    assert (
+        client.get(f"/api/products/{product.slug}/price-history/?days=0").status_code
+        == 400
+    )
+
+
+def test_save_category_products_resumes_from_checkpoint(properties, settings):
+    settings.PARSER_PERSIST_CHUNK_SIZE = 2
+    category = CategoryFactory()
+    missing = ProductFactory(parse_url="https://mc.ru/metalloprokat/missing")
+    missing.categories.add(category, through_defaults={"is_primary": True})
+    parsed = [make_parsed_product(n) for n in range(5)]
+
+    def interrupt(index):
+        if index > 2:
+            raise TimeoutError
+
+    with pytest.raises(TimeoutError):
+        save_category_products(category, parsed, checkpoint=interrupt)
+    # Первая часть сохранена, а снимать с наличия еще рано
+    assert category.products.count() == 3
+    missing.refresh_from_db()
+    assert missing.in_stock
+
+    checkpoints: list[int] = []
+    result = save_category_products(
+        category, parsed, start=2, checkpoint=checkpoints.append
+    )
+    assert checkpoints == [4, 5]
+    assert result.created_count == 3
+    assert category.products.count() == 6
+    missing.refresh_from_db()
+    assert not missing.in_stock
+
+
+def test_save_category_products_upserts_by_parse_url(properties):
+    old_category, category = CategoryFactory(), CategoryFactory()
+    moved = ProductFactory(parse_url=make_parsed_product(0).parse_url)
+    moved.categories.add(old_category, through_defaults={"is_primary": True})
+
+    result = save_category_products(
+        category, [make_parsed_product(0, price=1.0), make_parsed_product(1)]
+    )
+
+    assert (result.created_count, result.updated_count) == (1, 1)
+    assert Product.objects.count() == 2
+    moved.refresh_from_db()
+    assert moved.ton_price == 1
+
+
+def test_save_category_products_makes_unique_slugs(properties):
+    category = CategoryFactory()
+    ProductFactory(name="Труба 12")
+    parsed = [
+        make_parsed_product(1, name="Труба 1/2"),
+        make_parsed_product(2, name="Труба 12"),
+        make_parsed_product(3, name="Труба 12"),
+    ]
+
+    save_category_products(category, parsed)
+
+    assert sorted(
+        Product.objects.filter(name__startswith="Труба 1").values_list(
+            "slug", flat=True
+        )
+    ) == ["truba-12", "truba-12-2", "truba-12-3", "truba-12-4"]
+
+
+def test_save_category_products_moves_product_between_categories(properties):
+    old_category, category = (
+        CategoryFactory(last_parsed_at=timezone.now()) for _ in range(2)
+    )
+    moved = ProductFactory(parse_url=make_parsed_product(0).parse_url)
+    moved.categories.add(old_category, through_defaults={"is_primary": True})
+
+    # Продукт появился в новой категории и пропал из прежней, несколько обходов
+    for _ in range(2):
+        save_category_products(category, [make_parsed_product(0)])
+        save_category_products(old_category, [make_parsed_product(1)])
+
+    links = dict(moved.product_categories.values_list("category_id", "is_primary"))
+    assert links == {old_category.id: False, category.id: True}
+    moved.refresh_from_db()
+    assert moved.in_stock
+    assert not moved.price_history.filter(in_stock=False).exists()
+    assert moved.price_history.count() == 1
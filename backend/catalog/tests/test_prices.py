@@ -0,0 +1,269 @@
+import math
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from backend.catalog.models import (
+    Product,
+    ProductCategories,
+    ProductPropertyValue,
+)
+from backend.catalog.services import prices
+from backend.catalog.services.prices import (
+    recalculate_all_prices,
+    recalculate_display_prices,
+    recalculate_prices,
+)
+from backend.catalog.services.products import (
+    calculate_prices,
+    parse_length,
+    parse_meter_weight,
+)
+from backend.catalog.tests.factories import (
+    CategoryFactory,
+    ProductFactory,
+    ProductPropertyFactory,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def properties():
+    return {
+        code: ProductPropertyFactory(name=code, code=code)
+        for code in ["ves-metra", "dlina"]
+    }
+
+
+def make_product(properties, ton_price, weight=None, length=None, **kwargs):
+    product = ProductFactory(ton_price=ton_price, **kwargs)
+    for code, value in (("ves-metra", weight), ("dlina", length)):
+        if value is not None:
+            # Без сигналов, чтобы проверить именно пересчет
+            ProductPropertyValue.objects.bulk_create(
+                [
+                    ProductPropertyValue(
+                        product=product, property=properties[code], value=value
+                    )
+                ]
+            )
+    Product.objects.filter(id=product.id).update(meter_price=7, unit_price=7)
+    return product
+
+
+@pytest.mark.parametrize(
+    "ton_price, weight, length",
+    [
+        (100_000, "2,5", "6000"),
+        (110_000, "1.1", "6000-12000"),
+        (97_350, "0.617", " 11700 "),
+        (100_000, "2.5", "немерная"),
+        (100_000, "-", "6000"),
+        (0, "2.5", "6000"),
+        (100_000, None, "6000"),
+    ],
+)
+def test_recalculate_prices_matches_python(properties, ton_price, weight, length):
+    product = make_product(properties, ton_price, weight, length)
+
+    recalculate_prices([product.id])
+
+    product.refresh_from_db()
+    meter_price, unit_price = calculate_prices(
+        float(ton_price), parse_meter_weight(weight or ""), parse_length(length or "")
+    )
+    assert product.meter_price == (7 if meter_price is None else meter_price)
+    assert product.unit_price == (7 if unit_price is None else unit_price)
+
+
+def test_recalculate_prices_for_category(properties):
+    parent = CategoryFactory()
+    child, other = CategoryFactory(parent=parent), CategoryFactory()
+    product = make_product(properties, 100_000, "2.5", custom_ton_price=200_000)
+    product.categories.add(child)
+    other_product = make_product(properties, 100_000, "2.5")
+    other_product.categories.add(other)
+
+    # Корни упорядочены по имени: путь родителя мог сдвинуться
+    parent.refresh_from_db()
+    prices = recalculate_prices(category=parent)
+
+    assert prices == {product.id: (500, 7)}
+    other_product.refresh_from_db()
+    assert other_product.meter_price == 7
+
+
+def test_signals_recalculate_single_product(
+    properties, django_capture_on_commit_callbacks
+):
+    product = ProductFactory(ton_price=100_000)
+    with django_capture_on_commit_callbacks(execute=True):
+        ProductPropertyValue.objects.create(
+            product=product, property=properties["ves-metra"], value="2.5"
+        )
+        ProductPropertyValue.objects.create(
+            product=product, property=properties["dlina"], value="6000"
+        )
+    product.refresh_from_db()
+    assert (product.meter_price, product.unit_price) == (250, 1500)
+
+    product.custom_ton_price = 200_000
+    with django_capture_on_commit_callbacks(execute=True):
+        product.save()
+    product.refresh_from_db()
+    assert (product.meter_price, product.unit_price) == (500, 3000)
+
+
+def test_signals_coalesce_recalculation_until_commit(
+    properties, monkeypatch, django_capture_on_commit_callbacks
+):
+    calls = []
+    monkeypatch.setattr(
+        prices, "recalculate_prices", lambda product_ids: calls.append(product_ids)
+    )
+    products = [ProductFactory(ton_price=100_000) for _ in range(3)]
+    # id от прошлых тестов: их транзакции откатываются без коммита
+    monkeypatch.setattr(prices._pending, "product_ids", set())
+
+    with django_capture_on_commit_callbacks(execute=True):
+        for product in products:
+            product.custom_ton_price = 200_000
+            product.save()
+            ProductPropertyValue.objects.create(
+                product=product, property=properties["ves-metra"], value="2.5"
+            )
+        assert calls == []
+
+    assert calls == [{product.id for product in products}]
+
+
+def test_recalculate_all_prices_by_chunks(properties):
+    products = [make_product(properties, 100_000, "2.5", "6000") for _ in range(5)]
+    without_weight = make_product(properties, 100_000, length="6000")
+
+    result = recalculate_all_prices(chunk_size=2)
+
+    assert result.updated_count == 5
+    assert result.chunks_count == 3
+    for product in products:
+        product.refresh_from_db()
+        assert (product.meter_price, product.unit_price) == (250, 1500)
+    without_weight.refresh_from_db()
+    assert without_weight.meter_price == 7
+
+
+def get_display_prices(ton_price, meter_price, unit_price, coefficient):
+    # Расчет, который раньше выполнял сериализатор списка
+    ton = (round(ton_price * coefficient) // 100 + 1) * 100 if ton_price else 0
+    return (
+        ton,
+        math.ceil(meter_price * coefficient),
+        math.ceil(unit_price * coefficient),
+    )
+
+
+@pytest.mark.parametrize(
+    "ton_price, custom_ton_price, coefficient",
+    [
+        ("100000.00", "0", "1.00"),
+        ("97350.50", "0", "1.15"),
+        # Ровно половина рубля перед сотней
+        ("100099.50", "0", "1.00"),
+        ("100098.50", "0", "1.00"),
+        ("100000.00", "120000.50", "1.00"),
+        ("0", "0", "1.50"),
+    ],
+)
+def test_display_prices_match_serializer(ton_price, custom_ton_price, coefficient):
+    category = CategoryFactory(price_coefficient=Decimal(coefficient))
+    product = ProductFactory(
+        ton_price=Decimal(ton_price),
+        custom_ton_price=Decimal(custom_ton_price),
+        meter_price=Decimal("250.40"),
+        unit_price=Decimal("1500.00"),
+    )
+    product.categories.add(category, through_defaults={"is_primary": True})
+
+    recalculate_display_prices([product.id])
+
+    product.refresh_from_db()
+    assert (
+        product.display_ton_price,
+        product.display_meter_price,
+        product.display_unit_price,
+    ) == get_display_prices(
+        Decimal(custom_ton_price) or Decimal(ton_price),
+        Decimal("250.40"),
+        Decimal("1500.00"),
+        Decimal(coefficient),
+    )
+
+
+def test_price_coefficient_change_updates_display_prices(
+    client, django_capture_on_commit_callbacks
+):
+    category = CategoryFactory()
+    cheap, expensive = (
+        ProductFactory(ton_price=ton_price) for ton_price in (50_000, 100_000)
+    )
+    for product in (cheap, expensive):
+        product.categories.add(category, through_defaults={"is_primary": True})
+    recalculate_display_prices(category=category)
+
+    category.price_coefficient = Decimal("2.00")
+    with django_capture_on_commit_callbacks(execute=True):
+        category.save()
+
+    response = client.get("/api/products/?sort=-price&min_price=150000")
+    assert [
+        (product["id"], product["ton_price_with_coef"])
+        for product in response.json()["results"]
+    ] == [(expensive.id, 200_100)]
+    response = client.get("/api/products/?sort=price")
+    assert [product["id"] for product in response.json()["results"]] == [
+        cheap.id,
+        expensive.id,
+    ]
+
+
+def test_category_save_does_not_read_price_coefficient():
+    category = CategoryFactory()
+    category.h1 = "Трубы"
+
+    with CaptureQueriesContext(connection) as context:
+        category.save()
+
+    assert not [
+        query for query in context.captured_queries if query["sql"].startswith("SELECT")
+    ]
+    assert not category.price_coefficient_changed
+
+    category.price_coefficient = Decimal("2.00")
+    category.save(update_fields=["h1"])
+    assert not category.price_coefficient_changed
+    category.save()
+    assert category.price_coefficient_changed
+
+
+def test_primary_category_change_updates_display_prices(
+    django_capture_on_commit_callbacks,
+):
+    cheap = CategoryFactory(price_coefficient=Decimal("1.00"))
+    expensive = CategoryFactory(price_coefficient=Decimal("2.00"))
+    product = ProductFactory(ton_price=100_000)
+    with django_capture_on_commit_callbacks(execute=True):
+        product.categories.add(cheap, through_defaults={"is_primary": True})
+    product.refresh_from_db()
+    assert product.display_ton_price == 100_100
+
+    # Главная категория меняется без сохранения самого продукта
+    with django_capture_on_commit_callbacks(execute=True):
+        ProductCategories.objects.filter(product=product).delete()
+        ProductCategories.objects.create(
+            product=product, category=expensive, is_primary=True
+        )
+    product.refresh_from_db()
+    assert product.display_ton_price == 200_100
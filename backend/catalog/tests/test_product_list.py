@@ -0,0 +1,78 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from backend.catalog.models import ProductPropertyValue
+from backend.catalog.tests.factories import (
+    CategoryFactory,
+    ProductFactory,
+    ProductPropertyFactory,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def add_products(category, count, capture_on_commit):
+    diameter = ProductPropertyFactory(
+        name="Диаметр", code="diametr", is_display_in_list=True
+    )
+    length = ProductPropertyFactory(name="Длина", code="dlina")
+    for _ in range(count):
+        product = ProductFactory(ton_price=100_000, meter_price=250, unit_price=1500)
+        # Цены для витрины считаются после коммита, уже с главной категорией
+        with capture_on_commit(execute=True):
+            product.categories.add(category, through_defaults={"is_primary": True})
+            product.save()
+        for property in (diameter, length):
+            ProductPropertyValue.objects.create(
+                product=product, property=property, value="57"
+            )
+
+
+def get_list_queries_count(client, url):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(context.captured_queries), response.json()["results"]
+
+
+def test_product_list_queries_do_not_depend_on_page_size(
+    client, django_capture_on_commit_callbacks
+):
+    category = CategoryFactory(price_coefficient=1.5)
+    add_products(category, 2, django_capture_on_commit_callbacks)
+    small_count, _ = get_list_queries_count(client, "/api/products/")
+
+    add_products(category, 10, django_capture_on_commit_callbacks)
+    large_count, results = get_list_queries_count(client, "/api/products/")
+
+    assert len(results) == 12
+    assert large_count == small_count
+    assert {
+        (
+            product["ton_price_with_coef"],
+            product["meter_price_with_coef"],
+            product["unit_price_with_coef"],
+        )
+        for product in results
+    } == {(150_100, 375, 2250)}
+    assert [prop["code"] for prop in results[0]["properties"]] == ["diametr"]
+
+
+def test_product_without_categories(client):
+    product = ProductFactory()
+
+    results = client.get("/api/products/").json()["results"]
+    response = client.get(f"/api/products/{product.slug}/")
+
+    assert [item["id"] for item in results] == [product.id]
+    assert response.status_code == 200
+    assert response.json()["category"] is None
+    assert response.json()["breadcrumbs"] == [
+        {
+            "level": 1,
+            "name": product.name,
+            "href": f"/product/{product.slug}",
+            "disabled": True,
+        }
+    ]
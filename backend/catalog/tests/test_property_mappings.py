@@ -0,0 +1,77 @@
+import pytest
+from django.core.cache import cache
+
+from backend.catalog.models import CategoryPropertyMapping
+from backend.catalog.services.property_mappings import (
+    VERSION_KEY,
+    get_category_properties,
+)
+from backend.catalog.tests.factories import CategoryFactory, ProductPropertyFactory
+
+pytestmark = pytest.mark.django_db
+
+Column = CategoryPropertyMapping.Column
+
+
+@pytest.fixture
+def properties():
+    return {
+        code: ProductPropertyFactory(name=code, code=code)
+        for code in ["diametr", "marka-stali", "dlina", "stenka", "vysota-h"]
+    }
+
+
+def test_get_category_properties_defaults(properties):
+    category = CategoryFactory()
+
+    assert {
+        column: mapped.code
+        for column, mapped in get_category_properties(category).items()
+    } == {Column.SIZE: "diametr", Column.MARK: "marka-stali", Column.LENGTH: "dlina"}
+
+
+def test_get_category_properties_inherits_and_overrides(properties):
+    pipes = CategoryFactory()
+    steel_pipes = CategoryFactory(parent=pipes)
+    CategoryPropertyMapping.objects.create(
+        category=pipes, column=Column.MARK, property=properties["stenka"]
+    )
+    CategoryPropertyMapping.objects.create(
+        category=pipes, column=Column.SIZE, property=properties["vysota-h"]
+    )
+    CategoryPropertyMapping.objects.create(
+        category=steel_pipes, column=Column.SIZE, property=None
+    )
+
+    mapped = get_category_properties(steel_pipes)
+
+    assert Column.SIZE not in mapped
+    assert mapped[Column.MARK].code == "stenka"
+    assert mapped[Column.LENGTH].code == "dlina"
+
+
+def test_get_category_properties_is_cached(properties, django_assert_num_queries):
+    category = CategoryFactory()
+    get_category_properties(category)
+
+    with django_assert_num_queries(0):
+        get_category_properties(category)
+
+    CategoryPropertyMapping.objects.create(
+        category=category, column=Column.MARK, property=properties["stenka"]
+    )
+    assert get_category_properties(category)[Column.MARK].code == "stenka"
+
+
+def test_evicted_version_does_not_revive_stale_properties(properties):
+    cache.clear()
+    category = CategoryFactory()
+    get_category_properties(category)
+    # Ключ версии вытеснен из кэша, а записи свойств еще живы
+    cache.delete(VERSION_KEY)
+
+    CategoryPropertyMapping.objects.create(
+        category=category, column=Column.MARK, property=properties["stenka"]
+    )
+
+    assert get_category_properties(category)[Column.MARK].code == "stenka"
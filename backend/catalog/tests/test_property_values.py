@@ -0,0 +1,78 @@
+import pytest
+
+from backend.catalog.models import ProductPropertyValue
+from backend.catalog.services.categories import get_unique_property_values
+from backend.catalog.tests.factories import (
+    CategoryFactory,
+    ProductFactory,
+    ProductPropertyFactory,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.mark.parametrize(
+    "value, numeric, key",
+    [
+        ("2,50", 2.5, "2.5"),
+        (" 6000.0 ", 6000, "6000"),
+        ("0.617", 0.617, "0.617"),
+        ("6000-12000", None, "6000-12000"),
+        ("ст3  сп", None, "ст3 сп"),
+        ("nan", None, "nan"),
+        ("", None, ""),
+    ],
+)
+def test_fill_value(value, numeric, key):
+    property_value = ProductPropertyValue(value=value).fill_value()
+
+    assert property_value.value_numeric == numeric
+    assert property_value.value_key == key
+
+
+@pytest.fixture
+def diameters():
+    category = CategoryFactory()
+    diameter = ProductPropertyFactory(name="Диаметр", code="diametr")
+    products = {}
+    for value in ["10", "2,5", "немерный", "2.50", "100"]:
+        product = ProductFactory()
+        product.categories.add(category, through_defaults={"is_primary": True})
+        ProductPropertyValue.objects.create(
+            product=product, property=diameter, value=value
+        )
+        products[value] = product
+    return category, diameter, products
+
+
+def test_get_unique_property_values(diameters):
+    category, diameter, _ = diameters
+
+    assert get_unique_property_values(category, diameter) == [
+        "2.5",
+        "10",
+        "100",
+        "немерный",
+    ]
+
+
+def test_products_sort_and_filter_by_numeric_value(client, diameters):
+    category, _, products = diameters
+    url = f"/api/products/?category={category.slug}"
+
+    response = client.get(f"{url}&sort=-diametr")
+    ids = [product["id"] for product in response.json()["results"]]
+    assert ids[:2] == [products["100"].id, products["10"].id]
+    assert set(ids[2:4]) == {products["2,5"].id, products["2.50"].id}
+    assert ids[4] == products["немерный"].id
+
+    response = client.get(f"{url}&diametr=2,5")
+    assert {product["id"] for product in response.json()["results"]} == {
+        products["2,5"].id,
+        products["2.50"].id,
+    }
+
+    response = client.get(f"{url}&diametr_min=5&diametr_max=50")
+    assert [product["id"] for product in response.json()["results"]] == [
+        products["10"].id
+    ]
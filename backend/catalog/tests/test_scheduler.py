@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from backend.catalog.models import ParseRun
+from backend.catalog.services.scheduler import (
+    get_due_categories,
+    mark_categories_queued,
+    update_parse_schedule,
+)
+from backend.catalog.tests.factories import CategoryFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def make_run(category, status=ParseRun.Status.SUCCESS, **kwargs) -> ParseRun:
+    return ParseRun.objects.create(
+        category=category, started_at=timezone.now(), status=status, **kwargs
+    )
+
+
+def test_update_parse_schedule(settings):
+    settings.PARSER_MIN_INTERVAL = 60 * 60
+    category = CategoryFactory()
+
+    update_parse_schedule(category, make_run(category, updated_count=3))
+    category.refresh_from_db()
+    assert category.parse_interval == timedelta(hours=12)
+    assert category.change_rate == pytest.approx(0.3)
+
+    update_parse_schedule(category, make_run(category, ParseRun.Status.UNCHANGED))
+    category.refresh_from_db()
+    assert category.parse_interval == timedelta(hours=18)
+    assert category.change_rate == pytest.approx(0.21)
+    assert category.next_parse_at > timezone.now() + timedelta(hours=17)
+
+    update_parse_schedule(category, make_run(category, ParseRun.Status.FAILED))
+    category.refresh_from_db()
+    assert category.parse_interval == timedelta(hours=18)
+    assert category.next_parse_at < timezone.now() + timedelta(hours=2)
+
+
+def test_get_due_categories(settings):
+    now = timezone.now()
+    parent = CategoryFactory()
+    never_parsed = CategoryFactory(parent=parent)
+    overdue = CategoryFactory(parent=parent, next_parse_at=now - timedelta(hours=1))
+    volatile = CategoryFactory(
+        parent=parent, next_parse_at=now - timedelta(hours=1), change_rate=0.9
+    )
+    CategoryFactory(parent=parent, next_parse_at=now + timedelta(hours=1))
+
+    assert list(get_due_categories()) == [never_parsed, volatile, overdue]
+
+    settings.PARSER_HOURLY_BUDGET = 3
+    make_run(never_parsed)
+    assert list(get_due_categories()) == [never_parsed, volatile]
+
+
+def test_queued_categories_are_not_queued_again(settings):
+    settings.PARSER_HOURLY_BUDGET = 3
+    parent = CategoryFactory()
+    queued, other, last = (CategoryFactory(parent=parent) for _ in range(3))
+
+    mark_categories_queued([queued.id])
+    # Категория в очереди не ставится повторно и занимает место в бюджете
+    assert set(get_due_categories()) == {other, last}
+
+    queued.refresh_from_db()
+    update_parse_schedule(queued, make_run(queued))
+    queued.refresh_from_db()
+    assert queued.parse_queued_at is None
+
+    # Потерянная очередью категория через PARSER_QUEUED_TIMEOUT снова в очереди
+    settings.PARSER_QUEUED_TIMEOUT = 0
+    mark_categories_queued([other.id])
+    assert set(get_due_categories()) == {other, last}
@@ -0,0 +1,61 @@
+import pytest
+from django.core.management import call_command
+
+from backend.catalog.models import ParseRun, Product
+from backend.catalog.services import snapshots
+from backend.catalog.services.benchmark_pages import make_category_page
+from backend.catalog.tasks import get_category_page_url
+from backend.catalog.tests.factories import CategoryFactory
+
+
+@pytest.fixture(autouse=True)
+def snapshots_root(settings, tmp_path):
+    settings.PARSER_SNAPSHOTS_ENABLED = True
+    settings.PARSER_SNAPSHOTS_ROOT = str(tmp_path)
+
+
+def test_save_and_load_snapshot():
+    url = "https://mc.ru/metalloprokat/truby"
+    first = snapshots.save_snapshot(url, "<html>1</html>", snapshots.CATEGORY)
+    snapshots.save_snapshot(url, "<html>2</html>", snapshots.CATEGORY)
+    snapshots.save_snapshot("https://mc.ru/sitemap/map", "<html>", snapshots.SITEMAP)
+
+    assert snapshots.load_snapshot(url) == "<html>2</html>"
+    assert snapshots.load_snapshot(url, first) == "<html>1</html>"
+    assert snapshots.load_snapshot("https://mc.ru/other") is None
+    assert [ref["url"] for ref in snapshots.iter_snapshot_refs(snapshots.CATEGORY)] == [
+        url
+    ]
+
+
+def test_save_snapshot_disabled(settings):
+    settings.PARSER_SNAPSHOTS_ENABLED = False
+
+    assert snapshots.save_snapshot("https://mc.ru", "<html>", "sitemap") is None
+    assert snapshots.load_snapshot("https://mc.ru") is None
+
+
+@pytest.mark.django_db
+def test_reparse_command(monkeypatch, django_capture_on_commit_callbacks):
+    category = CategoryFactory(parse_content_hash="live")
+    snapshots.save_snapshot(
+        get_category_page_url(category), make_category_page(3), snapshots.CATEGORY
+    )
+    queued = []
+    monkeypatch.setattr(
+        "backend.catalog.tasks.enrich_products_weights_task.delay",
+        lambda *args: queued.append(args),
+    )
+
+    call_command("reparse", "--dry-run")
+    assert not Product.objects.exists()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command("reparse", category.id)
+    assert Product.objects.count() == 3
+    # Разбор без сети и без следа в состоянии живого парсинга
+    assert queued == []
+    category.refresh_from_db()
+    assert category.parse_content_hash == "live"
+    assert (category.next_parse_at, category.parse_checkpoint_index) == (None, 0)
+    assert not ParseRun.objects.exists()
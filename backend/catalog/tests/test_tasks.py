@@ -0,0 +1,144 @@
+from decimal import Decimal
+
+import pytest
+from bs4 import BeautifulSoup
+from celery.exceptions import SoftTimeLimitExceeded
+
+from backend.catalog.models import ParseRun, Product
+from backend.catalog.services.benchmark_pages import make_category_page
+from backend.catalog.services.fetch import PageFetchResult
+from backend.catalog.services.page_parser import get_content_hash
+from backend.catalog.tasks import (
+    PARSE_FAILED,
+    get_category_page_url,
+    get_unique_products,
+    parse_category_products_task,
+    parse_products_task,
+    process_category_page,
+    summarize_parse_results_task,
+)
+from backend.catalog.tests.factories import CategoryFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def make_page(text: str) -> PageFetchResult:
+    return PageFetchResult(text=text, etag='"v1"', content_hash=get_content_hash(text))
+
+
+def test_get_unique_products():
+    products = get_unique_products(BeautifulSoup(make_category_page(3), "html.parser"))
+
+    assert len(products) == 3
+    product = products["Труба 1x1"]
+    assert product.parse_url == "https://mc.ru/metalloprokat/product_1"
+    assert product.price == 100_000.0
+    assert product.in_stock
+    assert (product.size, product.mark, product.length) == ("1", "Ст3", "6000")
+
+
+def test_process_category_page_skips_unchanged_page():
+    category = CategoryFactory()
+
+    process_category_page(category, make_page(make_category_page(3)))
+    assert category.is_parsing_successful
+    assert category.parse_etag == '"v1"'
+    assert Product.objects.count() == 3
+
+    # Отличаются только скрипты - считаем страницу той же
+    Product.objects.update(ton_price=Decimal(1))
+    result = process_category_page(category, make_page(make_category_page(3, ts="1")))
+    assert "не изменилась" in result
+    assert not Product.objects.exclude(ton_price=Decimal(1)).exists()
+
+    result = process_category_page(category, PageFetchResult(not_modified=True))
+    assert "не изменилась" in result
+
+    process_category_page(category, make_page(make_category_page(3, price=200)))
+    assert not Product.objects.exclude(ton_price=Decimal(200)).exists()
+
+
+def test_process_category_page_resumes_from_checkpoint(settings):
+    settings.PARSER_PERSIST_CHUNK_SIZE = 2
+    category = CategoryFactory()
+    page = make_page(make_category_page(5))
+    category.parse_checkpoint_hash = page.content_hash
+    category.parse_checkpoint_index = 4
+
+    process_category_page(category, page)
+
+    assert Product.objects.count() == 1
+    category.refresh_from_db()
+    assert (category.parse_checkpoint_hash, category.parse_checkpoint_index) == ("", 0)
+
+    # Страница изменилась - контрольная точка от старой страницы не действует
+    category.parse_checkpoint_hash = "old"
+    category.parse_checkpoint_index = 4
+    process_category_page(category, make_page(make_category_page(5, price=1)))
+    assert Product.objects.count() == 5
+
+
+def test_parse_products_task_fans_out_categories(settings, monkeypatch):
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    parent = CategoryFactory()
+    categories = [CategoryFactory(parent=parent) for _ in range(2)]
+    blocked = CategoryFactory(parent=parent)
+    pages = {
+        get_category_page_url(category): make_page(make_category_page(2))
+        for category in categories
+    }
+    pages[get_category_page_url(blocked)] = make_page(
+        '<form action="/check-human"></form>'
+    )
+    monkeypatch.setattr(
+        "backend.catalog.tasks.fetch_category_page", lambda url, **kwargs: pages[url]
+    )
+    monkeypatch.setattr("backend.catalog.tasks.CATEGORY_FETCH_RETRIES", 0)
+
+    parse_products_task.delay()
+
+    # На страницах обеих категорий одни и те же товары - дублей нет, но каждый
+    # привязан к обеим категориям, главная - одна
+    assert Product.objects.count() == 2
+    for product in Product.objects.all():
+        links = dict(product.product_categories.values_list("category", "is_primary"))
+        assert set(links) == {category.id for category in categories}
+        assert sum(links.values()) == 1
+        assert product.in_stock
+    run = ParseRun.objects.get(category=blocked)
+    assert run.status == ParseRun.Status.BLOCKED
+    assert (
+        summarize_parse_results_task([{"status": "success"}, {"status": "failed"}])
+        == "Обработано 2 категорий. Успешно 1, с ошибкой 1."
+    )
+
+
+def test_parse_category_task_returns_failed_result(monkeypatch):
+    # Ошибка не должна ронять задачу, иначе chord не соберет итоги
+    category = CategoryFactory()
+    monkeypatch.setattr("backend.catalog.tasks.CATEGORY_FETCH_RETRIES", 0)
+
+    def fetch_timeout(url, **kwargs):
+        raise SoftTimeLimitExceeded()
+
+    monkeypatch.setattr("backend.catalog.tasks.fetch_category_page", fetch_timeout)
+    result = parse_category_products_task.apply(args=[category.id]).get()
+    assert result["status"] == PARSE_FAILED
+
+    def save_error(*args, **kwargs):
+        raise RuntimeError("ошибка сохранения")
+
+    monkeypatch.setattr(
+        "backend.catalog.tasks.fetch_category_page",
+        lambda url, **kwargs: make_page(make_category_page(2)),
+    )
+    monkeypatch.setattr("backend.catalog.tasks.save_category_products", save_error)
+    result = parse_category_products_task.apply(args=[category.id]).get()
+    assert result["status"] == PARSE_FAILED
+    assert "ошибка сохранения" in result["message"]
+    assert (
+        ParseRun.objects.filter(
+            category=category, status=ParseRun.Status.FAILED
+        ).count()
+        == 2
+    )
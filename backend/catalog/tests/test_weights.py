@@ -0,0 +1,41 @@
+import pytest
+from django.core.cache import cache
+
+from backend.catalog.services import weights
+from backend.catalog.tests.factories import ProductFactory, ProductPropertyFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_parse_weight_page():
+    text = '<script language="Javascript">var k=0.0123;var p=1;</script>'
+
+    assert weights.parse_weight_page(text) == "12.3"
+    assert weights.parse_weight_page("<html></html>") is None
+
+
+def test_enrich_products_weights(monkeypatch, settings):
+    settings.PARSER_HOST_INTERVAL = 0
+    cache.clear()
+    ProductPropertyFactory(name="ves-metra", code="ves-metra")
+    product = ProductFactory(idt="1", idf="2", idb="3", ton_price=100_000)
+    same_ids = ProductFactory(idt="1", idf="2", idb="3")
+    ProductFactory(idt="4", idf="5", idb="6")
+    ProductFactory()
+    fetched = []
+
+    def fetch_weight(url):
+        fetched.append(url)
+        return "2.5" if "/id/1/" in url else None
+
+    monkeypatch.setattr(weights, "fetch_weight", fetch_weight)
+
+    assert weights.enrich_products_weights(batch_size=2) == 2
+    assert len(fetched) == 2
+    product.refresh_from_db()
+    assert product.meter_price == 250
+    assert same_ids.properties_through.get().value == "2.5"
+
+    # Отсутствующий вес закэширован, повторно не запрашиваем
+    assert weights.enrich_products_weights() == 0
+    assert len(fetched) == 2
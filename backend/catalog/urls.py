@@ -3,6 +3,7 @@ from rest_framework.routers import DefaultRouter, SimpleRouter
 
 from backend.catalog.views import (
     CategoryViewSet,
+    ParseRunViewSet,
     ProductViewSet,
 )
 
@@ -13,6 +14,7 @@ else:
 
 router.register("categories", CategoryViewSet, basename="categories")
 router.register("products", ProductViewSet, basename="products")
+router.register("parse-runs", ParseRunViewSet, basename="parse-runs")
 
 app_name = "products"
 urlpatterns = router.urls
@@ -1,28 +1,43 @@
+from django.http import HttpResponse
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
 from drf_spectacular.utils import extend_schema
+from prometheus_client import CONTENT_TYPE_LATEST
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
 from backend.catalog.filters import ProductFilter
 from backend.catalog.models import Category, Product
 from backend.catalog.pagination import LimitOffsetPagination
+from backend.catalog.permissions import HasMetricsToken
 from backend.catalog.serializers import (
     CatalogLeftMenuSerializer,
     CategoryDetailOutputSerializer,
     CategoryListOutputSerializer,
+    ParseRunStatsFilterSerializer,
+    ParseRunStatsSerializer,
     ProductDetailOutputSerializer,
     ProductListOutputSerializer,
+    ProductPriceHistoryFilterSerializer,
+    ProductPriceHistorySerializer,
     SitemapSerializer,
 )
 from backend.catalog.services.categories import (
     get_children_categories,
     get_root_categories,
 )
+from backend.catalog.services.parse_runs import (
+    get_parse_run_stats,
+    render_parse_run_metrics,
+)
+from backend.catalog.services.products import (
+    get_product_price_history,
+    prefetch_product_list_data,
+)
 
 
 class Pagination(LimitOffsetPagination):
@@ -35,9 +50,7 @@ class ProductViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
     Вьюсет для получения товаров каталога
     """
 
-    queryset = Product.objects.filter(is_published=True).prefetch_related(
-        "properties_through__property", "categories"
-    )
+    queryset = prefetch_product_list_data(Product.objects.filter(is_published=True))
     serializer_class = ProductListOutputSerializer
 
     lookup_field = "slug"
@@ -56,6 +69,13 @@ class ProductViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
     )
     pagination_class = Pagination
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "retrieve":
+            # В карточке выводятся все свойства, в списке - из list_properties
+            return queryset.prefetch_related("properties_through__property")
+        return queryset
+
     def get_serializer_class(self):
         if self.action == "retrieve":
             return ProductDetailOutputSerializer
@@ -73,6 +93,23 @@ class ProductViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
 
         return Response(data, status=status.HTTP_200_OK)
 
+    @extend_schema(
+        parameters=[ProductPriceHistoryFilterSerializer],
+        responses=ProductPriceHistorySerializer(many=True),
+    )
+    @action(methods=["GET"], detail=True, url_path="price-history")
+    def price_history(self, request, slug=None):
+        filters_serializer = ProductPriceHistoryFilterSerializer(
+            data=request.query_params
+        )
+        filters_serializer.is_valid(raise_exception=True)
+        history = get_product_price_history(
+            slug=slug, days=filters_serializer.validated_data.get("days")
+        )
+        data = ProductPriceHistorySerializer(history, many=True).data
+
+        return Response(data, status=status.HTTP_200_OK)
+
 
 @extend_schema(tags=["Catalog"])
 class CategoryViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
@@ -136,3 +173,36 @@ class CategoryViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
         ).data
 
         return Response(data, status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=["Parser"])
+class ParseRunViewSet(GenericViewSet):
+    """
+    Метрики запусков парсинга категорий
+    """
+
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        parameters=[ParseRunStatsFilterSerializer],
+        responses=ParseRunStatsSerializer(many=True),
+    )
+    @action(methods=["GET"], detail=False)
+    def stats(self, request):
+        filters_serializer = ParseRunStatsFilterSerializer(data=request.query_params)
+        filters_serializer.is_valid(raise_exception=True)
+        stats = get_parse_run_stats(days=filters_serializer.validated_data["days"])
+        data = ParseRunStatsSerializer(stats, many=True).data
+
+        return Response(data, status=status.HTTP_200_OK)
+
+    @extend_schema(responses={(200, "text/plain"): str})
+    @action(
+        methods=["GET"],
+        detail=False,
+        permission_classes=[IsAdminUser | HasMetricsToken],
+    )
+    def metrics(self, request):
+        return HttpResponse(
+            render_parse_run_metrics(), content_type=CONTENT_TYPE_LATEST
+        )
@@ -1,4 +1,5 @@
 import pytest
+from django.core.cache import cache
 
 from backend.users.models import User
 from backend.users.tests.factories import UserFactory
@@ -9,6 +10,12 @@ def media_storage(settings, tmpdir):
     settings.MEDIA_ROOT = tmpdir.strpath
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    yield
+    cache.clear()
+
+
 @pytest.fixture
 def user(db) -> User:
     return UserFactory()
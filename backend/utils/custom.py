@@ -1,6 +1,9 @@
 import sys
+from typing import cast
 
+from django.db import models
 from django.shortcuts import _get_queryset  # type: ignore
+from django_extensions.db.fields import AutoSlugField
 
 from backend.catalog.models import Category
 
@@ -54,6 +57,33 @@ def create_breadcrumbs(
     return breadcrumbs
 
 
+def get_base_slug(model: type[models.Model], name: str) -> str:
+    """
+    slug, который AutoSlugField модели сгенерирует из name, без суффикса -2, -3...
+    """
+    slug_field = cast(AutoSlugField, model._meta.get_field("slug"))
+    return slug_field.slugify_func(name, slugify_function=slug_field.slugify_function)[
+        : slug_field.max_length
+    ]
+
+
+def get_unique_slug(model: type[models.Model], name: str, used_slugs: set[str]) -> str:
+    """
+    Повторяет генерацию slug у AutoSlugField, но без запроса на каждый объект:
+    занятые slug передаются в used_slugs, новый в него добавляется
+    """
+    slug_field = cast(AutoSlugField, model._meta.get_field("slug"))
+    original_slug = get_base_slug(model, name)
+    slug = original_slug
+    step = 2
+    while slug in used_slugs:
+        end = f"{slug_field.separator}{step}"
+        slug = original_slug[: slug_field.max_length - len(end)] + end
+        step += 1
+    used_slugs.add(slug)
+    return slug
+
+
 def query_yes_no(question, default="yes"):
     """Ask a yes/no question via raw_input() and return their answer.
 
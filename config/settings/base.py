@@ -290,6 +290,15 @@ CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 CELERY_WORKER_SEND_TASK_EVENTS = True
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#std-setting-task_send_sent_event
 CELERY_TASK_SEND_SENT_EVENT = True
+# https://docs.celeryq.dev/en/stable/userguide/routing.html
+# Запросы к mc.ru идут через отдельную очередь, чтобы их можно было масштабировать
+# отдельными воркерами (celery worker -Q scrape)
+CELERY_TASK_ROUTES = {
+    "backend.catalog.tasks.parse_categories_task": {"queue": "scrape"},
+    "backend.catalog.tasks.parse_category_products_task": {"queue": "scrape"},
+    "backend.catalog.tasks.parse_weight": {"queue": "scrape"},
+    "backend.catalog.tasks.enrich_products_weights_task": {"queue": "scrape"},
+}
 
 
 # django-rest-framework
@@ -368,3 +377,62 @@ SPECTACULAR_SETTINGS = {
 }
 # Your stuff...
 # ------------------------------------------------------------------------------
+
+# Parser
+# ------------------------------------------------------------------------------
+# Сколько страниц категорий качаем одновременно
+PARSER_CRAWL_CONCURRENCY = env.int("PARSER_CRAWL_CONCURRENCY", 8)
+# Минимальный интервал между запросами к одному хосту, сек
+PARSER_HOST_INTERVAL = env.float("PARSER_HOST_INTERVAL", 1.0)
+# Таймауты соединения и чтения для запросов парсера, сек
+PARSER_HTTP_CONNECT_TIMEOUT = env.float("PARSER_HTTP_CONNECT_TIMEOUT", 5.0)
+PARSER_HTTP_READ_TIMEOUT = env.float("PARSER_HTTP_READ_TIMEOUT", 30.0)
+# Повторы на 429/5xx с экспоненциальной задержкой
+PARSER_HTTP_RETRIES = env.int("PARSER_HTTP_RETRIES", 3)
+PARSER_HTTP_BACKOFF = env.float("PARSER_HTTP_BACKOFF", 0.5)
+# Разбирать страницы категорий по мере загрузки, не держа в памяти всю страницу
+PARSER_STREAM_PAGES = env.bool("PARSER_STREAM_PAGES", True)
+# Парсер HTML: "html.parser" или "lxml" (быстрее)
+PARSER_HTML_BACKEND = env.str("PARSER_HTML_BACKEND", "html.parser")
+# Процессов для разбора страниц, 0 - разбирать в процессе задачи. Только для
+# воркеров с -P threads/gevent, воркер prefork с этой настройкой не запустится
+PARSER_PARSE_WORKERS = env.int("PARSER_PARSE_WORKERS", 0)
+# Продуктов в одной транзакции сохранения, после каждой запоминается прогресс
+PARSER_PERSIST_CHUNK_SIZE = env.int("PARSER_PERSIST_CHUNK_SIZE", 500)
+# Продуктов в одном UPDATE пересчета цен всего каталога (manage.py recalc_prices)
+PRICES_RECALCULATE_CHUNK_SIZE = env.int("PRICES_RECALCULATE_CHUNK_SIZE", 50_000)
+# Сколько хранить в кэше вес метра, полученный с mc.ru, сек
+PARSER_WEIGHT_CACHE_TTL = env.int("PARSER_WEIGHT_CACHE_TTL", 60 * 60 * 24 * 30)
+# Сохранять загруженные страницы на диск для повторного разбора (manage.py reparse)
+PARSER_SNAPSHOTS_ENABLED = env.bool("PARSER_SNAPSHOTS_ENABLED", False)
+PARSER_SNAPSHOTS_ROOT = env.str("PARSER_SNAPSHOTS_ROOT", str(BASE_DIR / "snapshots"))
+# Адаптивное расписание парсинга категорий: интервал сокращается, когда цены
+# категории меняются, и растет, когда не меняются
+PARSER_MIN_INTERVAL = env.int("PARSER_MIN_INTERVAL", 60 * 60)
+PARSER_MAX_INTERVAL = env.int("PARSER_MAX_INTERVAL", 60 * 60 * 24 * 7)
+# Сглаживание частоты изменений (экспоненциальное скользящее среднее)
+PARSER_CHANGE_RATE_ALPHA = env.float("PARSER_CHANGE_RATE_ALPHA", 0.3)
+# Сколько страниц категорий можно запросить за час
+PARSER_HOURLY_BUDGET = env.int("PARSER_HOURLY_BUDGET", 300)
+# Через сколько секунд категория в очереди парсинга считается потерянной и снова
+# может попасть в очередь
+PARSER_QUEUED_TIMEOUT = env.int("PARSER_QUEUED_TIMEOUT", 60 * 60 * 6)
+# Redis для семафора запросов к mc.ru, без него ограничение не действует
+PARSER_REDIS_URL = env.str("REDIS_URL", "")
+# Сколько запросов к одному хосту могут одновременно выполнять все воркеры
+PARSER_HOST_CONCURRENCY = env.int("PARSER_HOST_CONCURRENCY", 2)
+# Через сколько секунд неосвобожденное место семафора считается брошенным
+PARSER_SEMAPHORE_TIMEOUT = env.int("PARSER_SEMAPHORE_TIMEOUT", 120)
+# Время жизни блокировки разбора категории, сек: больше жесткого лимита задачи,
+# чтобы блокировка убитого воркера не пережила его надолго
+PARSER_CATEGORY_LOCK_TIMEOUT = env.int("PARSER_CATEGORY_LOCK_TIMEOUT", 10 * 60)
+# Пауза после блокировки парсинга (форма /check-human), удваивается при повторной
+# блокировке, сек
+PARSER_BREAKER_COOLDOWN = env.int("PARSER_BREAKER_COOLDOWN", 60 * 10)
+PARSER_BREAKER_MAX_COOLDOWN = env.int("PARSER_BREAKER_MAX_COOLDOWN", 60 * 60 * 6)
+# Токен сборщика метрик для /api/parse-runs/metrics/ (Authorization: Bearer),
+# пустой - метрики доступны только администраторам
+PARSER_METRICS_TOKEN = env.str("PARSER_METRICS_TOKEN", "")
+# Сколько дней хранить запуски парсинга (ParseRun), старые удаляет
+# prune_parse_runs_task
+PARSER_RUNS_RETENTION_DAYS = env.int("PARSER_RUNS_RETENTION_DAYS", 30)